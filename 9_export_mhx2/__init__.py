@@ -28,6 +28,7 @@ class Mhx2Config(ExportConfig):
     def __init__(self):
         ExportConfig.__init__(self)
         self.useBinary     = False
+        self.useBinaryGeometry = False
 
 
 class ExporterMhx2(Exporter):
@@ -43,6 +44,7 @@ class ExporterMhx2(Exporter):
         import gui
         Exporter.build(self, options, taskview)
         self.useBinary   = options.addWidget(gui.CheckBox("Binary file", False))
+        self.useBinaryGeometry   = options.addWidget(gui.CheckBox("Binary geometry (mhx2b)", False))
         self.useExpressions   = options.addWidget(gui.CheckBox("Expressions", False))
         self.usePoses   = options.addWidget(gui.CheckBox("Poses", False))
         #self.feetOnGround   = options.addWidget(gui.CheckBox("Feet on ground", True))
@@ -59,6 +61,7 @@ class ExporterMhx2(Exporter):
         cfg = Mhx2Config()
         cfg.useTPose          = False
         cfg.useBinary         = self.useBinary.selected
+        cfg.useBinaryGeometry = self.useBinaryGeometry.selected
         cfg.useExpressions    = self.useExpressions.selected
         cfg.usePoses          = self.usePoses.selected
         cfg.feetOnGround      = self.feetOnGround.selected
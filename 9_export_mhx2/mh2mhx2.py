@@ -31,6 +31,7 @@ import log
 
 import skeleton
 from .save_json import saveJson
+from .save_binary import saveBinary
 from .hm8 import getBaseMesh
 
 
@@ -95,8 +96,13 @@ def exportMhx2(filepath, cfg):
         mname = getGeoName(name, mesh.name)
         addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg)
 
-    G.app.progress(0.2, text="Writing Json file %s" % filepath)
-    saveJson(mhFile, filepath, cfg.useBinary)
+    if getattr(cfg, "useBinaryGeometry", False):
+        filepath = os.path.splitext(filepath)[0] + ".mhx2b"
+        G.app.progress(0.2, text="Writing binary file %s" % filepath)
+        saveBinary(mhFile, filepath)
+    else:
+        G.app.progress(0.2, text="Writing Json file %s" % filepath)
+        saveJson(mhFile, filepath, cfg.useBinary)
     G.app.progress(1)
     log.message("%s written" % filepath)
 
@@ -0,0 +1,139 @@
+#
+#    MakeHuman .mhx2 exporter
+#    Copyright (C) Thomas Larsson 2014
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+#   Binary MHX2 container (.mhx2b)
+#
+#   magic    8 bytes     b"MHX2BIN\0"
+#   hlen     uint32 LE   size of the header in bytes
+#   header   utf-8 json  {"struct" : <mhx2 struct>, "blocks" : [...]}
+#   padding  to a multiple of BlockAlign
+#   blocks   raw little-endian arrays, each starting at a multiple of BlockAlign
+#
+#   Inside the struct, the bulk arrays of each geometry are replaced by
+#   {"$block" : n}, where n indexes the "blocks" list. Each entry in that
+#   list is {"type" : type, "shape" : shape, "offset" : offset}, with the
+#   offset counted from the start of the block area. Weights are stored
+#   as one "weights" block per mesh, with the group names and sizes kept
+#   in the marker: {"$block" : n, "groups" : [[name, count], ...]}.
+#
+
+import io
+import struct
+from collections import OrderedDict
+import numpy as np
+
+from .save_json import writeJsonData
+
+Magic = b"MHX2BIN\0"
+BlockAlign = 16
+
+BlockTypes = {
+    "float32" : np.dtype("<f4"),
+    "int32" : np.dtype("<i4"),
+    "bool" : np.dtype("|b1"),
+    "weights" : np.dtype([("vn", "<i4"), ("w", "<f4")]),
+    "fitting" : np.dtype([("vnums", "<i4", 3), ("weights", "<f4", 3), ("offsets", "<f4", 3)]),
+}
+
+MeshBlocks = [
+    ("vertices", "float32"),
+    ("faces", "int32"),
+    ("uv_faces", "int32"),
+    ("uv_coordinates", "float32"),
+]
+
+MeshTypes = ["mesh", "seed_mesh", "proxy_seed_mesh"]
+
+
+def saveBinary(mhFile, filepath):
+    blocks = []
+    mhStruct = OrderedDict(mhFile)
+    mhStruct["geometries"] = [packGeometry(mhGeo, blocks) for mhGeo in mhFile["geometries"]]
+
+    table = []
+    offset = 0
+    for btype,data in blocks:
+        table.append(OrderedDict([("type", btype), ("shape", list(data.shape)), ("offset", offset)]))
+        offset += padded(data.nbytes)
+
+    header = io.StringIO()
+    writeJsonData(header, OrderedDict([("struct", mhStruct), ("blocks", table)]))
+    header = header.getvalue().encode("utf-8")
+    header += b" " * (padded(len(Magic) + 4 + len(header)) - len(Magic) - 4 - len(header))
+
+    with open(filepath, "wb") as fp:
+        fp.write(Magic)
+        fp.write(struct.pack("<I", len(header)))
+        fp.write(header)
+        for _btype,data in blocks:
+            fp.write(data.tobytes())
+            fp.write(b"\0" * (padded(data.nbytes) - data.nbytes))
+
+
+def padded(nbytes):
+    return BlockAlign * ((nbytes + BlockAlign - 1) // BlockAlign)
+
+
+def addBlock(blocks, btype, data):
+    blocks.append((btype, np.ascontiguousarray(data, dtype=BlockTypes[btype])))
+    return OrderedDict([("$block", len(blocks)-1)])
+
+
+def packGeometry(mhGeo, blocks):
+    mhGeo = OrderedDict(mhGeo)
+    for mtype in MeshTypes:
+        if mtype in mhGeo.keys():
+            mhGeo[mtype] = packMesh(mhGeo[mtype], blocks)
+    if "proxy" in mhGeo.keys():
+        mhProxy = mhGeo["proxy"] = OrderedDict(mhGeo["proxy"])
+        fitting = np.asarray(mhProxy["fitting"], dtype=float)
+        data = np.zeros(len(fitting), dtype=BlockTypes["fitting"])
+        if len(fitting) > 0:
+            data["vnums"] = fitting[:,0]
+            data["weights"] = fitting[:,1]
+            data["offsets"] = fitting[:,2]
+        mhProxy["fitting"] = addBlock(blocks, "fitting", data)
+        if mhProxy["delete_verts"] is not None:
+            mhProxy["delete_verts"] = addBlock(blocks, "bool", mhProxy["delete_verts"])
+    return mhGeo
+
+
+def packMesh(mhMesh, blocks):
+    mhMesh = OrderedDict(mhMesh)
+    for key,btype in MeshBlocks:
+        if key in mhMesh.keys():
+            mhMesh[key] = addBlock(blocks, btype, mhMesh[key])
+    if "weights" in mhMesh.keys():
+        groups = []
+        vnums = []
+        weights = []
+        for bname,assoc in mhMesh["weights"].items():
+            assoc = np.asarray(assoc)
+            groups.append([bname, len(assoc)])
+            vnums.append(assoc[:,0])
+            weights.append(assoc[:,1])
+        data = np.zeros(sum([count for _,count in groups]), dtype=BlockTypes["weights"])
+        if groups:
+            data["vn"] = np.concatenate(vnums)
+            data["w"] = np.concatenate(weights)
+        marker = addBlock(blocks, "weights", data)
+        marker["groups"] = groups
+        mhMesh["weights"] = marker
+    return mhMesh
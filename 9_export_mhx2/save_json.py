@@ -16,27 +16,66 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import json
+import io
 import gzip
 import numpy as np
 import log
 
+# Number of array elements formatted per write when streaming ndarrays.
+ChunkSize = 0x10000
+
 
 def saveJson(struct, filepath, binary=False):
     if binary:
-        bytes = encodeJsonData(struct, "")
-        #bytes = json.dumps(struct)
-        with gzip.open(filepath, 'wb') as fp:
-            fp.write(bytes)
+        with gzip.open(filepath, 'wt', encoding="utf-8", newline="") as fp:
+            writeJsonData(fp, struct, "")
     else:
-        import codecs
-        string = encodeJsonData(struct, "")
-        with codecs.open(filepath, "w", encoding="utf-8") as fp:
-            fp.write(string)
+        with io.open(filepath, "w", encoding="utf-8", newline="") as fp:
+            writeJsonData(fp, struct, "")
             fp.write("\n")
 
 
 def encodeJsonData(data, pad=""):
+    fp = io.StringIO()
+    writeJsonData(fp, data, pad)
+    return fp.getvalue()
+
+
+def writeJsonData(fp, data, pad=""):
+    if isinstance(data, np.ndarray) and data.dtype.kind in "biuf":
+        writeJsonArray(fp, data)
+    elif isinstance(data, (list, tuple, np.ndarray)):
+        if leafList(data):
+            fp.write("[")
+            for n,elt in enumerate(data):
+                if n > 0:
+                    fp.write(",")
+                writeJsonData(fp, elt)
+            fp.write("]")
+        else:
+            fp.write("[")
+            for n,elt in enumerate(data):
+                if n > 0:
+                    fp.write(",")
+                fp.write("\n    " + pad)
+                writeJsonData(fp, elt, pad+"    ")
+            fp.write("\n%s]" % pad)
+    elif isinstance(data, dict):
+        if not data:
+            fp.write("{}")
+            return
+        fp.write("{")
+        for n,(key,value) in enumerate(data.items()):
+            if n > 0:
+                fp.write(",")
+            fp.write("\n    %s\"%s\" : " % (pad, key))
+            writeJsonData(fp, value, pad+"    ")
+        fp.write("\n%s}" % pad)
+    else:
+        fp.write(encodeJsonScalar(data))
+
+
+def encodeJsonScalar(data):
     if data is None:
         return "null"
     elif isinstance(data, (bool, np.bool_)):
@@ -44,42 +83,69 @@ def encodeJsonData(data, pad=""):
             return "true"
         else:
             return "false"
-    elif isinstance(data, (float, np.float32, np.float64)):
+    elif isinstance(data, (float, np.floating)):
         if abs(data) < 1e-6:
             return "0"
         else:
             return "%.5g" % data
-    elif isinstance(data, (int, np.int32, np.uint32)):
+    elif isinstance(data, (int, np.integer)):
         return str(data)
     # elif isinstance(data, (str, unicode)):
     elif isinstance(data, (str)):
         return "\"%s\"" % data
-    elif isinstance(data, (list, tuple, np.ndarray)):
-        if leafList(data):
-            string = "["
-            string += ",".join([encodeJsonData(elt) for elt in data])
-            return string + "]"
-        else:
-            string = "["
-            string += ",".join(
-                ["\n    " + pad + encodeJsonData(elt, pad+"    ")
-                 for elt in data])
-            if string == "[":
-                return "[]"
-            else:
-                return string + "\n%s]" % pad
-    elif isinstance(data, dict):
-        string = "{"
-        string += ",".join(
-            ["\n    %s\"%s\" : " % (pad, key) + encodeJsonData(value, pad+"    ")
-             for key,value in data.items()])
-        if string == "{":
-            return "{}"
-        else:
-            return string + "\n%s}" % pad
     else:
         log.debug(data)
-        raise RuntimeError("Can't encode: %s %s" % (data, data.type))
+        raise RuntimeError("Can't encode: %s %s" % (data, type(data)))
+
+#-----------------------------------------------------------------------
+#   Numeric arrays
+#-----------------------------------------------------------------------
+
+def writeJsonArray(fp, data):
+    """
+    Write a numeric ndarray in the same layout encodeJsonData always used
+    for arrays (one line, nested brackets), formatting a chunk of rows with
+    a single string operation instead of one call per element.
+    """
+    if data.ndim == 0:
+        fp.write(encodeJsonScalar(data.item()))
+        return
+    if data.shape[0] == 0:
+        fp.write("[]")
+        return
+
+    kind = data.dtype.kind
+    if kind == 'f':
+        token = "%.5g"
+    elif kind == 'b':
+        token = "%s"
+    else:
+        token = "%d"
+    rowfmt = token
+    for size in reversed(data.shape[1:]):
+        rowfmt = "[" + ",".join([rowfmt]*size) + "]"
+
+    nrows = data.shape[0]
+    rowsize = max(1, data.size // nrows)
+    step = max(1, ChunkSize // rowsize)
+    fp.write("[")
+    for first in range(0, nrows, step):
+        chunk = data[first:first+step]
+        if first > 0:
+            fp.write(",")
+        fp.write(",".join([rowfmt]*len(chunk)) % arrayTokens(chunk))
+    fp.write("]")
+
+
+def arrayTokens(data):
+    flat = data.ravel()
+    kind = data.dtype.kind
+    if kind == 'f':
+        # Small values are written as "0", which also takes care of -0.0
+        flat = np.where(np.abs(flat) < 1e-6, 0.0, flat)
+    elif kind == 'b':
+        flat = np.where(flat, "true", "false")
+    return tuple(flat.tolist())
 
 
 def leafList(data):
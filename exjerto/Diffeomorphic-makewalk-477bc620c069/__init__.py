@@ -48,12 +48,14 @@ bl_info = {
 if "bpy" in locals():
     print("Reloading MakeWalk")
     import imp
+    imp.reload(anim_arrays)
     imp.reload(utils)
     if bpy.app.version < (2,80,0):
         imp.reload(buttons27)
     else:
         imp.reload(buttons28)
     imp.reload(io_json)
+    imp.reload(bvh_decode)
     imp.reload(props)
     imp.reload(t_pose)
     imp.reload(armature)
@@ -71,12 +73,14 @@ else:
     print("Loading MakeWalk")
     import bpy
 
+    from . import anim_arrays
     from . import utils
     if bpy.app.version < (2,80,0):
         from . import buttons27
     else:
         from . import buttons28
     from . import io_json
+    from . import bvh_decode
     from . import props
     from . import t_pose
     from . import armature
@@ -523,6 +527,7 @@ class MCP_PT_Utility(bpy.types.Panel):
         layout.label(text="Batch conversion")
         layout.prop(scn, "McpDirectory")
         layout.prop(scn, "McpPrefix")
+        layout.prop(scn, "McpBatchProcesses")
         layout.operator("mcp.batch")
 
 #----------------------------------------------------------
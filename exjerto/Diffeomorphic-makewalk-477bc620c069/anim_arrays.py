@@ -0,0 +1,320 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Array parts of retargeting and simplification.
+#   This module only uses numpy and the standard library, so that it can
+#   run in worker processes outside of Blender, see batchRetargetSimplify.
+#   The rig data comes as arrays from CAnimation.getOfflineJob.
+#
+
+import numpy as np
+from collections import OrderedDict
+
+#-------------------------------------------------------------
+#   Batched rotations.
+#   Matrix arrays have shape (n,3,3) or (n,4,4), quaternion arrays
+#   (n,4) in the w,x,y,z order of mathutils.
+#-------------------------------------------------------------
+
+def quatsToMatrices(quats):
+    quats = np.asarray(quats, dtype=float)
+    quats = quats / np.linalg.norm(quats, axis=1)[:,None]
+    w,x,y,z = quats.T
+    mats = np.empty((len(quats),3,3))
+    mats[:,0,0] = 1 - 2*(y*y + z*z)
+    mats[:,0,1] = 2*(x*y - z*w)
+    mats[:,0,2] = 2*(x*z + y*w)
+    mats[:,1,0] = 2*(x*y + z*w)
+    mats[:,1,1] = 1 - 2*(x*x + z*z)
+    mats[:,1,2] = 2*(y*z - x*w)
+    mats[:,2,0] = 2*(x*z - y*w)
+    mats[:,2,1] = 2*(y*z + x*w)
+    mats[:,2,2] = 1 - 2*(x*x + y*y)
+    return mats
+
+
+def eulersToMatrices(eulers, order):
+    eulers = np.asarray(eulers, dtype=float)
+    mats = np.tile(np.identity(3), (len(eulers),1,1))
+    for axis in order:
+        i = "XYZ".index(axis)
+        j,k = (i+1)%3, (i+2)%3
+        c = np.cos(eulers[:,i])
+        s = np.sin(eulers[:,i])
+        rot = np.zeros((len(eulers),3,3))
+        rot[:,i,i] = 1
+        rot[:,j,j] = rot[:,k,k] = c
+        rot[:,k,j] = s
+        rot[:,j,k] = -s
+        mats = np.matmul(rot, mats)
+    return mats
+
+
+def matricesToQuats(mats):
+    mats = np.asarray(mats, dtype=float)[:,:3,:3]
+    mats = mats / np.linalg.norm(mats, axis=1)[:,None,:]
+    m = mats.reshape((len(mats),9)).T
+    m00,m01,m02,m10,m11,m12,m20,m21,m22 = m
+    # Pivot on the largest component to stay accurate near 180 degrees
+    cands = np.array([
+        (1+m00+m11+m22, m21-m12, m02-m20, m10-m01),
+        (m21-m12, 1+m00-m11-m22, m01+m10, m02+m20),
+        (m02-m20, m01+m10, 1-m00+m11-m22, m12+m21),
+        (m10-m01, m02+m20, m12+m21, 1-m00-m11+m22)])
+    diag = np.array([cands[n,n] for n in range(4)])
+    pivot = np.argmax(diag, axis=0)
+    idx = np.arange(len(mats))
+    quats = cands[pivot,:,idx] / (2*np.sqrt(np.maximum(diag[pivot,idx], 1e-12)))[:,None]
+    quats[quats[:,0] < 0] *= -1
+    return quats
+
+
+def matricesToEulers(mats, order):
+    # Same as Matrix.to_euler(order): of the two solutions, take the one
+    # with the smallest angles
+    mats = np.asarray(mats, dtype=float)[:,:3,:3]
+    mats = mats / np.linalg.norm(mats, axis=1)[:,None,:]
+    i,j,k = ["XYZ".index(axis) for axis in order]
+    cy = np.hypot(mats[:,i,i], mats[:,j,i])
+    eul1 = np.empty((len(mats),3))
+    eul2 = np.empty((len(mats),3))
+    eul1[:,i] = np.arctan2(mats[:,k,j], mats[:,k,k])
+    eul1[:,j] = np.arctan2(-mats[:,k,i], cy)
+    eul1[:,k] = np.arctan2(mats[:,j,i], mats[:,i,i])
+    eul2[:,i] = np.arctan2(-mats[:,k,j], -mats[:,k,k])
+    eul2[:,j] = np.arctan2(-mats[:,k,i], -cy)
+    eul2[:,k] = np.arctan2(-mats[:,j,i], -mats[:,i,i])
+    gimbal = (cy <= 16*np.finfo(np.float32).eps)
+    eul1[gimbal,i] = np.arctan2(-mats[gimbal,j,k], mats[gimbal,j,j])
+    eul1[gimbal,k] = 0
+    eul2[gimbal] = eul1[gimbal]
+    if (j-i)%3 == 2:
+        eul1 = -eul1
+        eul2 = -eul2
+    useEul2 = (np.abs(eul1).sum(axis=1) > np.abs(eul2).sum(axis=1))
+    eul1[useEul2] = eul2[useEul2]
+    return eul1
+
+#
+#   mergeKeys(old, co):
+#   Merge new keys into old ones, as insertFCurveKeys does. Returns the
+#   sorted keys and for each of them the index of the old key whose
+#   settings it keeps, or -1.
+#
+
+def mergeKeys(old, co):
+    source = -np.ones(len(co), dtype=int)
+    if len(old) > 0:
+        order = np.argsort(old[:,0], kind='stable')
+        pos = np.minimum(np.searchsorted(old[order,0], co[:,0]), len(old)-1)
+        match = (old[order[pos],0] == co[:,0])
+        source[match] = order[pos[match]]
+        keep = np.flatnonzero(~np.isin(old[:,0], co[:,0]))
+        co = np.concatenate((old[keep], co))
+        source = np.concatenate((keep, source))
+    order = np.argsort(co[:,0], kind='stable')
+    return co[order], source[order]
+
+#
+#    getKeepPoints(points, maxErr):
+#    Split segments at their worst point until all errors are below maxErr.
+#    Each segment is split independently, so a stack of segments gives the
+#    same points as refining all segments pass by pass.
+#
+
+def getKeepPoints(points, maxErr):
+    x = points[:,0]
+    y = points[:,1]
+    nPoints = len(points)
+    keep = np.zeros(nPoints, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, nPoints-1)]
+    while segments:
+        (n0, n1) = segments.pop()
+        (x0, y0) = (x[n0], y[n0])
+        (x1, y1) = (x[n1], y[n1])
+        if n1 - n0 < 2 or x1 <= x0:
+            continue
+        dxdn = (x1-x0)/(n1-n0)
+        dydx = (y1-y0)/(x1-x0)
+        xn = n0 + dxdn*(np.arange(n0+1, n1)-n0)
+        errs = np.abs(y[n0+1:n1] - (y0 + dydx*(xn-x0)))
+        worst = np.argmax(errs)
+        if errs[worst] > maxErr:
+            n = n0+1+worst
+            keep[n] = True
+            segments.append((n0, n))
+            segments.append((n, n1))
+    return np.flatnonzero(keep)
+
+#
+#   Offline retargeting.
+#   A job is a dict with
+#     frames:   the frames to retarget.
+#     source:   for each source bone, its name, parent index, rest matrix,
+#               rotation mode, default channel values and channel keys.
+#     bones:    for each target bone, its name, source bone, parent index,
+#               A and B matrices (see retarget.py), rotation mode and the
+#               locks and rotation limits of correctMatrixForLocks.
+#   retargetSimplify also needs
+#     keys:     the keys already in the target action.
+#     bendBones: the bones that limbsBendPositive bends.
+#     maxErr:   the allowed error per channel, or None to not simplify.
+#
+
+def getBasisMatrices(source, frames):
+    nFrames = len(frames)
+    bases = []
+    for bone in source:
+        channels = {}
+        for mode,value in bone["defaults"].items():
+            channels[mode] = np.tile(value, (nFrames,1))
+        for (mode,index),co in bone["keys"].items():
+            channels[mode][:,index] = np.interp(frames, co[:,0], co[:,1])
+        if bone["rotation_mode"] == 'QUATERNION':
+            rots = quatsToMatrices(channels["rotation_quaternion"])
+        else:
+            rots = eulersToMatrices(channels["rotation_euler"], bone["rotation_mode"])
+        basis = np.tile(np.identity(4), (nFrames,1,1))
+        basis[:,:3,:3] = rots * channels["scale"][:,None,:]
+        basis[:,:3,3] = channels["location"]
+        bases.append(basis)
+    return bases
+
+
+def getSourceMatrices(source, frames):
+    bases = getBasisMatrices(source, frames)
+    matrices = len(source)*[None]
+
+    def getMatrices(n):
+        if matrices[n] is None:
+            bone = source[n]
+            rest = bone["rest"]
+            parent = bone["parent"]
+            if parent >= 0:
+                prest = source[parent]["rest"]
+                rest = np.matmul(getMatrices(parent), np.dot(np.linalg.inv(prest), rest))
+            matrices[n] = np.matmul(rest, bases[n])
+        return matrices[n]
+
+    return dict([(bone["name"], getMatrices(n)) for n,bone in enumerate(source)])
+
+
+def correctMatricesForLocks(mats, order, locks, limits):
+    # Same as correctMatrixForLocks, for all frames at once
+    heads = mats[:,:3,3].copy()
+    if locks:
+        eulers = matricesToEulers(mats, order)
+        eulers[:,locks] = 0
+        mats = np.tile(np.identity(4), (len(mats),1,1))
+        mats[:,:3,:3] = eulersToMatrices(eulers, order)
+    for (uses, mins, maxs) in limits:
+        eulers = matricesToEulers(mats, order)
+        for n in range(3):
+            if uses[n]:
+                eulers[:,n] = np.minimum(maxs[n], np.maximum(mins[n], eulers[:,n]))
+        mats = np.tile(np.identity(4), (len(mats),1,1))
+        mats[:,:3,:3] = eulersToMatrices(eulers, order)
+    mats[:,:3,3] = heads
+    return mats
+
+#
+#   retargetBones(job):
+#   Same as CBoneAnim.retarget, for all bones and frames at once.
+#   Returns the keys as {(bone, channel): values}.
+#
+
+def retargetBones(job):
+    frames = job["frames"]
+    bones = job["bones"]
+    srcMatrices = getSourceMatrices(job["source"], frames)
+    trgArrays = len(bones)*[None]
+    keys = OrderedDict()
+
+    def retargetBone(n):
+        # Children need the target matrices of their parent
+        if trgArrays[n] is not None:
+            return
+        bone = bones[n]
+        parent = bone["parent"]
+        if parent >= 0:
+            retargetBone(parent)
+        srcMats = srcMatrices[bone["source"]]
+        trgMats = np.matmul(srcMats, bone["A"])
+        trgMats[:,:,3] = srcMats[:,:,3]
+        if parent >= 0:
+            mat1 = np.matmul(np.linalg.inv(trgArrays[parent]), trgMats)
+        else:
+            mat1 = trgMats
+        mat2 = np.matmul(bone["B"], mat1)
+        if bone["locks"] or bone["limits"]:
+            mat2 = correctMatricesForLocks(mat2, bone["order"], bone["locks"], bone["limits"])
+
+        bname = bone["name"]
+        if bone["rotation_mode"] == 'QUATERNION':
+            keys[bname, "rotation_quaternion"] = matricesToQuats(mat2)
+        else:
+            keys[bname, "rotation_euler"] = matricesToEulers(mat2, bone["rotation_mode"])
+        if parent < 0:
+            keys[bname, "location"] = mat2[:,:3,3]
+
+        mat1 = np.matmul(np.linalg.inv(bone["B"]), mat2)
+        if parent >= 0:
+            trgArrays[n] = np.matmul(trgArrays[parent], mat1)
+        else:
+            trgArrays[n] = mat1
+
+    for n in range(len(bones)):
+        retargetBone(n)
+    return keys
+
+#
+#   retargetSimplify(job):
+#   The part of loadRetargetSimplify that runs in the worker processes:
+#   retarget, merge with the keys already in the action, bend the limbs
+#   positive and simplify. Returns {(bone, channel, index): (co, source)}
+#   for setFCurveKeys.
+#
+
+def retargetSimplify(job):
+    frames = job["frames"]
+    noKeys = np.zeros((0,2), dtype=np.float32)
+    curves = OrderedDict()
+    for (bname,channel),values in retargetBones(job).items():
+        for index in range(values.shape[1]):
+            old = job["keys"].get((bname, channel, index), noKeys)
+            co = np.stack((frames, values[:,index]), axis=1).astype(np.float32)
+            co,source = mergeKeys(old, co)
+            if (index == 0 and
+                channel != "location" and
+                bname in job["bendBones"]):
+                # Same as limbsBendPositive(rig, True, True, (0,1e6))
+                y0 = np.interp(0, co[:,0], co[:,1])
+                co[(co[:,0] >= 0) & (co[:,0] <= 1e6) & (co[:,1] < y0), 1] = y0
+            if job["maxErr"] is not None and len(co) > 2:
+                keeps = getKeepPoints(co.astype(float), job["maxErr"][channel])
+                co,source = co[keeps],source[keeps]
+            curves[bname, channel, index] = (co, source)
+    return curves
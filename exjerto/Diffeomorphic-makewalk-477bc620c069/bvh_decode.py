@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Decoding of bvh motion data into arrays.
+#   This module only uses numpy and the standard library, so that it can
+#   run in worker processes outside of Blender, see batchRetargetSimplify.
+#
+
+import math
+import numpy as np
+
+Location = 1
+Rotation = 2
+
+Deg2Rad = math.pi/180
+
+#
+#    channelYup(word):
+#    channelZup(word):
+#
+
+def channelYup(word):
+    if word == 'Xrotation':
+        return ('X', Rotation, +1)
+    elif word == 'Yrotation':
+        return ('Y', Rotation, +1)
+    elif word == 'Zrotation':
+        return ('Z', Rotation, +1)
+    elif word == 'Xposition':
+        return (0, Location, +1)
+    elif word == 'Yposition':
+        return (1, Location, +1)
+    elif word == 'Zposition':
+        return (2, Location, +1)
+
+def channelZup(word):
+    if word == 'Xrotation':
+        return ('X', Rotation, +1)
+    elif word == 'Yrotation':
+        return ('Z', Rotation, +1)
+    elif word == 'Zrotation':
+        return ('Y', Rotation, -1)
+    elif word == 'Xposition':
+        return (0, Location, +1)
+    elif word == 'Yposition':
+        return (2, Location, +1)
+    elif word == 'Zposition':
+        return (1, Location, -1)
+
+#
+#    getChannels(words):
+#    Group the words of a CHANNELS line into [(mode, [(index, sign)])].
+#
+
+def getChannels(words):
+    channels = []
+    oldmode = None
+    for word in words[2:]:
+        (index, mode, sign) = channelYup(word)
+        if mode != oldmode:
+            indices = []
+            channels.append((mode, indices))
+            oldmode = mode
+        indices.append((index, sign))
+    return channels
+
+#
+#    readMotionData(fp, nChannels, nFrames):
+#    Read the whole frame block into an nFrames x nChannels array.
+#
+
+def readMotionData(fp, nChannels, nFrames):
+    if nChannels == 0:
+        return np.zeros((0,0))
+    print("Reading %d frames" % nFrames)
+    values = np.fromstring(fp.read(), dtype=float, sep=' ')
+    nRows = min(nFrames, len(values)//nChannels)
+    if nRows < nFrames:
+        print("Warning: Only %d of %d frames found" % (nRows, nFrames))
+    return values[:nRows*nChannels].reshape((nRows, nChannels))
+
+
+def getSubsampleFactor(frameTime, fps, ssFactor, defaultSS):
+    if defaultSS:
+        frameFactor = int(1.0/(fps*frameTime) + 0.49)
+        return frameFactor if frameFactor > 0 else 1
+    return ssFactor
+
+
+def selectFrames(data, startFrame, endFrame, ssFactor):
+    frames = np.arange(len(data))
+    useFrame = ((frames >= startFrame) &
+                (frames <= endFrame) &
+                (frames % ssFactor == 0))
+    return data[useFrame]
+
+#
+#    getChannelArrays(data, channelLists):
+#    For each joint, convert its columns of the frame block into
+#    [(mode, array)]: raw location vectors for Location channels, and
+#    the product of the axis rotations as quaternions for Rotation channels.
+#
+
+def getChannelArrays(data, channelLists):
+    nFrames = len(data)
+    arrays = []
+    m = 0
+    for channels in channelLists:
+        joint = []
+        for (mode, indices) in channels:
+            words = data[:, m:m+len(indices)]
+            m += len(indices)
+            if mode == Location:
+                vecs = np.zeros((nFrames,3))
+                for n,(index, sign) in enumerate(indices):
+                    vecs[:,index] = sign*words[:,n]
+                joint.append((mode, vecs))
+            elif mode == Rotation:
+                quats = np.zeros((nFrames,4))
+                quats[:,0] = 1
+                for n,(axis, sign) in enumerate(indices):
+                    quats = quatMultiply(quats, axisQuaternions(axis, sign*words[:,n]*Deg2Rad))
+                joint.append((mode, quats))
+        arrays.append(joint)
+    return arrays
+
+
+def axisQuaternions(axis, angles):
+    quats = np.zeros((len(angles),4))
+    quats[:,0] = np.cos(angles/2)
+    quats[:,"XYZ".index(axis)+1] = np.sin(angles/2)
+    return quats
+
+
+def quatMultiply(q1, q2):
+    w1,x1,y1,z1 = np.moveaxis(q1, -1, 0)
+    w2,x2,y2,z2 = np.moveaxis(q2, -1, 0)
+    return np.stack((w1*w2 - x1*x2 - y1*y2 - z1*z2,
+                     w1*x2 + x1*w2 + y1*z2 - z1*y2,
+                     w1*y2 - x1*z2 + y1*w2 + z1*x2,
+                     w1*z2 + x1*y2 - y1*x2 + z1*w2), axis=-1)
+
+#
+#    decodeBvhFile(filepath, fps, startFrame, endFrame, ssFactor, defaultSS):
+#    Read a bvh file without creating anything in Blender. Returns the
+#    hierarchy lines, which are cheap to parse again in Blender, and the
+#    channel arrays of the selected frames.
+#
+
+def decodeBvhFile(filepath, fps, startFrame, endFrame, ssFactor, defaultSS):
+    header = []
+    channelLists = []
+    nFrames = 0
+    frameTime = None
+    with open(filepath, "r") as fp:
+        for line in fp:
+            words = line.split()
+            if len(words) == 0:
+                continue
+            key = words[0].upper()
+            if not header or header[-1].split()[0].upper() != 'MOTION':
+                header.append(line)
+            if key in ['ROOT', 'JOINT']:
+                channelLists.append([])
+            elif key == 'CHANNELS':
+                channelLists[-1] = getChannels(words)
+            elif key == 'FRAMES:':
+                nFrames = int(words[1])
+            elif key == 'FRAME' and words[1].upper() == 'TIME:':
+                frameTime = float(words[2])
+                break
+        if frameTime is None:
+            raise RuntimeError("No motion found in %s" % filepath)
+        nChannels = sum([len(indices) for channels in channelLists for (mode, indices) in channels])
+        data = readMotionData(fp, nChannels, nFrames)
+
+    ssFactor = getSubsampleFactor(frameTime, fps, ssFactor, defaultSS)
+    data = selectFrames(data, startFrame*ssFactor, endFrame*ssFactor, ssFactor)
+    return {
+        "header" : header,
+        "channels" : getChannelArrays(data, channelLists),
+        "nKeys" : len(data),
+    }
@@ -23,6 +23,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from bpy.props import *
 from math import pi, sqrt
 from mathutils import *
@@ -110,10 +111,7 @@ def startEdit(context):
     for fcu in act.fcurves:
         (name, mode) = fCurveIdentity(fcu)
         nfcu = nact.fcurves.new(fcu.data_path, index=fcu.array_index, action_group=name)
-        n = len(fcu.keyframe_points)
-        nfcu.keyframe_points.add(count=n)
-        for i in range(n):
-            nfcu.keyframe_points[i].co = fcu.keyframe_points[i].co
+        setFCurveKeys(nfcu, getFCurveKeys(fcu))
     setInterpolation(rig)
     print("Action editing started")
     return nact
@@ -242,8 +240,9 @@ def confirmEdit(context):
         return
     (act, oact) = pair
 
+    ofcurves = getFCurveDict(oact)
     for fcu in act.fcurves:
-        ofcu = findFCurve(fcu.data_path, fcu.array_index, oact.fcurves)
+        ofcu = ofcurves.get((fcu.data_path, fcu.array_index))
         if not ofcu:
             continue
         (name,mode) =  fCurveIdentity(fcu)
@@ -329,6 +328,14 @@ def insertKey(context, useLoc, useRot, delete):
     else:
         setMarker(scn, frame)
 
+    ofcurves = getFCurveDict(oact)
+    boneFCurves = {}
+    for fcu in act.fcurves:
+        ofcu = ofcurves.get((fcu.data_path, fcu.array_index))
+        if ofcu:
+            (name,mode) = fCurveIdentity(fcu)
+            boneFCurves.setdefault(name, []).append((fcu, ofcu, mode))
+
     for pb in rig.pose.bones:
         if not pb.bone.select:
             continue
@@ -345,16 +352,11 @@ def insertKey(context, useLoc, useRot, delete):
                 else:
                     setEditDict(_EditRot, frame, pb.name, pb.rotation_euler, 3)
 
-        for fcu in act.fcurves:
-            ofcu = findFCurve(fcu.data_path, fcu.array_index, oact.fcurves)
-            if not ofcu:
-                continue
-            (name,mode) = fCurveIdentity(fcu)
-            if name == pb.name:
-                if isRotation(mode) and useRot:
-                    displaceFCurve(fcu, ofcu, _EditRot[fcu.array_index][name])
-                if isLocation(mode) and useLoc:
-                    displaceFCurve(fcu, ofcu, _EditLoc[fcu.array_index][name])
+        for fcu,ofcu,mode in boneFCurves.get(pb.name, []):
+            if isRotation(mode) and useRot:
+                displaceFCurve(fcu, ofcu, _EditRot[fcu.array_index][pb.name])
+            if isLocation(mode) and useLoc:
+                displaceFCurve(fcu, ofcu, _EditLoc[fcu.array_index][pb.name])
 
 
 class MCP_OT_InsertKey(bpy.types.Operator, LocRotDel):
@@ -423,6 +425,10 @@ class MCP_OT_MoveToMarker(bpy.types.Operator, LeftLast):
 #   evalCatmullRom(t, fcn):
 #
 
+def getFCurveDict(act):
+    return dict([((fcu.data_path, fcu.array_index), fcu) for fcu in act.fcurves])
+
+
 def displaceFCurve(fcu, ofcu, edits):
     modified = []
     editList = list(edits.items())
@@ -432,78 +438,59 @@ def displaceFCurve(fcu, ofcu, edits):
         modified.append((t,dy))
 
     if len(modified) >= 1:
-        kp = fcu.keyframe_points[0].co
-        t0 = int(kp[0])
+        co = getFCurveKeys(fcu)
+        t0 = int(co[0,0])
         (t1,y1) = modified[0]
-        kp = fcu.keyframe_points[-1].co
-        tn = int(kp[0])
+        tn = int(co[-1,0])
         (tn_1,yn_1) = modified[-1]
         modified = [(t0, y1)] + modified
         modified.append( (tn, yn_1) )
         fcn = setupCatmullRom(modified)
-        for kp in fcu.keyframe_points:
-            t = kp.co[0]
-            y = ofcu.evaluate(t)
-            dy = evalCatmullRom(t, fcn)
-            kp.co[1] = y+dy
+        y = sampleFCurve(ofcu, co[:,0])
+        co[:,1] = y + evalCatmullRom(co[:,0], fcn)
+        setFCurveKeys(fcu, co)
     return
 
+#
+#   The spline is stored as arrays (t0, t1, tfac, params) with one entry
+#   per interval, params being the (a,b,c,d) coefficients.
+#
 
 def setupCatmullRom(points):
     points.sort()
-    n = len(points)-1
-    fcn = []
+    ts,ys = np.array(points, dtype=float).T
     tension = 0.5
 
-    # First interval
-    (t0,y0) = points[0]
-    (t1,y1) = points[1]
-    (t2,y2) = points[2]
-    if t1-t0 < 0.5:
-        t0 = t1-1
-    d = y0
-    a = y1
-    c = 3*d + tension*(y1-y0)
-    b = 3*a - tension*(y2-y0)
-    tfac = 1.0/(t1-t0)
-    fcn.append((t0, t1, tfac, (a,b,c,d)))
-
-    # Inner intervals
-    for i in range(1,n-1):
-        (t_1,y_1) = points[i-1]
-        (t0,y0) = points[i]
-        (t1,y1) = points[i+1]
-        (t2,y2) = points[i+2]
-        d = y0
-        a = y1
-        c = 3*d + tension*(y1-y_1)
-        b = 3*a - tension*(y2-y0)
-        tfac = 1.0/(t1-t0)
-        fcn.append((t0, t1, tfac, (a,b,c,d)))
-
-    # Last interval
-    (t_1,y_1) = points[n-2]
-    (t0,y0) = points[n-1]
-    (t1,y1) = points[n]
-    if t1-t0 < 0.5:
-        t1 = t0+1
+    # Interval i goes from point i to point i+1. The end intervals use
+    # their own end point in place of the missing neighbour.
+    t0 = ts[:-1].copy()
+    t1 = ts[1:].copy()
+    y_1 = np.concatenate((ys[:1], ys[:-2]))
+    y0 = ys[:-1]
+    y1 = ys[1:]
+    y2 = np.concatenate((ys[2:], ys[-1:]))
+
+    # First and last intervals
+    if t1[0]-t0[0] < 0.5:
+        t0[0] = t1[0]-1
+    if t1[-1]-t0[-1] < 0.5:
+        t1[-1] = t0[-1]+1
+
     d = y0
     a = y1
     c = 3*d + tension*(y1-y_1)
-    b = 3*a - tension*(y1-y0)
+    b = 3*a - tension*(y2-y0)
     tfac = 1.0/(t1-t0)
-    fcn.append((t0, t1, tfac, (a,b,c,d)))
+    return (t0, t1, tfac, np.stack((a,b,c,d), axis=1))
 
-    return fcn
 
 def evalCatmullRom(t, fcn):
-    (t0, t1, tfac, params) = fcn[0]
-    if t < t0:
-        return evalCRInterval(t, t0, t1, tfac, params)
-    for (t0, t1, tfac, params) in fcn:
-        if t >= t0 and t < t1:
-            return evalCRInterval(t, t0, t1, tfac, params)
-    return evalCRInterval(t, t0, t1, tfac, params)
+    (t0, t1, tfac, params) = fcn
+    t = np.asarray(t, dtype=float)
+    inside = (t[:,None] >= t0) & (t[:,None] < t1)
+    idx = np.where(inside.any(axis=1), inside.argmax(axis=1), len(t0)-1)
+    idx[t < t0[0]] = 0
+    return evalCRInterval(t, t0[idx], t1[idx], tfac[idx], params[idx].T)
 
 def evalCRInterval(t, t0, t1, tfac, params):
     (a,b,c,d) = params
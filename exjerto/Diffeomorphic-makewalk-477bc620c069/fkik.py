@@ -23,6 +23,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from mathutils import Vector, Matrix
 from bpy.props import *
 
@@ -58,169 +59,248 @@ def getGlobalMatrix(mat, pb):
         return gmat
 
 
-def matchPoseTranslation(pb, src):
-    pmat = getPoseMatrix(src.matrix, pb)
-    insertLocation(pb, pmat)
+def printMatrix(string,mat):
+    print(string)
+    for i in range(4):
+        print("    %.4g %.4g %.4g %.4g" % tuple(mat[i]))
 
+#------------------------------------------------------------------------
+#   Range transfer
+#   The chains involved are sampled for all frames in one pass over the
+#   scene. The snapped pose matrices are then computed as arrays, bone by
+#   bone in the same order as snapping a single frame, and keyed in bulk.
+#   When a bone has been snapped, the global matrices of the sampled bones
+#   below it are recomputed, as a scene update would, and used for the
+#   bones that are snapped after it.
+#------------------------------------------------------------------------
 
-def matchPoseRotation(pb, src):
-    pmat = getPoseMatrix(src.matrix, pb)
-    insertRotation(pb, pmat)
+def normalizeRows(vecs):
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1), 1e-12)[:,None]
+
+
+def hasPoseConstraints(pb):
+    # The global matrix of such a bone does not follow from its basis
+    for cns in pb.constraints:
+        if not cns.mute and cns.type[0:6] != 'LIMIT_':
+            return True
+    return False
+
+
+class CRangeTransfer:
+
+    def __init__(self, rig, scn, frames):
+        self.rig = rig
+        self.scn = scn
+        self.frames = frames
+        self.matrices = {}
+        self.bases = {}
+        self.bones = []
+
+
+    def sample(self, bones):
+        bones = [pb for pb in bones if pb]
+        for pb in list(bones):
+            if pb.parent and pb.parent not in bones:
+                bones.append(pb.parent)
+        # Parents before children, for updateDescendants
+        self.bones = sorted(bones, key=lambda pb: len(pb.parent_recursive))
+        nFrames = len(self.frames)
+        for pb in bones:
+            self.matrices[pb.name] = np.empty((nFrames,4,4))
+            self.bases[pb.name] = np.empty((nFrames,4,4))
+        for n,frame in enumerate(self.frames):
+            showProgress(n, frame, nFrames)
+            self.scn.frame_set(frame)
+            updateScene()
+            for pb in bones:
+                self.matrices[pb.name][n] = pb.matrix
+                self.bases[pb.name][n] = pb.matrix_basis
+
+
+    def getPoseMatrices(self, gmats, pb):
+        restInv = np.array(pb.bone.matrix_local.inverted())
+        if pb.parent:
+            parInv = np.linalg.inv(self.matrices[pb.parent.name])
+            parRest = np.array(pb.parent.bone.matrix_local)
+            return np.matmul(np.dot(restInv, parRest), np.matmul(parInv, gmats))
+        else:
+            return np.matmul(restInv, gmats)
 
 
-def matchPoseTwist(pb, src):
-    pmat0 = src.matrix_basis
-    euler = pmat0.to_3x3().to_euler('YZX')
-    euler.z = 0
-    pmat = euler.to_matrix().to_4x4()
-    pmat.col[3] = pmat0.col[3]
-    insertRotation(pb, pmat)
+    def getGlobalMatrices(self, pmats, pb):
+        gmats = np.matmul(np.array(pb.bone.matrix_local), pmats)
+        if pb.parent:
+            parRestInv = np.array(pb.parent.bone.matrix_local.inverted())
+            return np.matmul(self.matrices[pb.parent.name], np.matmul(parRestInv, gmats))
+        else:
+            return gmats
 
 
-def printMatrix(string,mat):
-    print(string)
-    for i in range(4):
-        print("    %.4g %.4g %.4g %.4g" % tuple(mat[i]))
+    def setPose(self, pb, pmats, useLoc, useRot, useBasis=False):
+        if useRot:
+            setBoneMatrixKeys(self.rig, pb, self.frames, pmats, useLoc, interpolation=None)
+        elif useLoc:
+            setBoneFCurves(self.rig, pb.name, "location", self.frames, pmats[:,:3,3], interpolation=None)
 
+        if useBasis:
+            basis = pmats.copy()
+        else:
+            basis = self.bases[pb.name].copy()
+            if useRot:
+                basis[:,:3,:3] = quatsToMatrices(matricesToQuats(pmats))
+            if useLoc:
+                basis[:,:3,3] = pmats[:,:3,3]
+        self.bases[pb.name] = basis
+        if hasPoseConstraints(pb):
+            return
+        self.matrices[pb.name] = self.getGlobalMatrices(basis, pb)
+        self.updateDescendants(pb)
 
-def matchIkLeg(legIk, toeFk, mBall, mToe, mHeel):
-    rmat = toeFk.matrix.to_3x3()
-    tHead = Vector(toeFk.matrix.col[3][:3])
-    ty = rmat.col[1]
-    tail = tHead + ty * toeFk.bone.length
 
-    zBall = mBall.matrix.col[3][2]
-    zToe = mToe.matrix.col[3][2]
-    zHeel = mHeel.matrix.col[3][2]
+    def updateDescendants(self, pb):
+        moved = [pb.name]
+        for child in self.bones:
+            if (child.parent and
+                child.parent.name in moved and
+                not hasPoseConstraints(child)):
+                self.matrices[child.name] = self.getGlobalMatrices(self.bases[child.name], child)
+                moved.append(child.name)
 
-    x = Vector(rmat.col[0])
-    y = Vector(rmat.col[1])
-    z = Vector(rmat.col[2])
 
-    if zHeel > zBall and zHeel > zToe:
-        # 1. foot.ik is flat
-        if abs(y[2]) > abs(z[2]):
-            y = -z
-        y[2] = 0
-    else:
-        # 2. foot.ik starts at heel
-        hHead = Vector(mHeel.matrix.col[3][:3])
-        y = tail - hHead
-
-    y.normalize()
-    x -= x.dot(y)*y
-    x.normalize()
-    if abs(x[2]) < 0.7:
-        x[2] = 0
-        x.normalize()
-    z = x.cross(y)
-    head = tail - y * legIk.bone.length
-
-    # Create matrix
-    gmat = Matrix()
-    gmat.col[0][:3] = x
-    gmat.col[1][:3] = y
-    gmat.col[2][:3] = z
-    gmat.col[3][:3] = head
-    pmat = getPoseMatrix(gmat, legIk)
-
-    insertLocation(legIk, pmat)
-    insertRotation(legIk, pmat)
-
-
-def matchPoleTarget(pb, above, below):
-    x = Vector(above.matrix.col[1][:3])
-    y = Vector(below.matrix.col[1][:3])
-    p0 = Vector(below.matrix.col[3][:3])
-    n = x.cross(y)
-    if abs(n.length) > 1e-4:
-        z = x - y
-        n.normalize()
-        z -= z.dot(n)*n
-        z.normalize()
-        p = p0 + 6*pb.length*z
-    else:
-        p = p0
-    gmat = Matrix.Translation(p)
-    pmat = getPoseMatrix(gmat, pb)
-    insertLocation(pb, pmat)
+    def matchPoseTranslation(self, pb, src):
+        pmats = self.getPoseMatrices(self.matrices[src.name], pb)
+        self.setPose(pb, pmats, True, False)
 
 
-def matchPoseReverse(pb, src):
-    gmat = src.matrix
-    tail = gmat.col[3] + src.length * gmat.col[1]
-    rmat = Matrix((gmat.col[0], -gmat.col[1], -gmat.col[2], tail))
-    rmat.transpose()
-    pmat = getPoseMatrix(rmat, pb)
-    pb.matrix_basis = pmat
-    insertRotation(pb, pmat)
+    def matchPoseRotation(self, pb, src):
+        pmats = self.getPoseMatrices(self.matrices[src.name], pb)
+        self.setPose(pb, pmats, False, True)
 
 
-def matchPoseScale(pb, src):
-    pmat = getPoseMatrix(src.matrix, pb)
-    pb.scale = pmat.to_scale()
-    pb.keyframe_insert("scale", group=pb.name)
+    def matchPoseLocRot(self, pb, src):
+        pmats = self.getPoseMatrices(self.matrices[src.name], pb)
+        self.setPose(pb, pmats, True, True)
 
 
-def snapFkArm(rig, snapIk, snapFk, frame):
+    def matchPoseTwist(self, pb, src):
+        pmats = np.empty((len(self.frames),4,4))
+        for n,basis in enumerate(self.bases[src.name]):
+            pmat0 = Matrix(basis.tolist())
+            euler = pmat0.to_3x3().to_euler('YZX')
+            euler.z = 0
+            pmat = euler.to_matrix().to_4x4()
+            pmat.col[3] = pmat0.col[3]
+            pmats[n] = pmat
+        self.setPose(pb, pmats, False, True)
 
-    (uparmFk, loarmFk, handFk) = snapFk
-    (uparmIk, loarmIk, elbow, elbowPt, handIk) = snapIk
 
-    matchPoseRotation(uparmFk, uparmIk)
-    matchPoseRotation(loarmFk, loarmIk)
-    matchPoseRotation(handFk, handIk)
+    def matchIkLeg(self, legIk, toeFk, mBall, mToe, mHeel):
+        tmats = self.matrices[toeFk.name]
+        tail = tmats[:,:3,3] + tmats[:,:3,1] * toeFk.bone.length
 
+        zBall = self.matrices[mBall.name][:,2,3]
+        zToe = self.matrices[mToe.name][:,2,3]
+        zHeel = self.matrices[mHeel.name][:,2,3]
 
-def snapIkArm(rig, snapIk, snapFk, frame):
+        x = tmats[:,:3,0]
+        y = tmats[:,:3,1]
+        z = tmats[:,:3,2]
 
-    (uparmIk, loarmIk, elbow, elbowPt, handIk) = snapIk
-    (uparmFk, loarmFk, handFk) = snapFk
+        # 1. foot.ik is flat
+        yFlat = np.where((np.abs(y[:,2]) > np.abs(z[:,2]))[:,None], -z, y)
+        yFlat[:,2] = 0
+        # 2. foot.ik starts at heel
+        yHeel = tail - self.matrices[mHeel.name][:,:3,3]
+        flat = (zHeel > zBall) & (zHeel > zToe)
+        y = normalizeRows(np.where(flat[:,None], yFlat, yHeel))
+
+        x = normalizeRows(x - np.sum(x*y, axis=1)[:,None]*y)
+        vertical = (np.abs(x[:,2]) < 0.7)
+        x[vertical,2] = 0
+        x[vertical] = normalizeRows(x[vertical])
+        z = np.cross(x, y)
+        head = tail - y * legIk.bone.length
+
+        # Create matrices
+        gmats = np.tile(np.identity(4), (len(self.frames),1,1))
+        gmats[:,:3,0] = x
+        gmats[:,:3,1] = y
+        gmats[:,:3,2] = z
+        gmats[:,:3,3] = head
+        pmats = self.getPoseMatrices(gmats, legIk)
+        self.setPose(legIk, pmats, True, True)
+
+
+    def matchPoleTarget(self, pb, above, below):
+        x = self.matrices[above.name][:,:3,1]
+        y = self.matrices[below.name][:,:3,1]
+        p0 = self.matrices[below.name][:,:3,3]
+        n = np.cross(x, y)
+        bent = (np.linalg.norm(n, axis=1) > 1e-4)
+        n = normalizeRows(n)
+        z = x - y
+        z = normalizeRows(z - np.sum(z*n, axis=1)[:,None]*n)
+        p = np.where(bent[:,None], p0 + 6*pb.length*z, p0)
+        gmats = np.tile(np.identity(4), (len(self.frames),1,1))
+        gmats[:,:3,3] = p
+        pmats = self.getPoseMatrices(gmats, pb)
+        self.setPose(pb, pmats, True, False)
 
-    matchPoseTranslation(handIk, handFk)
-    matchPoseRotation(handIk, handFk)
-    updateScene()
 
-    matchPoleTarget(elbowPt, uparmFk, loarmFk)
+    def matchPoseReverse(self, pb, src):
+        gmats = self.matrices[src.name]
+        rmats = gmats.copy()
+        rmats[:,:,1] = -gmats[:,:,1]
+        rmats[:,:,2] = -gmats[:,:,2]
+        rmats[:,:,3] = gmats[:,:,3] + src.length * gmats[:,:,1]
+        pmats = self.getPoseMatrices(rmats, pb)
+        self.setPose(pb, pmats, False, True, useBasis=True)
 
-    #matchPoseRotation(uparmIk, uparmFk)
-    #matchPoseRotation(loarmIk, loarmFk)
 
+    def snapFkArm(self, snapIk, snapFk):
+        (uparmFk, loarmFk, handFk) = snapFk
+        (uparmIk, loarmIk, elbow, elbowPt, handIk) = snapIk
 
-def snapFkLeg(rig, snapIk, snapFk, frame, legIkToAnkle):
+        self.matchPoseRotation(uparmFk, uparmIk)
+        self.matchPoseRotation(loarmFk, loarmIk)
+        self.matchPoseRotation(handFk, handIk)
 
-    (uplegIk, lolegIk, kneePt, ankleIk, legIk, footRev, toeRev, mBall, mToe, mHeel) = snapIk
-    (uplegFk, lolegFk, footFk, toeFk) = snapFk
 
-    matchPoseRotation(uplegFk, uplegIk)
-    matchPoseRotation(lolegFk, lolegIk)
-    if not legIkToAnkle:
-        matchPoseReverse(footFk, footRev)
-        matchPoseReverse(toeFk, toeRev)
+    def snapIkArm(self, snapIk, snapFk):
+        (uparmIk, loarmIk, elbow, elbowPt, handIk) = snapIk
+        (uparmFk, loarmFk, handFk) = snapFk
 
+        self.matchPoseLocRot(handIk, handFk)
+        self.matchPoleTarget(elbowPt, uparmFk, loarmFk)
 
-def snapIkLeg(rig, snapIk, snapFk, frame, legIkToAnkle):
 
-    (uplegIk, lolegIk, kneePt, ankleIk, legIk, footRev, toeRev, mBall, mToe, mHeel) = snapIk
-    (uplegFk, lolegFk, footFk, toeFk) = snapFk
+    def snapFkLeg(self, snapIk, snapFk, legIkToAnkle):
+        (uplegIk, lolegIk, kneePt, ankleIk, legIk, footRev, toeRev, mBall, mToe, mHeel) = snapIk
+        (uplegFk, lolegFk, footFk, toeFk) = snapFk
+
+        self.matchPoseRotation(uplegFk, uplegIk)
+        self.matchPoseRotation(lolegFk, lolegIk)
+        if not legIkToAnkle:
+            self.matchPoseReverse(footFk, footRev)
+            self.matchPoseReverse(toeFk, toeRev)
 
-    if legIkToAnkle:
-        matchPoseTranslation(ankleIk, footFk)
-    else:
-        matchIkLeg(legIk, toeFk, mBall, mToe, mHeel)
 
-    matchPoseTwist(lolegIk, lolegFk)
-    updateScene()
+    def snapIkLeg(self, snapIk, snapFk, legIkToAnkle):
+        (uplegIk, lolegIk, kneePt, ankleIk, legIk, footRev, toeRev, mBall, mToe, mHeel) = snapIk
+        (uplegFk, lolegFk, footFk, toeFk) = snapFk
 
-    matchPoseReverse(toeRev, toeFk)
-    updateScene()
-    matchPoseReverse(footRev, footFk)
-    updateScene()
+        if legIkToAnkle:
+            self.matchPoseTranslation(ankleIk, footFk)
+        else:
+            self.matchIkLeg(legIk, toeFk, mBall, mToe, mHeel)
 
-    matchPoleTarget(kneePt, uplegFk, lolegFk)
+        self.matchPoseTwist(lolegIk, lolegFk)
+        self.matchPoseReverse(toeRev, toeFk)
+        self.matchPoseReverse(footRev, footFk)
+        self.matchPoleTarget(kneePt, uplegFk, lolegFk)
 
-    if not legIkToAnkle:
-        matchPoseTranslation(ankleIk, footFk)
+        if not legIkToAnkle:
+            self.matchPoseTranslation(ankleIk, footFk)
 
 
 SnapBonesAlpha8 = {
@@ -318,6 +398,17 @@ def setMhxIk(rig, useArms, useLegs, value):
             rig.data.layers[n] = False
 
 
+def getTransferBones(scn, armSnaps, legSnaps):
+    bones = []
+    if scn.McpFkIkArms:
+        for snap in armSnaps:
+            bones += list(snap)
+    if scn.McpFkIkLegs:
+        for snap in legSnaps:
+            bones += list(snap)
+    return bones
+
+
 def transferMhxToFk(rig, context):
     from . import target
 
@@ -343,19 +434,17 @@ def transferMhxToFk(rig, context):
     rLegIkToAnkle = rig["MhaLegIkToAnkle_R"]
 
     frames = getActiveFramesBetweenMarkers(rig, scn)
-    nFrames = len(frames)
     limbsBendPositive(rig, scn.McpFkIkArms, scn.McpFkIkLegs, frames)
 
-    for n,frame in enumerate(frames):
-        showProgress(n, frame, nFrames)
-        scn.frame_set(frame)
-        updateScene()
-        if scn.McpFkIkArms:
-            snapFkArm(rig, lArmSnapIk, lArmSnapFk, frame)
-            snapFkArm(rig, rArmSnapIk, rArmSnapFk, frame)
-        if scn.McpFkIkLegs:
-            snapFkLeg(rig, lLegSnapIk, lLegSnapFk, frame, lLegIkToAnkle)
-            snapFkLeg(rig, rLegSnapIk, rLegSnapFk, frame, rLegIkToAnkle)
+    trf = CRangeTransfer(rig, scn, frames)
+    trf.sample(getTransferBones(scn, [lArmSnapIk, lArmSnapFk, rArmSnapIk, rArmSnapFk],
+                                [lLegSnapIk, lLegSnapFk, rLegSnapIk, rLegSnapFk]))
+    if scn.McpFkIkArms:
+        trf.snapFkArm(lArmSnapIk, lArmSnapFk)
+        trf.snapFkArm(rArmSnapIk, rArmSnapFk)
+    if scn.McpFkIkLegs:
+        trf.snapFkLeg(lLegSnapIk, lLegSnapFk, lLegIkToAnkle)
+        trf.snapFkLeg(rLegSnapIk, rLegSnapFk, rLegIkToAnkle)
 
     rig.data.layers = oldLayers
     setMhxIk(rig, scn.McpFkIkArms, scn.McpFkIkLegs, 0.0)
@@ -389,17 +478,15 @@ def transferMhxToIk(rig, context):
 
     frames = getActiveFramesBetweenMarkers(rig, scn)
     #frames = range(scn.frame_start, scn.frame_end+1)
-    nFrames = len(frames)
-    for n,frame in enumerate(frames):
-        showProgress(n, frame, nFrames)
-        scn.frame_set(frame)
-        updateScene()
-        if scn.McpFkIkArms:
-            snapIkArm(rig, lArmSnapIk, lArmSnapFk, frame)
-            snapIkArm(rig, rArmSnapIk, rArmSnapFk, frame)
-        if scn.McpFkIkLegs:
-            snapIkLeg(rig, lLegSnapIk, lLegSnapFk, frame, lLegIkToAnkle)
-            snapIkLeg(rig, rLegSnapIk, rLegSnapFk, frame, rLegIkToAnkle)
+    trf = CRangeTransfer(rig, scn, frames)
+    trf.sample(getTransferBones(scn, [lArmSnapIk, lArmSnapFk, rArmSnapIk, rArmSnapFk],
+                                [lLegSnapIk, lLegSnapFk, rLegSnapIk, rLegSnapFk]))
+    if scn.McpFkIkArms:
+        trf.snapIkArm(lArmSnapIk, lArmSnapFk)
+        trf.snapIkArm(rArmSnapIk, rArmSnapFk)
+    if scn.McpFkIkLegs:
+        trf.snapIkLeg(lLegSnapIk, lLegSnapFk, lLegIkToAnkle)
+        trf.snapIkLeg(rLegSnapIk, rLegSnapFk, rLegIkToAnkle)
 
     rig.data.layers = oldLayers
     setMhxIk(rig, scn.McpFkIkArms, scn.McpFkIkLegs, 1.0)
@@ -606,17 +693,17 @@ def transferRigifyToIk(rig, context, delim):
 #-------------------------------------------------------------
 
 def limbsBendPositive(rig, doElbows, doKnees, frames):
-    limbs = {}
-    if doElbows:
-        pb = getTrgBone("forearm.L", rig)
-        minimizeFCurve(pb, rig, 0, frames)
-        pb = getTrgBone("forearm.R", rig)
+    for pb in getBendPositiveBones(rig, doElbows, doKnees):
         minimizeFCurve(pb, rig, 0, frames)
+
+
+def getBendPositiveBones(rig, doElbows, doKnees):
+    bnames = []
+    if doElbows:
+        bnames += ["forearm.L", "forearm.R"]
     if doKnees:
-        pb = getTrgBone("shin.L", rig)
-        minimizeFCurve(pb, rig, 0, frames)
-        pb = getTrgBone("shin.R", rig)
-        minimizeFCurve(pb, rig, 0, frames)
+        bnames += ["shin.L", "shin.R"]
+    return [getTrgBone(bname, rig) for bname in bnames]
 
 
 def minimizeFCurve(pb, rig, index, frames):
@@ -626,12 +713,9 @@ def minimizeFCurve(pb, rig, index, frames):
     y0 = fcu.evaluate(0)
     t0 = frames[0]
     t1 = frames[-1]
-    for kp in fcu.keyframe_points:
-        t = kp.co[0]
-        if t >= t0 and t <= t1:
-            y = kp.co[1]
-            if y < y0:
-                kp.co[1] = y0
+    co = getFCurveKeys(fcu)
+    co[(co[:,0] >= t0) & (co[:,0] <= t1) & (co[:,1] < y0), 1] = y0
+    setFCurveKeys(fcu, co)
 
 
 class MCP_OT_LimbsBendPositive(bpy.types.Operator):
@@ -23,6 +23,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from bpy.props import BoolProperty
 from mathutils import Matrix, Vector
 from .utils import *
@@ -66,36 +67,63 @@ def getPlaneInfo(plane):
 
 #-------------------------------------------------------------
 #   Offset and projection
+#   Bone matrices are sampled for all frames in one pass over the
+#   scene. Offsets and corrections are then computed for all frames
+#   at once, and the corrected channels are keyed in bulk.
 #-------------------------------------------------------------
 
-def getProjection(vec, ez):
-    return ez.dot(Vector(vec[:3]))
+def sampleBoneMatrices(scn, frames, bones, update=False):
+    bones = [pb for pb in bones if pb]
+    for pb in list(bones):
+        if pb.parent and pb.parent not in bones:
+            bones.append(pb.parent)
+    mats = dict([(pb.name, np.empty((len(frames),4,4))) for pb in bones])
+    nFrames = len(frames)
+    for n,frame in enumerate(frames):
+        scn.frame_set(frame)
+        if update:
+            fkik.updateScene()
+        showProgress(n, frame, nFrames)
+        for pb in bones:
+            mats[pb.name][n] = pb.matrix
+    return mats
 
 
-def getOffset(point, ez, origin):
-    vec = Vector(point[:3]) - origin
-    offset = -ez.dot(vec)
-    return offset
+def getPoseMatrices(gmats, pb, mats):
+    restInv = np.array(pb.bone.matrix_local.inverted())
+    if pb.parent:
+        parInv = np.linalg.inv(mats[pb.parent.name])
+        parRest = np.array(pb.parent.bone.matrix_local)
+        return np.matmul(np.dot(restInv, parRest), np.matmul(parInv, gmats))
+    else:
+        return np.matmul(restInv, gmats)
+
 
+def getProjections(vecs, ez):
+    return np.dot(vecs, np.array(ez))
 
-def getHeadOffset(pb, ez, origin):
-    head = pb.matrix.col[3]
-    return getOffset(head, ez, origin)
 
+def getOffsets(points, ez, origin):
+    return -np.dot(points - np.array(origin), np.array(ez))
 
-def getTailOffset(pb, ez, origin):
-    head = pb.matrix.col[3]
-    y = pb.matrix.col[1]
-    tail = head + y*pb.length
-    return getOffset(tail, ez, origin)
 
+def getHeadOffsets(mats, ez, origin):
+    return getOffsets(mats[:,:3,3], ez, origin)
 
-def addOffset(pb, offset, ez):
-    gmat = pb.matrix.copy()
-    x,y,z = offset*ez
-    gmat.col[3] += Vector((x,y,z,0))
-    pmat = fkik.getPoseMatrix(gmat, pb)
-    fkik.insertLocation(pb, pmat)
+
+def getTailOffsets(mats, length, ez, origin):
+    tails = mats[:,:3,3] + mats[:,:3,1]*length
+    return getOffsets(tails, ez, origin)
+
+
+def addOffsets(rig, pb, frames, mats, offsets, ez):
+    mask = (offsets > 0)
+    if not mask.any():
+        return
+    gmats = mats[pb.name][mask]
+    gmats[:,:3,3] += offsets[mask,None]*np.array(ez)
+    pmats = getPoseMatrices(gmats, pb, dict([(bname, bmats[mask]) for bname,bmats in mats.items()]))
+    setBoneFCurves(rig, pb.name, "location", np.array(frames)[mask], pmats[:,:3,3], interpolation=None)
 
 #-------------------------------------------------------------
 #   Toe below ball
@@ -123,57 +151,47 @@ def toesBelowBall(context):
 
 
 def toeBelowBall(context, frames, rig, plane, suffix):
-    from .retarget import getLocks
+    from .retarget import getLocks, correctMatrixForLocks, needsLockCorrection
 
     scn = context.scene
     foot,toe,mBall,mToe,mHeel = getFkFeetBones(rig, suffix)
     ez,origin,rot = getPlaneInfo(plane)
     order,lock = getLocks(toe, context)
-    factor = 1.0/toe.length
-    nFrames = len(frames)
+    mats = sampleBoneMatrices(scn, frames, [toe, mBall, mToe])
+    gmats = mats[toe.name].copy()
     if mBall:
-        for n,frame in enumerate(frames):
-            scn.frame_set(frame)
-            showProgress(n, frame, nFrames)
-            zToe = getProjection(mToe.matrix.col[3], ez)
-            zBall = getProjection(mBall.matrix.col[3], ez)
-            if zToe > zBall:
-                pmat = offsetToeRotation(toe, ez, factor, order, lock, context)
-            else:
-                pmat = fkik.getPoseMatrix(toe.matrix, toe)
-            pmat = keepToeRotationNegative(pmat, scn)
-            fkik.insertRotation(toe, pmat)
+        zToe = getProjections(mats[mToe.name][:,:3,3], ez)
+        zBall = getProjections(mats[mBall.name][:,:3,3], ez)
+        offset = (zToe > zBall)
     else:
-        for n,frame in enumerate(frames):
-            scn.frame_set(frame)
-            showProgress(n, frame, nFrames)
-            dzToe = getProjection(toe.matrix.col[1], ez)
-            if dzToe > 0:
-                pmat = offsetToeRotation(toe, ez, factor, order, lock, context)
-            else:
-                pmat = fkik.getPoseMatrix(toe.matrix, toe)
-            pmat = keepToeRotationNegative(pmat, scn)
-            fkik.insertRotation(toe, pmat)
-
-
-def offsetToeRotation(toe, ez, factor, order, lock, context):
-    from .retarget import correctMatrixForLocks
-
-    mat = toe.matrix.to_3x3()
-    y = mat.col[1]
-    y -= ez.dot(y)*ez
-    y.normalize()
-    x = mat.col[0]
-    x -= x.dot(y)*y
-    x.normalize()
-    z = x.cross(y)
-    mat.col[0] = x
-    mat.col[1] = y
-    mat.col[2] = z
-    gmat = mat.to_4x4()
-    gmat.col[3] = toe.matrix.col[3]
-    pmat = fkik.getPoseMatrix(gmat, toe)
-    return correctMatrixForLocks(pmat, order, lock, toe, context.scene.McpUseLimits)
+        dzToe = getProjections(gmats[:,:3,1], ez)
+        offset = (dzToe > 0)
+
+    gmats[offset] = offsetToeRotations(gmats[offset], ez)
+    pmats = getPoseMatrices(gmats, toe, mats)
+    useLimits = scn.McpUseLimits
+    useLocks = needsLockCorrection(toe, lock, useLimits)
+    for n,pmat in enumerate(pmats):
+        pmat = Matrix(pmat.tolist())
+        if offset[n] and useLocks:
+            pmat = correctMatrixForLocks(pmat, order, lock, toe, useLimits)
+        pmats[n] = keepToeRotationNegative(pmat, scn)
+    setBoneMatrixKeys(rig, toe, frames, pmats, False, interpolation=None)
+
+
+def offsetToeRotations(gmats, ez):
+    ez = np.array(ez)
+    x = gmats[:,:3,0]
+    y = gmats[:,:3,1]
+    y = y - np.dot(y, ez)[:,None]*ez
+    y /= np.linalg.norm(y, axis=1)[:,None]
+    x = x - np.sum(x*y, axis=1)[:,None]*y
+    x /= np.linalg.norm(x, axis=1)[:,None]
+    gmats = gmats.copy()
+    gmats[:,:3,0] = x
+    gmats[:,:3,1] = y
+    gmats[:,:3,2] = np.cross(x, y)
+    return gmats
 
 
 def keepToeRotationNegative(pmat, scn):
@@ -236,48 +254,34 @@ def getFkFeetBones(rig, suffix):
 
 def floorFkFoot(rig, plane, scn, frames):
     hips = getTrgBone("hips", rig)
-    lFoot,lToe,lmBall,lmToe,lmHeel = getFkFeetBones(rig, ".L")
-    rFoot,rToe,rmBall,rmToe,rmHeel = getFkFeetBones(rig, ".R")
+    lFeet = getFkFeetBones(rig, ".L")
+    rFeet = getFkFeetBones(rig, ".R")
     ez,origin,rot = getPlaneInfo(plane)
 
-    nFrames = len(frames)
-    for n,frame in enumerate(frames):
-        scn.frame_set(frame)
-        fkik.updateScene()
-        offset = 0
-        if scn.McpFloorLeft:
-            offset = getFkOffset(rig, ez, origin, lFoot, lToe, lmBall, lmToe, lmHeel)
-        if scn.McpFloorRight:
-            rOffset = getFkOffset(rig, ez, origin, rFoot, rToe, rmBall, rmToe, rmHeel)
-            if rOffset > offset:
-                offset = rOffset
-        showProgress(n, frame, nFrames)
-        if offset > 0:
-            addOffset(hips, offset, ez)
+    mats = sampleBoneMatrices(scn, frames, [hips] + list(lFeet) + list(rFeet), update=True)
+    offset = np.zeros(len(frames))
+    if scn.McpFloorLeft:
+        offset = getFkOffsets(mats, ez, origin, *lFeet)
+    if scn.McpFloorRight:
+        offset = np.maximum(offset, getFkOffsets(mats, ez, origin, *rFeet))
+    addOffsets(rig, hips, frames, mats, offset, ez)
 
 
-def getFkOffset(rig, ez, origin, foot, toe, mBall, mToe, mHeel):
+def getFkOffsets(mats, ez, origin, foot, toe, mBall, mToe, mHeel):
     if mBall:
-        offset = toeOffset = getHeadOffset(mToe, ez, origin)
-        ballOffset = getHeadOffset(mBall, ez, origin)
-        if ballOffset > offset:
-            offset = ballOffset
-        heelOffset = getHeadOffset(mHeel, ez, origin)
-        if heelOffset > offset:
-            offset = heelOffset
+        offset = np.maximum.reduce([
+            getHeadOffsets(mats[mToe.name], ez, origin),
+            getHeadOffsets(mats[mBall.name], ez, origin),
+            getHeadOffsets(mats[mHeel.name], ez, origin)])
     elif toe:
-        offset = getTailOffset(toe, ez, origin)
-        ballOffset = getHeadOffset(toe, ez, origin)
-        if ballOffset > offset:
-            offset = ballOffset
-        ball = toe.matrix.col[3]
-        y = toe.matrix.col[1]
-        heel = ball - y*foot.length
-        heelOffset = getOffset(heel, ez, origin)
-        if heelOffset > offset:
-            offset = heelOffset
+        tmats = mats[toe.name]
+        heels = tmats[:,:3,3] - tmats[:,:3,1]*foot.length
+        offset = np.maximum.reduce([
+            getTailOffsets(tmats, toe.length, ez, origin),
+            getHeadOffsets(tmats, ez, origin),
+            getOffsets(heels, ez, origin)])
     else:
-        offset = 0
+        offset = np.zeros(len(next(iter(mats.values()))))
 
     return offset
 
@@ -293,53 +297,27 @@ def floorIkFoot(rig, plane, scn, frames):
     if scn.McpFloorHips:
         fillKeyFrames(root, rig, frames, 3, mode='location')
 
-    nFrames = len(frames)
-    for n,frame in enumerate(frames):
-        scn.frame_set(frame)
-        showProgress(n, frame, nFrames)
-
-        if scn.McpFloorLeft:
-            lOffset = getIkOffset(rig, ez, origin, lleg)
-            if lOffset > 0:
-                addOffset(lleg, lOffset, ez)
-        else:
-            lOffset = 0
-        if scn.McpFloorRight:
-            rOffset = getIkOffset(rig, ez, origin, rleg)
-            if rOffset > 0:
-                addOffset(rleg, rOffset, ez)
-        else:
-            rOffset = 0
-
-        hOffset = min(lOffset,rOffset)
-        if hOffset > 0 and scn.McpFloorHips:
-            addOffset(root, hOffset, ez)
-
-
-def getIkOffset(rig, ez, origin, leg):
-    offset = getHeadOffset(leg, ez, origin)
-    tailOffset = getTailOffset(leg, ez, origin)
-    if tailOffset > offset:
-        offset = tailOffset
-    return offset
-
-
-    foot = rig.pose.bones["foot.rev" + suffix]
-    toe = rig.pose.bones["toe.rev" + suffix]
-
+    mats = sampleBoneMatrices(scn, frames, [root, lleg, rleg])
+    if scn.McpFloorLeft:
+        lOffset = getIkOffsets(mats, ez, origin, lleg)
+        addOffsets(rig, lleg, frames, mats, lOffset, ez)
+    else:
+        lOffset = np.zeros(len(frames))
+    if scn.McpFloorRight:
+        rOffset = getIkOffsets(mats, ez, origin, rleg)
+        addOffsets(rig, rleg, frames, mats, rOffset, ez)
+    else:
+        rOffset = np.zeros(len(frames))
 
-    ballOffset = getTailOffset(toe, ez, origin)
-    if ballOffset > offset:
-        offset = ballOffset
+    if scn.McpFloorHips:
+        hOffset = np.minimum(lOffset, rOffset)
+        addOffsets(rig, root, frames, mats, hOffset, ez)
 
-    ball = foot.matrix.col[3]
-    y = toe.matrix.col[1]
-    heel = ball + y*foot.length
-    heelOffset = getOffset(heel, ez, origin)
-    if heelOffset > offset:
-        offset = heelOffset
 
-    return offset
+def getIkOffsets(mats, ez, origin, leg):
+    lmats = mats[leg.name]
+    return np.maximum(getHeadOffsets(lmats, ez, origin),
+                      getTailOffsets(lmats, leg.length, ez, origin))
 
 
 class MCP_OT_FloorFoot(bpy.types.Operator):
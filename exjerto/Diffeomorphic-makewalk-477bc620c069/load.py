@@ -23,12 +23,14 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy, os, mathutils, math, time
+import numpy as np
 from math import sin, cos
 from mathutils import *
 from bpy.props import *
 
 from . import props
 from . import simplify
+from .bvh_decode import *
 from .utils import *
 
 if bpy.app.version < (2,80,0):
@@ -109,27 +111,29 @@ class CNode:
 #    Custom importer
 #
 
-Location = 1
-Rotation = 2
 Hierarchy = 1
 Motion = 2
 Frames = 3
 
 Epsilon = 1e-5
 
-def readBvhFile(context, filepath, scn, scan):
-    props.ensureInited(context)
-    setCategory("Load Bvh File")
-    scale = scn.McpBvhScale
-    startFrame = scn.McpStartFrame
-    endFrame = scn.McpEndFrame
-    frameno = 1
+def getFlipMatrix(scn):
     if scn.McpFlipYAxis:
         flipMatrix = Mult2(Matrix.Rotation(math.pi, 3, 'X'), Matrix.Rotation(math.pi, 3, 'Y'))
     else:
         flipMatrix = Matrix.Rotation(0, 3, 'X')
     if True or scn.McpRot90Anim:
         flipMatrix = Mult2(Matrix.Rotation(math.pi/2, 3, 'X'), flipMatrix)
+    return flipMatrix
+
+
+def readBvhFile(context, filepath, scn, scan):
+    props.ensureInited(context)
+    setCategory("Load Bvh File")
+    scale = scn.McpBvhScale
+    startFrame = scn.McpStartFrame
+    endFrame = scn.McpEndFrame
+    flipMatrix = getFlipMatrix(scn)
     if (scn.McpSubsample):
         ssFactor = scn.McpSSFactor
     else:
@@ -142,18 +146,79 @@ def readBvhFile(context, filepath, scn, scan):
         raise MocapError("Not a bvh file: " + fileName)
     startProgress( "Loading BVH file "+ fileName )
 
-    time1 = time.clock()
+    time1 = time.perf_counter()
+    fp = open(fileName, "r")
+    print( "Reading skeleton" )
+    root,nodes,rig = readBvhHierarchy(context, fp, scale, flipMatrix, scan)
+    if scan:
+        fp.close()
+        return root
+    if not rig:
+        fp.close()
+        raise MocapError("Bvh file \n%s\n is corrupt: No rig defined" % filepath)
+
+    nKeys = 0
+    nFrames = 0
+    for line in fp:
+        words = line.split()
+        if len(words) == 0:
+            continue
+        key = words[0].upper()
+        if key == 'FRAMES:':
+            nFrames = int(words[1])
+        elif key == 'FRAME' and words[1].upper() == 'TIME:':
+            frameTime = float(words[2])
+            ssFactor = getSubsampleFactor(frameTime, scn.render.fps, ssFactor, defaultSS)
+            startFrame *= ssFactor
+            endFrame *= ssFactor
+            # The rest of the file is the frame block
+            channelLists = [node.channels for node in nodes]
+            nChannels = sum([len(indices) for channels in channelLists for (mode, indices) in channels])
+            data = readMotionData(fp, nChannels, nFrames)
+            data = selectFrames(data, startFrame, endFrame, ssFactor)
+            nKeys = addFrames(rig, getChannelArrays(data, channelLists), len(data), nodes, scale, flipMatrix)
+            break
+
+    fp.close()
+    finishBvhRig(rig, filepath)
+    time2 = time.perf_counter()
+    endProgress("Bvh file %s loaded in %.3f s" % (filepath, time2-time1))
+    if nKeys == 0:
+        print("Warning: No frames in range %d -- %d." % (startFrame, endFrame))
+    clearCategory()
+    return rig
+
+#
+#    loadDecodedBvh(context, filepath, decoded, scn):
+#    Create the bvh rig from the output of bvh_decode.decodeBvhFile.
+#
+
+def loadDecodedBvh(context, filepath, decoded, scn):
+    props.ensureInited(context)
+    scale = scn.McpBvhScale
+    flipMatrix = getFlipMatrix(scn)
+    root,nodes,rig = readBvhHierarchy(context, decoded["header"], scale, flipMatrix, False)
+    if not rig:
+        raise MocapError("Bvh file \n%s\n is corrupt: No rig defined" % filepath)
+    nKeys = addFrames(rig, decoded["channels"], decoded["nKeys"], nodes, scale, flipMatrix)
+    finishBvhRig(rig, filepath)
+    if nKeys == 0:
+        print("Warning: No frames in range %d -- %d." % (scn.McpStartFrame, scn.McpEndFrame))
+    return rig
+
+#
+#    readBvhHierarchy(context, lines, scale, flipMatrix, scan):
+#    Read lines up to MOTION and build the rig.
+#
+
+def readBvhHierarchy(context, lines, scale, flipMatrix, scan):
     level = 0
-    nErrors = 0
     coll = getCollection(context)
-    rig = None
+    root = nodes = rig = None
+    status = None
 
-    fp = open(fileName, "rU")
-    print( "Reading skeleton" )
-    lineNo = 0
-    for line in fp:
+    for line in lines:
         words= line.split()
-        lineNo += 1
         if len(words) == 0:
             continue
         key = words[0].upper()
@@ -164,7 +229,7 @@ def readBvhFile(context, filepath, scn, scan):
             if level != 0:
                 raise MocapError("Tokenizer out of kilter %d" % level)
             if scan:
-                return root
+                return root,nodes,None
             amt = bpy.data.armatures.new("BvhAmt")
             rig = bpy.data.objects.new("BvhRig", amt)
             coll.objects.link(rig)
@@ -175,8 +240,13 @@ def readBvhFile(context, filepath, scn, scan):
             root.build(amt, Vector((0,0,0)), None)
             #root.display('')
             bpy.ops.object.mode_set(mode='OBJECT')
-            status = Motion
             print("Reading motion")
+
+            #source.findSrcArmature(context, rig)
+            bpy.ops.object.mode_set(mode='POSE')
+            for pb in rig.pose.bones:
+                pb.rotation_mode = 'QUATERNION'
+            return root,nodes,rig
         elif status == Hierarchy:
             if key == 'ROOT':
                 node = CNode(words, None)
@@ -193,14 +263,7 @@ def readBvhFile(context, filepath, scn, scan):
                 node = CNode(words, node)
                 ended = True
             elif key == 'CHANNELS':
-                oldmode = None
-                for word in words[2:]:
-                    (index, mode, sign) = channelYup(word)
-                    if mode != oldmode:
-                        indices = []
-                        node.channels.append((mode, indices))
-                        oldmode = mode
-                    indices.append((index, sign))
+                node.channels = getChannels(words)
             elif key == '{':
                 level += 1
             elif key == '}':
@@ -213,116 +276,48 @@ def readBvhFile(context, filepath, scn, scan):
                 node = node.parent
             else:
                 raise MocapError("Did not expect %s" % words[0])
-        elif status == Motion:
-            if key == 'FRAMES:':
-                nFrames = int(words[1])
-            elif key == 'FRAME' and words[1].upper() == 'TIME:':
-                frameTime = float(words[2])
-                frameFactor = int(1.0/(scn.render.fps*frameTime) + 0.49)
-                if defaultSS:
-                    ssFactor = frameFactor if frameFactor > 0 else 1
-                startFrame *= ssFactor
-                endFrame *= ssFactor
-                status = Frames
-                frame = 0
-                frameno = 1
-
-                #source.findSrcArmature(context, rig)
-                bpy.ops.object.mode_set(mode='POSE')
-                pbones = rig.pose.bones
-                for pb in pbones:
-                    pb.rotation_mode = 'QUATERNION'
-        elif status == Frames:
-            if (frame >= startFrame and
-                frame <= endFrame and
-                frame % ssFactor == 0 and
-                frame < nFrames):
-                addFrame(words, frameno, nodes, pbones, scale, flipMatrix)
-                showProgress(frameno, frame, nFrames, step=200)
-                frameno += 1
-            frame += 1
 
-    fp.close()
-    if not rig:
-        raise MocapError("Bvh file \n%s\n is corrupt: No rig defined" % filepath)
+    return root,nodes,None
+
+
+def finishBvhRig(rig, filepath):
     setInterpolation(rig)
-    time2 = time.clock()
-    endProgress("Bvh file %s loaded in %.3f s" % (filepath, time2-time1))
-    if frameno == 1:
-        print("Warning: No frames in range %d -- %d." % (startFrame, endFrame))
     renameBvhRig(rig, filepath)
     rig.McpIsSourceRig = True
-    clearCategory()
-    return rig
 
 #
-#    addFrame(words, frame, nodes, pbones, scale, flipMatrix):
+#    addFrames(rig, arrays, nKeys, nodes, scale, flipMatrix):
+#    Key the channel arrays of all frames in bulk, after converting
+#    them to the bone frames.
 #
 
-def addFrame(words, frame, nodes, pbones, scale, flipMatrix):
-    m = 0
-    first = True
+def addFrames(rig, arrays, nKeys, nodes, scale, flipMatrix):
+    if nKeys == 0:
+        return 0
+    frames = np.arange(1, nKeys+1, dtype=float)
+    flip = np.array(flipMatrix)
     flipInv = flipMatrix.inverted()
-    for node in nodes:
-        name = node.name
-        try:
-            pb = pbones[name]
-        except:
-            pb = None
-        if pb:
-            for (mode, indices) in node.channels:
-                if mode == Location:
-                    vec = Vector((0,0,0))
-                    for (index, sign) in indices:
-                        vec[index] = sign*float(words[m])
-                        m += 1
-                    if first:
-                        pb.location = Mult2(node.inverse, scale * Mult2(flipMatrix, vec) - node.head)
-                        pb.keyframe_insert('location', frame=frame, group=name)
-                    first = False
-                elif mode == Rotation:
-                    mats = []
-                    for (axis, sign) in indices:
-                        angle = sign*float(words[m])*Deg2Rad
-                        mats.append(Matrix.Rotation(angle, 3, axis))
-                        m += 1
-                    mat = Mult3(Mult2(node.inverse, flipMatrix),  Mult3(mats[0], mats[1], mats[2]), Mult2(flipInv, node.matrix))
-                    setRotation(pb, mat, frame, name)
-
-    return
+    pbones = rig.pose.bones
 
-#
-#    channelYup(word):
-#    channelZup(word):
-#
-
-def channelYup(word):
-    if word == 'Xrotation':
-        return ('X', Rotation, +1)
-    elif word == 'Yrotation':
-        return ('Y', Rotation, +1)
-    elif word == 'Zrotation':
-        return ('Z', Rotation, +1)
-    elif word == 'Xposition':
-        return (0, Location, +1)
-    elif word == 'Yposition':
-        return (1, Location, +1)
-    elif word == 'Zposition':
-        return (2, Location, +1)
-
-def channelZup(word):
-    if word == 'Xrotation':
-        return ('X', Rotation, +1)
-    elif word == 'Yrotation':
-        return ('Z', Rotation, +1)
-    elif word == 'Zrotation':
-        return ('Y', Rotation, -1)
-    elif word == 'Xposition':
-        return (0, Location, +1)
-    elif word == 'Yposition':
-        return (2, Location, +1)
-    elif word == 'Zposition':
-        return (1, Location, -1)
+    first = True
+    for node,channels in zip(nodes, arrays):
+        name = node.name
+        pb = pbones.get(name)
+        if pb is None:
+            continue
+        for (mode, data) in channels:
+            if mode == Location:
+                if first:
+                    locs = np.dot(scale*np.dot(data, flip.T) - np.array(node.head), np.array(node.inverse).T)
+                    setBoneFCurves(rig, name, 'location', frames, locs)
+                first = False
+            elif mode == Rotation:
+                left = Mult2(node.inverse, flipMatrix).to_quaternion()
+                right = Mult2(flipInv, node.matrix).to_quaternion()
+                quats = quatMultiply(quatMultiply(np.array(left), data), np.array(right))
+                quats[quats[:,0] < 0] *= -1
+                setBoneFCurves(rig, name, 'rotation_quaternion', frames, quats)
+    return nKeys
 
 #
 #   end BVH importer
@@ -23,6 +23,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from math import pi, sqrt
 from mathutils import *
 from . import load, simplify, props, action
@@ -38,15 +39,14 @@ def normalizeRotCurves(scn, rig, fcurves, frames):
     for fcu in fcurves:
         (name, mode) = fCurveIdentity(fcu)
         if mode == 'rotation_quaternion':
-            hasQuat[name] = rig.pose.bones[name]
+            if name not in hasQuat.keys():
+                pb = rig.pose.bones[name]
+                hasQuat[name] = np.tile(np.array(pb.rotation_quaternion), (len(frames),1))
+            hasQuat[name][:,fcu.array_index] = sampleFCurve(fcu, frames)
 
-    nFrames = len(frames)
-    for n,frame in enumerate(frames):
-        scn.frame_set(frame)
-        showProgress(n, frame, nFrames)
-        for (name, pb) in hasQuat.items():
-            pb.rotation_quaternion.normalize()
-            pb.keyframe_insert("rotation_quaternion", group=name)
+    for (name, quats) in hasQuat.items():
+        quats /= np.linalg.norm(quats, axis=1)[:,None]
+        setBoneFCurves(rig, name, "rotation_quaternion", frames, quats, interpolation=None)
 
 #
 #   loopFCurves(context):
@@ -93,19 +93,17 @@ def loopFCurves(context):
             restMat = pb.bone.matrix_local.to_3x3()
             restInv = restMat.inverted()
 
-            heads = {}
+            # The heads depend on the whole rig, so they are still evaluated frame by frame
+            heads = []
             for n,frame in enumerate(frames):
                 scn.frame_set(frame)
                 showProgress(n, frame, nFrames)
-                heads[frame] = pb.head.copy()
+                heads.append(pb.head.copy())
 
-            for n,frame in enumerate(frames):
-                showProgress(n, frame, nFrames)
-                scn.frame_set(frame)
-                head = heads[frame] - (frame-minTime)*offs
-                diff = head - pb.bone.head_local
-                pb.location = Mult2(restInv, diff)
-                pb.keyframe_insert("location", group=pb.name)
+            times = np.array(frames) - minTime
+            diffs = np.array(heads) - times[:,None]*np.array(offs) - np.array(pb.bone.head_local)
+            locs = np.dot(diffs, np.array(restInv).T)
+            setBoneFCurves(rig, pb.name, "location", frames, locs, interpolation=None)
 
     return
     for fcu in fcurves:
@@ -119,43 +117,36 @@ def loopFCurve(fcu, t0, tn, scn):
 
     v0 = fcu.evaluate(t0)
     vn = fcu.evaluate(tn)
-    fcu.keyframe_points.insert(frame=t0, value=v0)
-    fcu.keyframe_points.insert(frame=tn, value=vn)
+    insertFCurveKeys(fcu, [(t0,v0), (tn,vn)])
     (mode, upper, lower, diff) = simplify.getFCurveLimits(fcu)
     if mode == 'location':
         dv = vn-v0
     else:
         dv = 0.0
 
-    newpoints = []
-    for dt in range(delta):
-        eps = 0.5*(1-dt/delta)
-
-        t1 = t0+dt
-        v1 = fcu.evaluate(t1)
-        tm = tn+dt
-        vm = fcu.evaluate(tm) - dv
-        if (v1 > upper) and (vm < lower):
-            vm += diff
-        elif (v1 < lower) and (vm > upper):
-            vm -= diff
-        pt1 = (t1, (eps*vm + (1-eps)*v1))
-
-        t1 = t0-dt
-        v1 = fcu.evaluate(t1) + dv
-        tm = tn-dt
-        vm = fcu.evaluate(tm)
-        if (v1 > upper) and (vm < lower):
-            v1 -= diff
-        elif (v1 < lower) and (vm > upper):
-            v1 += diff
-        ptm = (tm, eps*v1 + (1-eps)*vm)
-
-        newpoints.extend([pt1,ptm])
-
-    newpoints.sort()
-    for (t,v) in newpoints:
-        fcu.keyframe_points.insert(frame=t, value=v)
+    # Sample the curve once around both ends of the loop
+    dts = np.arange(delta)
+    eps = 0.5*(1-dts/delta)
+    times = np.concatenate((t0+dts, tn+dts, t0-dts, tn-dts))
+    values = sampleFCurve(fcu, times).reshape((4,delta))
+
+    v1 = values[0]
+    vm = values[1] - dv
+    wrap = diff*((v1 > upper) & (vm < lower)) - diff*((v1 < lower) & (vm > upper))
+    vm += wrap
+    pts1 = np.stack((t0+dts, eps*vm + (1-eps)*v1), axis=1)
+
+    v1 = values[2] + dv
+    vm = values[3]
+    wrap = diff*((v1 > upper) & (vm < lower)) - diff*((v1 < lower) & (vm > upper))
+    v1 -= wrap
+    ptsm = np.stack((tn-dts, eps*v1 + (1-eps)*vm), axis=1)
+
+    newpoints = np.concatenate((pts1, ptsm))
+    newpoints = newpoints[np.lexsort((newpoints[:,1], newpoints[:,0]))]
+    # Like repeated inserts, the last point at a frame wins
+    last = np.append(newpoints[1:,0] != newpoints[:-1,0], True)
+    insertFCurveKeys(fcu, newpoints[last])
     return
 
 class MCP_OT_LoopFCurves(bpy.types.Operator):
@@ -188,18 +179,13 @@ def repeatFCurves(context, nRepeats):
 
     dt0 = maxTime-minTime
     for fcu in fcurves:
-        (name, mode) = fCurveIdentity(fcu)
         dy0 = fcu.evaluate(maxTime) - fcu.evaluate(minTime)
-        points = []
-        for kp in fcu.keyframe_points:
-            t = kp.co[0]
-            if t >= minTime and t < maxTime:
-                points.append((t, kp.co[1]))
-        for n in range(1,nRepeats):
-            dt = n*dt0
-            dy = n*dy0
-            for (t,y) in points:
-                fcu.keyframe_points.insert(t+dt, y+dy, options={'FAST'})
+        co = getFCurveKeys(fcu)
+        points = co[(co[:,0] >= minTime) & (co[:,0] < maxTime)]
+        if nRepeats < 2 or len(points) == 0:
+            continue
+        offsets = np.arange(1,nRepeats)[:,None,None] * np.array((dt0, dy0))
+        insertFCurveKeys(fcu, (points[None,:,:] + offsets).reshape((-1,2)))
 
     endProgress("F-curves repeated %d times" % nRepeats)
 
@@ -223,7 +209,7 @@ class MCP_OT_RepeatFCurves(bpy.types.Operator):
 #
 
 def stitchActions(context):
-    from .retarget import getLocks, correctMatrixForLocks
+    from .retarget import getLocks, correctMatrixForLocks, needsLockCorrection
 
     action.listAllActions(context)
     scn = context.scene
@@ -244,7 +230,7 @@ def stitchActions(context):
     frames1 = range(first1, frame1)
     frames2 = range(frame2, last2+1)
     frames = range(first1, last2+shift+1)
-    bmats1,_ = getBaseMatrices(act1, frames1, rig, True)
+    bmats1,useLoc1 = getBaseMatrices(act1, frames1, rig, True)
     bmats2,useLoc = getBaseMatrices(act2, frames2, rig, True)
 
     deletes = []
@@ -262,43 +248,28 @@ def stitchActions(context):
         pb = rig.pose.bones[bname]
         orders[bname],locks[bname] = getLocks(pb, context)
 
-    nFrames = len(frames)
-    for n,frame in enumerate(frames):
-        scn.frame_set(frame)
-        showProgress(n, frame, nFrames)
-
-        if frame <= frame1-delta:
-            n1 = frame - first1
-            for bname,mats in bmats1.items():
-                pb = rig.pose.bones[bname]
-                mat = mats[n1]
-                if useLoc[bname]:
-                    insertLocation(pb, mat)
-                insertRotation(pb, mat)
-
-        elif frame >= frame1:
-            n2 = frame - frame1
-            for bname,mats in bmats2.items():
-                pb = rig.pose.bones[bname]
-                mat = mats[n2]
-                if useLoc[bname]:
-                    insertLocation(pb, mat)
-                insertRotation(pb, mat)
-
-        else:
-            n1 = frame - first1
-            n2 = frame - frame1 + delta
-            eps = factor*n2
-            for bname,mats2 in bmats2.items():
-                pb = rig.pose.bones[bname]
-                mats1 = bmats1[bname]
-                mat1 = mats1[n1]
-                mat2 = mats2[n2]
-                mat = (1-eps)*mat1 + eps*mat2
-                mat = correctMatrixForLocks(mat, orders[bname], locks[bname], pb, scn.McpUseLimits)
-                if useLoc[bname]:
-                    insertLocation(pb, mat)
-                insertRotation(pb, mat)
+    # Output frame f shows frame f - shift of the second action
+    frames = np.array(frames)
+    before = frames[frames <= frame1-delta]
+    blend = frames[(frames > frame1-delta) & (frames < frame1)]
+    after = frames[frames >= frame1]
+    eps = factor*(blend - frame1 + delta)
+
+    for bname,mats1 in bmats1.items():
+        pb = rig.pose.bones[bname]
+        mats1 = np.array(mats1)
+        if bname not in bmats2.keys():
+            setBoneMatrixKeys(rig, pb, before, mats1[before-first1], useLoc1[bname])
+            continue
+        mats2 = np.array(bmats2[bname])
+        mats = ((1-eps)[:,None,None]*mats1[blend-first1] +
+                eps[:,None,None]*mats2[blend-frame1+delta])
+        if needsLockCorrection(pb, locks[bname], scn.McpUseLimits):
+            for n,mat in enumerate(mats):
+                mat = correctMatrixForLocks(Matrix(mat.tolist()), orders[bname], locks[bname], pb, scn.McpUseLimits)
+                mats[n] = np.array(mat)
+        mats = np.concatenate((mats1[before-first1], mats, mats2[after-frame1+delta]))
+        setBoneMatrixKeys(rig, pb, frames, mats, useLoc[bname])
 
     setInterpolation(rig)
     act = rig.animation_data.action
@@ -339,108 +310,77 @@ class MCP_OT_StitchActions(bpy.types.Operator):
 #   class MCP_OT_ShiftBoneFCurves(bpy.types.Operator):
 #
 
-def getBaseMatrices(act, frames, rig, useAll):
-    locFcurves = {}
-    quatFcurves = {}
-    eulerFcurves = {}
+BoneChannels = {
+    "location" : 3,
+    "rotation_euler" : 3,
+    "rotation_quaternion" : 4,
+}
+
+#
+#   sampleBoneChannels(act, frames, rig, useAll):
+#   Sample the location and rotation F-curves of all (or all selected)
+#   bones. Returns a dict bname -> {channel: array of shape (nFrames, nIndices)}.
+#   Indices without F-curve keep the current pose value.
+#
+
+def sampleBoneChannels(act, frames, rig, useAll):
+    samples = {}
     for fcu in act.fcurves:
         (bname, mode) = fCurveIdentity(fcu)
-        if bname in rig.pose.bones.keys():
-            pb = rig.pose.bones[bname]
-        else:
+        if bname not in rig.pose.bones.keys() or mode not in BoneChannels.keys():
+            continue
+        pb = rig.pose.bones[bname]
+        if not (useAll or pb.bone.select):
             continue
-        if useAll or pb.bone.select:
-            if mode == "location":
-                try:
-                    fcurves = locFcurves[bname]
-                except KeyError:
-                    fcurves = locFcurves[bname] = [None,None,None]
-            elif mode == "rotation_euler":
-                try:
-                    fcurves = eulerFcurves[bname]
-                except KeyError:
-                    fcurves = eulerFcurves[bname] = [None,None,None]
-            elif mode == "rotation_quaternion":
-                try:
-                    fcurves = quatFcurves[bname]
-                except KeyError:
-                    fcurves = quatFcurves[bname] = [None,None,None,None]
-            else:
-                continue
-
-            fcurves[fcu.array_index] = fcu
+        channels = samples.setdefault(bname, {})
+        if mode not in channels.keys():
+            channels[mode] = np.tile(np.array(getattr(pb, mode)), (len(frames),1))
+        channels[mode][:,fcu.array_index] = sampleFCurve(fcu, frames)
+    return samples
+
 
+def getBaseMatrices(act, frames, rig, useAll):
+    samples = sampleBoneChannels(act, frames, rig, useAll)
     basemats = {}
     useLoc = {}
-    for bname,fcurves in eulerFcurves.items():
-        useLoc[bname] = False
-        order = rig.pose.bones[bname].rotation_mode
-        fcu0,fcu1,fcu2 = fcurves
-        rmats = basemats[bname] = []
-        for frame in frames:
-            euler = Euler((fcu0.evaluate(frame), fcu1.evaluate(frame), fcu2.evaluate(frame)))
-            rmats.append(euler.to_matrix().to_4x4())
-
-    for bname,fcurves in quatFcurves.items():
-        useLoc[bname] = False
-        fcu0,fcu1,fcu2,fcu3 = fcurves
-        rmats = basemats[bname] = []
-        for frame in frames:
-            quat = Quaternion((fcu0.evaluate(frame), fcu1.evaluate(frame), fcu2.evaluate(frame), fcu3.evaluate(frame)))
-            rmats.append(quat.to_matrix().to_4x4())
-
-    for bname,fcurves in locFcurves.items():
-        useLoc[bname] = True
-        fcu0,fcu1,fcu2 = fcurves
-        tmats = []
-        for frame in frames:
-            loc = (fcu0.evaluate(frame), fcu1.evaluate(frame), fcu2.evaluate(frame))
-            tmats.append(Matrix.Translation(loc))
-        try:
-            rmats = basemats[bname]
-        except KeyError:
-            basemats[bname] = tmats
-            rmats = None
-        if rmats:
-            mats = []
-            for n,rmat in enumerate(rmats):
-                tmat = tmats[n]
-                mats.append( Mult2(tmat, rmat) )
-            basemats[bname] = mats
+    for bname,channels in samples.items():
+        pb = rig.pose.bones[bname]
+        mats = np.tile(np.identity(4), (len(frames),1,1))
+        if "rotation_quaternion" in channels.keys():
+            mats[:,:3,:3] = quatsToMatrices(channels["rotation_quaternion"])
+        elif "rotation_euler" in channels.keys():
+            order = pb.rotation_mode
+            if order in ['QUATERNION', 'AXIS_ANGLE']:
+                order = 'XYZ'
+            mats[:,:3,:3] = eulersToMatrices(channels["rotation_euler"], order)
+        useLoc[bname] = ("location" in channels.keys())
+        if useLoc[bname]:
+            mats[:,:3,3] = channels["location"]
+        basemats[bname] = mats
 
     return basemats, useLoc
 
 
 def shiftBoneFCurves(rig, context):
-    from .retarget import getLocks, correctMatrixForLocks
+    from .retarget import getLocks, correctMatrixForLocks, needsLockCorrection
 
     scn = context.scene
     frames = [scn.frame_current] + getActiveFrames(rig)
-    nFrames = len(frames)
     act = getAction(rig)
     if not act:
         return
     basemats, useLoc = getBaseMatrices(act, frames, rig, False)
 
-    deltaMat = {}
-    orders = {}
-    locks = {}
     for bname,bmats in basemats.items():
         pb = rig.pose.bones[bname]
-        bmat = bmats[0]
-        deltaMat[pb.name] = Mult2(pb.matrix_basis, bmat.inverted())
-        orders[pb.name], locks[pb.name] = getLocks(pb, context)
-
-    for n,frame in enumerate(frames[1:]):
-        scn.frame_set(frame)
-        showProgress(n, frame, nFrames)
-        for bname,bmats in basemats.items():
-            pb = rig.pose.bones[bname]
-            mat = Mult2(deltaMat[pb.name], bmats[n+1])
-            mat = correctMatrixForLocks(mat, orders[bname], locks[bname], pb, scn.McpUseLimits)
-            if useLoc[bname]:
-                insertLocation(pb, mat)
-            insertRotation(pb, mat)
+        deltaMat = np.array(pb.matrix_basis) @ np.linalg.inv(bmats[0])
+        mats = np.matmul(deltaMat, bmats[1:])
+        order,locks = getLocks(pb, context)
+        if needsLockCorrection(pb, locks, scn.McpUseLimits):
+            for n,mat in enumerate(mats):
+                mat = correctMatrixForLocks(Matrix(mat.tolist()), order, locks, pb, scn.McpUseLimits)
+                mats[n] = np.array(mat)
+        setBoneMatrixKeys(rig, pb, frames[1:], mats, useLoc[bname], interpolation=None)
 
 
 def printmat(mat):
@@ -484,13 +424,14 @@ def fixateBoneFCurves(rig, scn):
 
     for fcu in act.fcurves:
         (bname, mode) = fCurveIdentity(fcu)
+        if bname not in rig.pose.bones.keys():
+            continue
         pb = rig.pose.bones[bname]
         if pb.bone.select and isLocation(mode) and fixArray[fcu.array_index]:
             value = fcu.evaluate(frame)
-            for kp in fcu.keyframe_points:
-                if kp.co[0] >= minTime and kp.co[0] <= maxTime:
-                    kp.co[1] = value
-
+            co = getFCurveKeys(fcu)
+            co[(co[:,0] >= minTime) & (co[:,0] <= maxTime), 1] = value
+            setFCurveKeys(fcu, co)
 
 class MCP_OT_FixateBoneFCurves(bpy.types.Operator):
     bl_idname = "mcp.fixate_bone"
@@ -190,6 +190,7 @@ def readDirectory(directory, prefix):
         (name, ext) = os.path.splitext(fileName)
         if name[:n] == prefix and ext == ".bvh":
             paths.append("%s/%s" % (realdir, fileName))
+    paths.sort()
     return paths
 
 
@@ -199,11 +200,14 @@ class MCP_OT_Batch(bpy.types.Operator):
     bl_options = {'UNDO'}
 
     def execute(self, context):
-        paths = readDirectory(context.scene.McpDirectory, context.scene.McpPrefix)
-        trgRig = context.object
-        for filepath in paths:
-            setActiveObject(context, trgRig)
-            loadRetargetSimplify(context, filepath)
+        from .retarget import batchRetargetSimplify
+        from .utils import MocapError
+        scn = context.scene
+        paths = readDirectory(scn.McpDirectory, scn.McpPrefix)
+        try:
+            batchRetargetSimplify(context, paths, scn.McpBatchProcesses)
+        except MocapError:
+            bpy.ops.mcp.error('INVOKE_DEFAULT')
         return{"FINISHED"}
 
 
@@ -504,6 +508,11 @@ def initialize():
         maxlen=24,
         default="")
 
+    bpy.types.Scene.McpBatchProcesses = IntProperty(
+        name="Processes",
+        description="Number of worker processes in batch runs. They read the bvh files, and retarget and simplify the animation, while Blender builds the rigs and writes the keys. 0 uses all cores, 1 does everything in Blender, one file at a time",
+        min=0, default=0)
+
     # T_Pose
 
     bpy.types.Scene.McpAutoCorrectTPose = BoolProperty(
@@ -41,12 +41,15 @@
 
 import bpy
 import mathutils
+import os
 import time
+import numpy as np
 from collections import OrderedDict
 from mathutils import *
 from bpy.props import *
 
-from .simplify import simplifyFCurves, rescaleFCurves
+from .simplify import simplifyFCurves, rescaleFCurves, getMaxErrors
+from .anim_arrays import retargetBones
 from .utils import *
 from . import t_pose
 if bpy.app.version < (2,80,0):
@@ -62,6 +65,7 @@ class CAnimation:
         self.trgRig = trgRig
         self.scene = context.scene
         self.boneAnims = OrderedDict()
+        self.keys = KeyBuffer(trgRig)
 
         for (trgName, srcName) in boneAssoc:
             try:
@@ -87,6 +91,7 @@ class CAnimation:
         t_pose.setTPose(self.trgRig, context)
         for banim in self.boneAnims.values():
             banim.insertTPoseFrame()
+        self.keys.write()
         context.scene.frame_set(0)
         for banim in self.boneAnims.values():
             banim.getTPoseMatrix()
@@ -104,6 +109,30 @@ class CAnimation:
             unhideObjects(objects)
 
 
+    def getOfflineJob(self, frames):
+        # The rig data that anim_arrays.retargetBones needs, as arrays
+        # that can be sent to a worker process
+        banims = list(self.boneAnims.values())
+        bones = []
+        for banim in banims:
+            if banim.parent:
+                parent = banims.index(banim.parent)
+            else:
+                parent = -1
+            bones.append(banim.getOfflineData(parent))
+        return {
+            "frames" : np.array(frames, dtype=float),
+            "source" : getSourceData(self.srcRig, frames),
+            "bones" : bones,
+        }
+
+
+    def retargetOffline(self, job):
+        frames = job["frames"]
+        for (bname,channel),values in retargetBones(job).items():
+            setBoneFCurves(self.trgRig, bname, channel, frames, values)
+
+
 class CBoneAnim:
 
     def __init__(self, srcBone, trgBone, anim, context):
@@ -114,6 +143,7 @@ class CBoneAnim:
         self.trgMatrix = None
         self.srcBone = srcBone
         self.trgBone = trgBone
+        self.keys = anim.keys
         self.order,self.locks = getLocks(trgBone, context)
         self.aMatrix = None
         self.parent = self.getParent(trgBone, anim)
@@ -174,10 +204,9 @@ class CBoneAnim:
 
     def insertKeyFrame(self, mat, frame):
         pb = self.trgBone
-        setRotation(pb, mat, frame, pb.name)
+        self.keys.insertRotation(pb, mat, frame)
         if not self.parent:
-            pb.location = mat.to_translation()
-            pb.keyframe_insert("location", frame=frame, group=pb.name)
+            self.keys.insertLocation(pb, mat.to_translation(), frame)
 
 
     def insertTPoseFrame(self):
@@ -229,6 +258,27 @@ class CBoneAnim:
             print("MB2", self.trgBone.matrix)
 
 
+    def getOfflineData(self, parent):
+        pb = self.trgBone
+        limits = []
+        for cns in getRotationLimits(pb, self.useLimits):
+            limits.append((
+                (cns.use_limit_x, cns.use_limit_y, cns.use_limit_z),
+                (cns.min_x, cns.min_y, cns.min_z),
+                (cns.max_x, cns.max_y, cns.max_z)))
+        return {
+            "name" : pb.name,
+            "source" : self.srcBone.name,
+            "parent" : parent,
+            "A" : np.array(self.aMatrix),
+            "B" : np.array(self.bMatrix),
+            "rotation_mode" : pb.rotation_mode,
+            "order" : self.order,
+            "locks" : self.locks,
+            "limits" : limits,
+        }
+
+
 def getLocks(pb, context):
     scn = context.scene
     locks = []
@@ -263,6 +313,25 @@ def getLocks(pb, context):
     return order,locks
 
 
+def needsLockCorrection(pb, locks, useLimits):
+    if locks:
+        return True
+    return (len(getRotationLimits(pb, useLimits)) > 0)
+
+
+def getRotationLimits(pb, useLimits):
+    if not useLimits:
+        return []
+    limits = []
+    for cns in pb.constraints:
+        if (cns.type == 'LIMIT_ROTATION' and
+            cns.owner_space == 'LOCAL' and
+            not cns.mute and
+            cns.influence > 0.5):
+            limits.append(cns)
+    return limits
+
+
 def correctMatrixForLocks(mat, order, locks, pb, useLimits):
     head = Vector(mat.col[3])
 
@@ -276,24 +345,92 @@ def correctMatrixForLocks(mat, order, locks, pb, useLimits):
         mat.col[3] = head
         return mat
 
-    for cns in pb.constraints:
-        if (cns.type == 'LIMIT_ROTATION' and
-            cns.owner_space == 'LOCAL' and
-            not cns.mute and
-            cns.influence > 0.5):
-            euler = mat.to_3x3().to_euler(order)
-            if cns.use_limit_x:
-                euler.x = min(cns.max_x, max(cns.min_x, euler.x))
-            if cns.use_limit_y:
-                euler.y = min(cns.max_y, max(cns.min_y, euler.y))
-            if cns.use_limit_z:
-                euler.z = min(cns.max_z, max(cns.min_z, euler.z))
-            mat = euler.to_matrix().to_4x4()
+    for cns in getRotationLimits(pb, useLimits):
+        euler = mat.to_3x3().to_euler(order)
+        if cns.use_limit_x:
+            euler.x = min(cns.max_x, max(cns.min_x, euler.x))
+        if cns.use_limit_y:
+            euler.y = min(cns.max_y, max(cns.min_y, euler.y))
+        if cns.use_limit_z:
+            euler.z = min(cns.max_z, max(cns.min_z, euler.z))
+        mat = euler.to_matrix().to_4x4()
 
     mat.col[3] = head
     return mat
 
 
+#
+#   Offline evaluation of the source rig.
+#   Pose matrices are computed from the action F-curves and the rest
+#   pose, without stepping the scene through each frame. This only
+#   reproduces Blender's evaluation for plain rigs, e.g. loaded bvh files.
+#
+
+def canEvaluateOffline(rig):
+    adata = rig.animation_data
+    if adata is None or adata.action is None or adata.drivers:
+        return False
+    for track in adata.nla_tracks:
+        if not track.mute:
+            return False
+    for pb in rig.pose.bones:
+        if pb.rotation_mode == 'AXIS_ANGLE':
+            return False
+        for cns in pb.constraints:
+            if not cns.mute and cns.influence > 0:
+                return False
+        bone = pb.bone
+        if (not bone.use_inherit_rotation or
+            not bone.use_local_location or
+            bone.use_relative_parent):
+            return False
+        if bpy.app.version < (2,80,0):
+            if not bone.use_inherit_scale:
+                return False
+        elif bone.inherit_scale != 'FULL':
+            return False
+    for fcu in adata.action.fcurves:
+        bname,mode = fCurveIdentity(fcu)
+        if (mode == "location" and
+            bname in rig.data.bones.keys() and
+            rig.data.bones[bname].use_connect):
+            return False
+    return True
+
+
+def getSourceData(rig, frames):
+    # Rest matrices, parents and channel keys for
+    # anim_arrays.getSourceMatrices
+    bnames = list(rig.pose.bones.keys())
+    source = []
+    for pb in rig.pose.bones:
+        if pb.parent:
+            parent = bnames.index(pb.parent.name)
+        else:
+            parent = -1
+        source.append({
+            "name" : pb.name,
+            "parent" : parent,
+            "rest" : np.array(pb.bone.matrix_local),
+            "rotation_mode" : pb.rotation_mode,
+            "defaults" : {
+                "location" : np.array(pb.location),
+                "rotation_quaternion" : np.array(pb.rotation_quaternion),
+                "rotation_euler" : np.array(pb.rotation_euler),
+                "scale" : np.array(pb.scale),
+            },
+            "keys" : {},
+        })
+    for fcu in rig.animation_data.action.fcurves:
+        bname,mode = fCurveIdentity(fcu)
+        if fcu.mute or bname not in bnames:
+            continue
+        bone = source[bnames.index(bname)]
+        if mode in bone["defaults"].keys():
+            bone["keys"][mode, fcu.array_index] = getSampleKeys(fcu, frames)
+    return source
+
+
 def hideObjects(context, rig):
     if bpy.app.version >= (2,80,0):
         return None
@@ -325,7 +462,14 @@ def clearMcpProps(rig):
                 del pb[key]
 
 
-def retargetAnimation(context, srcRig, trgRig):
+#
+#   retargetAnimation(context, srcRig, trgRig, useWorkers=False):
+#   With useWorkers, a plain source rig is not retargeted here. Instead its
+#   offline job is returned, to be finished by anim_arrays.retargetSimplify
+#   in a worker process, and the target action only holds the T-pose.
+#
+
+def retargetAnimation(context, srcRig, trgRig, useWorkers=False):
     from . import source, target
     from .fkik import setMhxIk, setRigifyFKIK, setRigify2FKIK
 
@@ -361,12 +505,20 @@ def retargetAnimation(context, srcRig, trgRig):
     setCategory("Retarget")
     frameBlock = frames[0:100]
     index = 0
+    job = None
     try:
-        while frameBlock:
-            showProgress(index, frames[index], nFrames)
-            anim.retarget(frameBlock, context)
-            index += 100
-            frameBlock = frames[index:index+100]
+        if canEvaluateOffline(srcRig):
+            job = anim.getOfflineJob(frames)
+            if not useWorkers:
+                anim.retargetOffline(job)
+                job = None
+        else:
+            while frameBlock:
+                showProgress(index, frames[index], nFrames)
+                anim.retarget(frameBlock, context)
+                index += 100
+                frameBlock = frames[index:index+100]
+        anim.keys.write()
 
         scn.frame_current = frames[0]
     finally:
@@ -380,6 +532,7 @@ def retargetAnimation(context, srcRig, trgRig):
     act.use_fake_user = True
     clearCategory()
     endProgress("Retargeted %s --> %s" % (srcRig.name, trgRig.name))
+    return job
 
 
 #
@@ -463,38 +616,183 @@ def restoreTargetData(rig, data):
 
 
 #
-#    loadRetargetSimplify(context, filepath):
+#    loadRetargetSimplify(context, filepath, decoded=None, submit=None):
+#    decoded is the output of bvh_decode.decodeBvhFile, if the file has
+#    already been read. If submit is given, plain source rigs are finished
+#    in a worker process: submit(job) must return a future for the result
+#    of anim_arrays.retargetSimplify. The action and the future are
+#    returned, and setRetargetKeys writes the result later.
 #
 
-def loadRetargetSimplify(context, filepath):
+def loadRetargetSimplify(context, filepath, decoded=None, submit=None):
     from . import load
     from .fkik import limbsBendPositive
 
     print("\nLoad and retarget %s" % filepath)
-    time1 = time.clock()
+    time1 = time.perf_counter()
     scn = context.scene
     trgRig = context.object
+    pending = None
     data = changeTargetData(trgRig, scn)
     try:
         #clearMcpProps(trgRig)
-        srcRig = load.readBvhFile(context, filepath, scn, False)
+        if decoded is None:
+            srcRig = load.readBvhFile(context, filepath, scn, False)
+        else:
+            srcRig = load.loadDecodedBvh(context, filepath, decoded, scn)
         try:
             load.renameAndRescaleBvh(context, srcRig, trgRig)
-            retargetAnimation(context, srcRig, trgRig)
+            job = retargetAnimation(context, srcRig, trgRig, (submit is not None))
             scn = context.scene
-            if scn.McpDoBendPositive:
-                limbsBendPositive(trgRig, True, True, (0,1e6))
-            if scn.McpDoSimplify:
-                simplifyFCurves(context, trgRig, False, False)
-            if scn.McpRescale:
-                rescaleFCurves(context, trgRig, scn.McpRescaleFactor)
+            if job is not None:
+                pending = submitRetargetJob(scn, trgRig, job, submit)
+            else:
+                if scn.McpDoBendPositive:
+                    limbsBendPositive(trgRig, True, True, (0,1e6))
+                if scn.McpDoSimplify:
+                    simplifyFCurves(context, trgRig, False, False)
+                if scn.McpRescale:
+                    rescaleFCurves(context, trgRig, scn.McpRescaleFactor)
         finally:
             load.deleteSourceRig(context, srcRig, 'Y_')
     finally:
         restoreTargetData(trgRig, data)
-    time2 = time.clock()
-    print("%s finished in %.3f s" % (filepath, time2-time1))
-    return
+    time2 = time.perf_counter()
+    if pending:
+        print("%s sent to worker after %.3f s" % (filepath, time2-time1))
+    else:
+        print("%s finished in %.3f s" % (filepath, time2-time1))
+    return pending
+
+
+def submitRetargetJob(scn, trgRig, job, submit):
+    from .fkik import getBendPositiveBones
+
+    act = trgRig.animation_data.action
+    keys = {}
+    for fcu in act.fcurves:
+        bname,mode = fCurveIdentity(fcu)
+        keys[bname, mode, fcu.array_index] = getFCurveKeys(fcu)
+    job["keys"] = keys
+    job["bendBones"] = []
+    if scn.McpDoBendPositive:
+        for pb in getBendPositiveBones(trgRig, True, True):
+            if pb:
+                job["bendBones"].append(pb.name)
+    if scn.McpDoSimplify:
+        job["maxErr"] = getMaxErrors(scn.McpErrorLoc, scn.McpErrorRot)
+    else:
+        job["maxErr"] = None
+    return (act, submit(job))
+
+
+def setRetargetKeys(context, trgRig, act, curves):
+    trgRig.animation_data.action = act
+    for (bname,channel,index),(co,source) in curves.items():
+        path = 'pose.bones["%s"].%s' % (bname, channel)
+        fcu = act.fcurves.find(path, index=index)
+        if fcu is None:
+            fcu = act.fcurves.new(path, index=index, action_group=bname)
+        setFCurveKeys(fcu, co, source)
+    setInterpolation(trgRig)
+    scn = context.scene
+    if scn.McpRescale:
+        rescaleFCurves(context, trgRig, scn.McpRescaleFactor)
+
+#
+#    batchRetargetSimplify(context, paths, nProcesses):
+#    Load and retarget many bvh files to the active rig, one action per file.
+#    Workers cannot use bpy, so Blender builds the source rigs and writes
+#    the keys, and the workers do the rest. They decode the bvh files with
+#    bvh_decode, and retarget, bend and simplify plain source rigs with
+#    anim_arrays.retargetSimplify, from the rest, parent and channel arrays
+#    of CAnimation.getOfflineJob. Both modules are imported as top-level
+#    modules on both sides.
+#
+
+def batchRetargetSimplify(context, paths, nProcesses):
+    import sys
+    trgRig = context.object
+    if nProcesses == 1 or len(paths) < 2 or sys.version_info < (3,7):
+        # ProcessPoolExecutor takes mp_context and initializer from python 3.7
+        for filepath in paths:
+            setActiveObject(context, trgRig)
+            loadRetargetSimplify(context, filepath)
+        return
+
+    import multiprocessing
+    import site
+    from concurrent.futures import ProcessPoolExecutor
+    scn = context.scene
+    folder = os.path.dirname(os.path.abspath(__file__))
+    decodeBvhFile = getWorkerModule(folder, "bvh_decode").decodeBvhFile
+    retargetSimplify = getWorkerModule(folder, "anim_arrays").retargetSimplify
+    ssFactor = (scn.McpSSFactor if scn.McpSubsample else 1)
+    args = (scn.render.fps, scn.McpStartFrame, scn.McpEndFrame, ssFactor, scn.McpDefaultSS)
+
+    mpcontext = multiprocessing.get_context("spawn")
+    python = getattr(bpy.app, "binary_path_python", None)
+    if python:
+        # Before Blender 2.91, sys.executable is Blender itself
+        mpcontext.set_executable(python)
+
+    time1 = time.perf_counter()
+    failed = []
+    pending = []
+
+    def finishRetarget(filepath, act, future):
+        try:
+            curves = future.result()
+        except Exception as err:
+            print("Could not retarget %s: %s" % (filepath, err))
+            failed.append(filepath)
+            return
+        setActiveObject(context, trgRig)
+        setRetargetKeys(context, trgRig, act, curves)
+        print("%s finished" % filepath)
+
+    with ProcessPoolExecutor(max_workers=(nProcesses or None),
+                             mp_context=mpcontext,
+                             initializer=site.addsitedir,
+                             initargs=(folder,)) as pool:
+        submit = (lambda job: pool.submit(retargetSimplify, job))
+        futures = [pool.submit(decodeBvhFile, filepath, *args) for filepath in paths]
+        for filepath,future in zip(paths, futures):
+            try:
+                decoded = future.result()
+            except Exception as err:
+                print("Could not read %s: %s" % (filepath, err))
+                failed.append(filepath)
+                continue
+            setActiveObject(context, trgRig)
+            try:
+                result = loadRetargetSimplify(context, filepath, decoded, submit)
+            except MocapError as err:
+                print("Could not retarget %s: %s" % (filepath, err))
+                failed.append(filepath)
+                continue
+            if result:
+                pending.append((filepath,) + result)
+            # Write what the workers have finished while they go on
+            while pending and pending[0][2].done():
+                finishRetarget(*pending.pop(0))
+        for item in pending:
+            finishRetarget(*item)
+    time2 = time.perf_counter()
+    print("%d of %d files retargeted in %.3f s" % (len(paths)-len(failed), len(paths), time2-time1))
+    if failed:
+        raise MocapError("Failed to retarget:\n" + "\n".join(failed))
+
+
+def getWorkerModule(folder, name):
+    import sys
+    import importlib.util
+    if name not in sys.modules.keys():
+        spec = importlib.util.spec_from_file_location(name, os.path.join(folder, name + ".py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
 
 
 ########################################################################
@@ -23,9 +23,11 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from math import pi
 from . import utils
 from .utils import *
+from .anim_arrays import getKeepPoints
 
 #
 #    simplifyFCurves(context, rig, useVisible, useMarkers):
@@ -40,12 +42,22 @@ def simplifyFCurves(context, rig, useVisible, useMarkers):
     if not fcurves:
         return
 
-    for fcu in fcurves:
-        simplifyFCurve(fcu, rig.animation_data.action, scn.McpErrorLoc, scn.McpErrorRot, minTime, maxTime)
+    simplifyAction(act, scn.McpErrorLoc, scn.McpErrorRot, minTime, maxTime, fcurves)
     setInterpolation(rig)
     print("Curves simplified")
     return
 
+#
+#    simplifyAction(act, maxErrLoc, maxErrRot, minTime='All', maxTime=0, fcurves=None):
+#    Simplify all F-curves of an action, or the given subset.
+#
+
+def simplifyAction(act, maxErrLoc, maxErrRot, minTime='All', maxTime=0, fcurves=None):
+    if fcurves is None:
+        fcurves = act.fcurves
+    for fcu in fcurves:
+        simplifyFCurve(fcu, act, maxErrLoc, maxErrRot, minTime, maxTime)
+
 #
 #   getActionFCurves(act, useVisible, useMarkers, scn):
 #
@@ -70,27 +82,16 @@ def getActionFCurves(act, useVisible, useMarkers, scn):
     return (fcurves, minTime, maxTime)
 
 #
-#   splitFCurvePoints(fcu, minTime, maxTime):
+#   splitFCurvePoints(co, minTime, maxTime):
+#   Return the range of keys between minTime and maxTime.
 #
 
-def splitFCurvePoints(fcu, minTime, maxTime):
+def splitFCurvePoints(co, minTime, maxTime):
     if minTime == 'All':
-        points = fcu.keyframe_points
-        before = []
-        after = []
-    else:
-        points = []
-        before = []
-        after = []
-        for pt in fcu.keyframe_points:
-            t = pt.co[0]
-            if t < minTime:
-                before.append(pt.co)
-            elif t > maxTime:
-                after.append(pt.co)
-            else:
-                points.append(pt)
-    return (points, before, after)
+        return (0, len(co))
+    first = np.count_nonzero(co[:,0] < minTime)
+    last = len(co) - np.count_nonzero(co[:,0] > maxTime)
+    return (first, last)
 
 #
 #    simplifyFCurve(fcu, act, maxErrLoc, maxErrRot, minTime, maxTime):
@@ -100,72 +101,33 @@ def simplifyFCurve(fcu, act, maxErrLoc, maxErrRot, minTime, maxTime):
     #print("WARNING: F-curve simplification turned off")
     #return
     words = fcu.data_path.split('.')
-    if words[-1] == 'location':
-        maxErr = maxErrLoc
-    elif words[-1] == 'rotation_quaternion':
-        maxErr = maxErrRot * 1.0/180
-    elif words[-1] == 'rotation_euler':
-        maxErr = maxErrRot * pi/180
-    else:
+    maxErrs = getMaxErrors(maxErrLoc, maxErrRot)
+    if words[-1] not in maxErrs.keys():
         raise MocapError("Unknown FCurve type %s" % words[-1])
+    maxErr = maxErrs[words[-1]]
 
-    (points, before, after) = splitFCurvePoints(fcu, minTime, maxTime)
-
-    nPoints = len(points)
-    nBefore = len(before)
-    nAfter = len(after)
-    if nPoints <= 2:
+    co = getFCurveKeys(fcu).astype(float)
+    (first, last) = splitFCurvePoints(co, minTime, maxTime)
+    if last - first <= 2:
+        return
+    keeps = getKeepPoints(co[first:last], maxErr)
+    if len(keeps) == last - first:
         return
-    keeps = []
-    new = [0, nPoints-1]
-    while new:
-        keeps += new
-        keeps.sort()
-        new = iterateFCurves(points, keeps, maxErr)
-    newVerts = []
-    for n in keeps:
-        newVerts.append(points[n].co.copy())
-    nNewPoints = len(newVerts)
-
-    oldOffset = nBefore+nPoints
-    newOffset = nBefore+nNewPoints
-    for n in range(nAfter):
-        fcu.keyframe_points[n+newOffset].co = fcu.keyframe_points[n+oldOffset].co.copy()
-    n = nBefore+nPoints+nAfter
-    n1 = nBefore+nNewPoints+nAfter
-    while n > n1:
-        n -= 1
-        kp = fcu.keyframe_points[n]
-        fcu.keyframe_points.remove(kp)
-    for n in range(nNewPoints):
-        fcu.keyframe_points[n+nBefore].co = newVerts[n]
+    source = np.concatenate((np.arange(first), first + keeps, np.arange(last, len(co))))
+    setFCurveKeys(fcu, co[source], source)
     return
 
 #
-#    iterateFCurves(points, keeps, maxErr):
+#    getMaxErrors(maxErrLoc, maxErrRot):
+#    The allowed error for each kind of F-curve.
 #
 
-def iterateFCurves(points, keeps, maxErr):
-    new = []
-    for edge in range(len(keeps)-1):
-        n0 = keeps[edge]
-        n1 = keeps[edge+1]
-        (x0, y0) = points[n0].co
-        (x1, y1) = points[n1].co
-        if x1 > x0:
-            dxdn = (x1-x0)/(n1-n0)
-            dydx = (y1-y0)/(x1-x0)
-            err = 0
-            for n in range(n0+1, n1):
-                (x, y) = points[n].co
-                xn = n0 + dxdn*(n-n0)
-                yn = y0 + dydx*(xn-x0)
-                if abs(y-yn) > err:
-                    err = abs(y-yn)
-                    worst = n
-            if err > maxErr:
-                new.append(worst)
-    return new
+def getMaxErrors(maxErrLoc, maxErrRot):
+    return {
+        "location" : maxErrLoc,
+        "rotation_quaternion" : maxErrRot * 1.0/180,
+        "rotation_euler" : maxErrRot * pi/180,
+    }
 
 #
 #   rescaleFCurves(context, rig, factor):
@@ -24,6 +24,7 @@
 
 import bpy
 import os
+import json
 from collections import OrderedDict
 from math import pi
 from mathutils import *
@@ -39,6 +40,7 @@ from .utils import *
 #_sourceArmatures = { "Automatic" : None }
 _sourceArmatures = {}
 _srcArmature = None
+_sourceIndex = {}
 
 def getSourceArmature(name):
     global _sourceArmatures
@@ -65,36 +67,49 @@ def ensureSourceInited(scn):
         initSources(scn)
 
 #
-#    guessSrcArmatureFromList(rig, scn):
+#    rankSrcArmatures(rig, scn):
+#    Score every source armature in one pass over the rig bones, using the
+#    index from canonical bone names to armatures. Returns a list of
+#    (name, confidence, nMisses), best match first. The confidence is the
+#    fraction of rig bones that the armature knows.
 #
 
-def guessSrcArmatureFromList(rig, scn):
+def rankSrcArmatures(rig, scn):
     ensureSourceInited(scn)
-    bestMisses = 1000
-
-    misses = {}
+    hits = OrderedDict()
     for name in _sourceArmatures.keys():
-        if name == "Automatic":
-            continue
-        amt = _sourceArmatures[name]
-        nMisses = 0
-        for bone in rig.data.bones:
-            try:
-                amt.boneNames[canonicalName(bone.name)]
-            except KeyError:
-                nMisses += 1
-        misses[name] = nMisses
-        if nMisses < bestMisses:
-            best = amt
-            bestMisses = nMisses
+        if name != "Automatic":
+            hits[name] = 0
+    for bone in rig.data.bones:
+        for name in _sourceIndex.get(canonicalName(bone.name), []):
+            hits[name] += 1
+
+    nBones = len(rig.data.bones)
+    ranking = []
+    for name,nHits in hits.items():
+        confidence = (nHits/nBones if nBones else 0.0)
+        ranking.append((name, confidence, nBones-nHits))
+    ranking.sort(key=lambda rank: rank[2])
+    return ranking
+
+#
+#    guessSrcArmatureFromList(rig, scn):
+#
+
+def guessSrcArmatureFromList(rig, scn):
+    ranking = rankSrcArmatures(rig, scn)
+    if not ranking:
+        raise MocapError('No source armatures defined')
+    best = _sourceArmatures[ranking[0][0]]
+    bestMisses = ranking[0][2]
 
     if bestMisses == 0:
         scn.McpSourceRig = best.name
         return best
     else:
         print("Number of misses:")
-        for (name, n) in misses.items():
-            print("  %14s: %2d" % (name, n))
+        for (name, confidence, n) in ranking:
+            print("  %14s: %2d (%.0f pct)" % (name, n, 100*confidence))
         print("Best bone map for armature %s:" % best.name)
         amt = _sourceArmatures[best.name]
         for bone in rig.data.bones:
@@ -175,13 +190,8 @@ def initSources(scn):
     global _sourceArmatures, _srcArmatureEnums
 
     _sourceArmatures = { "Automatic" : CArmature() }
-    path = os.path.join(os.path.dirname(__file__), "source_rigs")
-    for fname in os.listdir(path):
-        file = os.path.join(path, fname)
-        (name, ext) = os.path.splitext(fname)
-        if ext == ".src" and os.path.isfile(file):
-            armature = readSrcArmature(file, name)
-            _sourceArmatures[armature.name] = armature
+    for armature in readSrcArmatures():
+        _sourceArmatures[armature.name] = armature
     _srcArmatureEnums = [("Automatic", "Automatic", "Automatic")]
     keys = list(_sourceArmatures.keys())
     keys.sort()
@@ -196,6 +206,85 @@ def initSources(scn):
     print("Defined McpSourceRig")
 
 
+#
+#   readSrcArmatures():
+#   The parsed .src files and the inverted bone index are cached in
+#   source_index.json next to the source_rigs folder. The cache is
+#   rebuilt when a .src file is added, removed or modified.
+#
+
+def readSrcArmatures():
+    global _sourceIndex
+
+    folder = os.path.dirname(__file__)
+    path = os.path.join(folder, "source_rigs")
+    cachePath = os.path.join(folder, "source_index.json")
+    stamps = {}
+    for fname in sorted(os.listdir(path)):
+        file = os.path.join(path, fname)
+        if os.path.splitext(fname)[1] == ".src" and os.path.isfile(file):
+            stat = os.stat(file)
+            stamps[fname] = [stat.st_mtime, stat.st_size]
+
+    struct = loadSourceIndex(cachePath)
+    if struct is None or struct["files"] != stamps:
+        armatures = []
+        for fname in stamps.keys():
+            (name, ext) = os.path.splitext(fname)
+            armatures.append(readSrcArmature(os.path.join(path, fname), name))
+        struct = buildSourceIndex(armatures, stamps)
+        saveSourceIndex(struct, cachePath)
+    else:
+        print("Read source index", cachePath)
+        armatures = []
+        for name,data in struct["armatures"].items():
+            armature = CArmature()
+            armature.name = name
+            armature.tposeFile = data["t-pose"]
+            armature.boneNames = OrderedDict(data["bones"])
+            armatures.append(armature)
+
+    _sourceIndex = struct["index"]
+    return armatures
+
+
+def buildSourceIndex(armatures, stamps):
+    index = {}
+    amts = OrderedDict()
+    for armature in armatures:
+        amts[armature.name] = {
+            "t-pose" : armature.tposeFile,
+            "bones" : list(armature.boneNames.items()),
+        }
+    for name,data in amts.items():
+        for lname,_ in data["bones"]:
+            index.setdefault(lname, []).append(name)
+    return {
+        "files" : stamps,
+        "armatures" : amts,
+        "index" : index,
+    }
+
+
+def loadSourceIndex(filepath):
+    if not os.path.isfile(filepath):
+        return None
+    try:
+        with open(filepath, "r", encoding="utf-8") as fp:
+            return json.load(fp, object_pairs_hook=OrderedDict)
+    except (OSError, ValueError) as err:
+        print("Ignored source index %s: %s" % (filepath, err))
+        return None
+
+
+def saveSourceIndex(struct, filepath):
+    try:
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(struct, fp)
+    except OSError as err:
+        print("Could not save source index %s: %s" % (filepath, err))
+
+
 def readSrcArmature(file, name):
     print("Read source file", file)
     fp = open(file, "r")
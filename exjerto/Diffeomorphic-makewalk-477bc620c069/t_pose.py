@@ -301,12 +301,28 @@ class MCP_OT_UndefineTPose(bpy.types.Operator):
 #   Load T-pose from file
 #------------------------------------------------------------------
 
+#   Loaded T-pose files, filepath -> (mtime, struct)
+_tposeFiles = {}
+
+def loadTPoseFile(filepath):
+    mtime = os.path.getmtime(filepath)
+    try:
+        cmtime,struct = _tposeFiles[filepath]
+        if cmtime == mtime:
+            return struct
+    except KeyError:
+        pass
+    print("Loading %s" % filepath)
+    struct = loadJson(filepath)
+    _tposeFiles[filepath] = (mtime, struct)
+    return struct
+
+
 def loadPose(rig, filename):
     if filename:
         filepath = os.path.join(os.path.dirname(__file__), filename)
         filepath = os.path.normpath(filepath)
-        print("Loading %s" % filepath)
-        struct = loadJson(filepath)
+        struct = loadTPoseFile(filepath)
         rig.McpTPoseFile = filename
     else:
         return False
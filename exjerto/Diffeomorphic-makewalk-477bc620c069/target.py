@@ -26,6 +26,7 @@ import bpy
 from bpy.props import *
 import math
 import os
+import numpy as np
 
 from . import utils
 from . import t_pose
@@ -49,8 +50,19 @@ _trgArmatureEnums =[("Automatic", "Automatic", "Automatic")]
 _ikBones = []
 _bendTwist = {}
 
+#   Parsed .trg files, filepath -> (mtime, (name, info))
+_trgFiles = {}
+#   Target rig name -> .trg filepath
+_trgPaths = {}
+#   Resolved rigs, (rig, rig data, bone signature) -> guessed name, tests, automatic armatures
+_resolved = {}
+
 def getTargetInfo(rigname):
     global _targetInfo
+    if rigname in _trgPaths.keys():
+        name,info = readTrgArmatureCached(_trgPaths[rigname], rigname)
+        if name == rigname:
+            _targetInfo[rigname] = info
     return _targetInfo[rigname]
 
 def loadTargets():
@@ -76,9 +88,13 @@ def getTargetArmature(rig, context):
     ensureTargetInited(scn)
     putInRestPose(rig, True)
     bones = rig.data.bones.keys()
+    resolved = getResolvedRig(rig)
 
     if scn.McpAutoTargetRig:
-        name = guessTargetArmatureFromList(rig, bones, scn)
+        try:
+            name = resolved["guess"]
+        except KeyError:
+            name = resolved["guess"] = guessTargetArmatureFromList(rig, bones, scn)
     else:
         try:
             name = scn.McpTargetRig
@@ -87,16 +103,26 @@ def getTargetArmature(rig, context):
 
     if name == "Automatic":
         setCategory("Automatic Target Rig")
-        amt = _trgArmature = CArmature()
-        amt.findArmature(rig, ignoreHiddenLayers=scn.McpIgnoreHiddenLayers)
+        key = ("Automatic", scn.McpIgnoreHiddenLayers, rig.MhReverseHip, getRestSignature(rig))
+        try:
+            amt,boneAssoc = resolved[key]
+            for pb in rig.pose.bones:
+                pb.McpBone = ""
+            for bname,mhx in boneAssoc:
+                rig.pose.bones[bname].McpBone = mhx
+            print("Reuse automatic target armature")
+        except KeyError:
+            amt = CArmature()
+            amt.findArmature(rig, ignoreHiddenLayers=scn.McpIgnoreHiddenLayers)
+            amt.display("Target")
+            boneAssoc = []
+            for pb in rig.pose.bones:
+                if pb.McpBone:
+                    boneAssoc.append( (pb.name, pb.McpBone) )
+            resolved[key] = (amt, boneAssoc)
+        _trgArmature = amt
         _targetArmatures["Automatic"] = amt
         scn.McpTargetRig = "Automatic"
-        amt.display("Target")
-
-        boneAssoc = []
-        for pb in rig.pose.bones:
-            if pb.McpBone:
-                boneAssoc.append( (pb.name, pb.McpBone) )
 
         _ikBones = []
         rig.McpTPoseFile = ""
@@ -108,8 +134,14 @@ def getTargetArmature(rig, context):
         setCategory("Manual Target Rig")
         scn.McpTargetRig = name
         _target = name
-        (boneAssoc, _ikBones, rig.McpTPoseFile, _bendTwist) = _targetInfo[name]
-        if not testTargetRig(name, rig, boneAssoc):
+        info = getTargetInfo(name)
+        (boneAssoc, _ikBones, rig.McpTPoseFile, _bendTwist) = info
+        key = ("Test", name, tuple(boneAssoc))
+        try:
+            match = resolved[key]
+        except KeyError:
+            match = resolved[key] = testTargetRig(name, rig, boneAssoc)
+        if not match:
             print("WARNING:\nTarget armature %s does not match armature %s.\nBones:" % (rig.name, name))
             for pair in boneAssoc:
                 print("  %s : %s" % pair)
@@ -129,6 +161,30 @@ def getTargetArmature(rig, context):
 
 
 
+#
+#   getResolvedRig(rig):
+#   Cache entry for a rig. The key contains the bone names and parents,
+#   so renaming or reparenting bones invalidates it.
+#
+
+def getResolvedRig(rig):
+    signature = tuple((bone.name, bone.parent.name if bone.parent else "")
+                      for bone in rig.data.bones)
+    key = (rig.as_pointer(), rig.data.as_pointer(), hash(signature))
+    try:
+        return _resolved[key]
+    except KeyError:
+        return _resolved.setdefault(key, {})
+
+
+def getRestSignature(rig):
+    bones = rig.data.bones
+    coords = np.empty(6*len(bones), dtype=np.float32)
+    bones.foreach_get("head_local", coords[:3*len(bones)])
+    bones.foreach_get("tail_local", coords[3*len(bones):])
+    return hash(np.round(coords, 4).tobytes())
+
+
 def guessTargetArmatureFromList(rig, bones, scn):
     global _target, _targetArmatures, _targetInfo
     ensureTargetInited(scn)
@@ -229,16 +285,19 @@ TargetBoneNames = [
 
 
 def initTargets(scn):
-    global _targetArmatures, _targetInfo, _trgArmatureEnums
+    global _targetArmatures, _targetInfo, _trgArmatureEnums, _trgPaths, _resolved
     _targetInfo = { "Automatic" : ([], [], "", {}) }
     _targetArmatures = { "Automatic" : CArmature() }
+    _trgPaths = {}
+    _resolved = {}
     path = os.path.join(os.path.dirname(__file__), "target_rigs")
     for fname in os.listdir(path):
         file = os.path.join(path, fname)
         (name, ext) = os.path.splitext(fname)
         if ext == ".trg" and os.path.isfile(file):
-            (name, stuff) = readTrgArmature(file, name)
+            (name, stuff) = readTrgArmatureCached(file, name)
             _targetInfo[name] = stuff
+            _trgPaths[name] = file
 
     _trgArmatureEnums =[("Automatic", "Automatic", "Automatic")]
     keys = list(_targetInfo.keys())
@@ -254,6 +313,24 @@ def initTargets(scn):
     return
 
 
+#
+#   readTrgArmatureCached(file, name):
+#   Only parse a .trg file again if it has been modified.
+#
+
+def readTrgArmatureCached(file, name):
+    mtime = os.path.getmtime(file)
+    try:
+        cmtime,result = _trgFiles[file]
+        if cmtime == mtime:
+            return result
+    except KeyError:
+        pass
+    result = readTrgArmature(file, name)
+    _trgFiles[file] = (mtime, result)
+    return result
+
+
 def readTrgArmature(file, name):
     print("Read target file", file)
     fp = open(file, "r")
@@ -23,9 +23,12 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from bpy.props import *
+from collections import OrderedDict
 from math import sin, cos, atan, pi
 from mathutils import *
+from .anim_arrays import mergeKeys, quatsToMatrices, eulersToMatrices, matricesToQuats, matricesToEulers
 
 Deg2Rad = pi/180
 Rad2Deg = 180/pi
@@ -397,8 +400,8 @@ def getActiveFrames0(ob):
     if action is None:
         return active
     for fcu in action.fcurves:
-        for kp in fcu.keyframe_points:
-            active[kp.co[0]] = True
+        for frame in getFCurveKeys(fcu)[:,0].tolist():
+            active[frame] = True
     return active
 
 
@@ -527,6 +530,215 @@ def setRotation(pb, rot, frame, group):
         pb.rotation_euler = euler
         pb.keyframe_insert('rotation_euler', frame=frame, group=group)
 
+#
+#   setBoneFCurves(rig, bname, channel, frames, values, interpolation='LINEAR'):
+#   Key a channel of a pose bone at many frames at once. values is an
+#   nFrames x nIndices array. Existing keys at other frames are kept.
+#   With interpolation None, the interpolation of the keys is left alone.
+#
+
+Interpolations = {'CONSTANT' : 0, 'LINEAR' : 1, 'BEZIER' : 2}
+
+def setBoneFCurves(rig, bname, channel, frames, values, interpolation='LINEAR'):
+    if len(frames) == 0:
+        return
+    if rig.animation_data is None:
+        rig.animation_data_create()
+    act = rig.animation_data.action
+    if act is None:
+        act = rig.animation_data.action = bpy.data.actions.new(rig.name + "Action")
+
+    # Sort the frames and let the last value win for repeated frames
+    frames = np.asarray(frames, dtype=np.float32)[::-1]
+    values = np.asarray(values, dtype=np.float32).reshape((len(frames), -1))[::-1]
+    frames,idxs = np.unique(frames, return_index=True)
+    values = values[idxs]
+
+    path = 'pose.bones["%s"].%s' % (bname, channel)
+    for index in range(values.shape[1]):
+        fcu = act.fcurves.find(path, index=index)
+        if fcu is None:
+            fcu = act.fcurves.new(path, index=index, action_group=bname)
+        insertFCurveKeys(fcu, np.stack((frames, values[:,index]), axis=1))
+        if interpolation:
+            nKeys = len(fcu.keyframe_points)
+            fcu.keyframe_points.foreach_set("interpolation", [Interpolations[interpolation]]*nKeys)
+
+#
+#   setBoneMatrixKeys(rig, pb, frames, mats, useLoc, interpolation='LINEAR'):
+#   Bulk version of insertLocation and insertRotation, for an array
+#   of matrices.
+#
+
+def setBoneMatrixKeys(rig, pb, frames, mats, useLoc, interpolation='LINEAR'):
+    quats = matricesToQuats(mats)
+    if pb.rotation_mode == 'QUATERNION':
+        setBoneFCurves(rig, pb.name, "rotation_quaternion", frames, quats, interpolation)
+    else:
+        eulers = [Quaternion(quat).to_euler(pb.rotation_mode) for quat in quats]
+        setBoneFCurves(rig, pb.name, "rotation_euler", frames, eulers, interpolation)
+    if useLoc:
+        setBoneFCurves(rig, pb.name, "location", frames, np.asarray(mats)[:,:3,3], interpolation)
+
+#
+#   class KeyBuffer:
+#   Collect keys frame by frame and write them with setBoneFCurves.
+#
+
+class KeyBuffer:
+
+    def __init__(self, rig):
+        self.rig = rig
+        self.keys = OrderedDict()
+
+
+    def insert(self, pb, channel, value, frame):
+        key = (pb.name, channel)
+        if key not in self.keys.keys():
+            self.keys[key] = ([], [])
+        frames,values = self.keys[key]
+        frames.append(frame)
+        values.append(tuple(value))
+
+
+    def insertLocation(self, pb, loc, frame):
+        self.insert(pb, 'location', loc, frame)
+
+
+    def insertRotation(self, pb, rot, frame):
+        if pb.rotation_mode == 'QUATERNION':
+            try:
+                quat = rot.to_quaternion()
+            except:
+                quat = rot
+            self.insert(pb, 'rotation_quaternion', quat, frame)
+        else:
+            try:
+                euler = rot.to_euler(pb.rotation_mode)
+            except:
+                euler = rot
+            self.insert(pb, 'rotation_euler', euler, frame)
+
+
+    def write(self, interpolation='LINEAR'):
+        for (bname, channel),(frames, values) in self.keys.items():
+            setBoneFCurves(self.rig, bname, channel, frames, values, interpolation)
+        self.keys = OrderedDict()
+
+#
+#   getFCurveKeys(fcu):
+#   sampleFCurve(fcu, frames):
+#   getSampleKeys(fcu, frames):
+#   Read all keys of an F-curve, or its values at many frames, as arrays.
+#   getSampleKeys gives keys that np.interp turns into those values.
+#
+
+def getFCurveKeys(fcu):
+    nKeys = len(fcu.keyframe_points)
+    co = np.empty(2*nKeys, dtype=np.float32)
+    fcu.keyframe_points.foreach_get("co", co)
+    return co.reshape((nKeys,2))
+
+#
+#   setFCurveKeys(fcu, co, source=None):
+#   Replace the keys of an F-curve. source holds, for each new key, the
+#   index of the old key whose settings (interpolation, handles, key type
+#   and easing) it takes over, or -1 for a new key, which gets the
+#   defaults of keyframe_insert. Handles move along with their key.
+#   Without source, key n takes over the settings of old key n.
+#
+
+KeyframeAttrs = [
+    ("handle_left", 2, np.float32),
+    ("handle_right", 2, np.float32),
+    ("interpolation", 1, np.int32),
+    ("handle_left_type", 1, np.int32),
+    ("handle_right_type", 1, np.int32),
+    ("type", 1, np.int32),
+    ("easing", 1, np.int32),
+    ("back", 1, np.float32),
+    ("amplitude", 1, np.float32),
+    ("period", 1, np.float32),
+]
+
+# BEZIER interpolation, AUTO_CLAMPED handles, KEYFRAME type, AUTO easing
+KeyframeDefaults = {
+    "interpolation" : Interpolations['BEZIER'],
+    "handle_left_type" : 4,
+    "handle_right_type" : 4,
+    "type" : 0,
+    "easing" : 0,
+    "back" : 1.70158,
+    "amplitude" : 0.8,
+    "period" : 4.1,
+}
+
+def setFCurveKeys(fcu, co, source=None):
+    points = fcu.keyframe_points
+    nOld = len(points)
+    co = np.asarray(co, dtype=np.float32).reshape((-1,2))
+    nNew = len(co)
+    if source is None:
+        source = np.arange(nNew)
+        source[source >= nOld] = -1
+    source = np.asarray(source, dtype=int)
+    kept = (source >= 0)
+    oldCo = getFCurveKeys(fcu)
+
+    attrs = []
+    for attr,width,dtype in KeyframeAttrs:
+        data = np.empty((nNew,width), dtype=dtype)
+        if nOld > 0:
+            old = np.empty(nOld*width, dtype=dtype)
+            points.foreach_get(attr, old)
+            data[kept] = old.reshape((nOld,width))[source[kept]]
+        if attr in KeyframeDefaults.keys():
+            data[~kept] = KeyframeDefaults[attr]
+        elif width == 2:
+            data[kept] += co[kept] - oldCo[source[kept]]
+            data[~kept] = co[~kept]
+        attrs.append((attr, data))
+
+    if nNew > nOld:
+        points.add(nNew - nOld)
+    elif nNew < nOld:
+        if hasattr(points, "clear"):
+            points.clear()
+            points.add(nNew)
+        else:
+            for n in range(nOld-1, nNew-1, -1):
+                points.remove(points[n], fast=True)
+    points.foreach_set("co", co.ravel())
+    for attr,data in attrs:
+        points.foreach_set(attr, data.ravel())
+    fcu.update()
+
+#
+#   insertFCurveKeys(fcu, co):
+#   Insert many keys at once. Existing keys at the same frames get the
+#   new values but keep their settings, the other keys are untouched.
+#
+
+def insertFCurveKeys(fcu, co):
+    co = np.asarray(co, dtype=np.float32).reshape((-1,2))
+    co,source = mergeKeys(getFCurveKeys(fcu), co)
+    setFCurveKeys(fcu, co, source)
+
+
+def sampleFCurve(fcu, frames):
+    co = getSampleKeys(fcu, frames)
+    return np.interp(frames, co[:,0], co[:,1])
+
+
+def getSampleKeys(fcu, frames):
+    nKeys = len(fcu.keyframe_points)
+    if nKeys > 0 and not fcu.modifiers and fcu.extrapolation == 'CONSTANT':
+        ipos = np.empty(nKeys, dtype=np.int32)
+        fcu.keyframe_points.foreach_get("interpolation", ipos)
+        if np.all(ipos[:-1] == Interpolations['LINEAR']):
+            return getFCurveKeys(fcu)
+    values = [fcu.evaluate(frame) for frame in frames]
+    return np.stack((np.asarray(frames, dtype=float), values), axis=1)
 
 #
 #   putInRestPose(rig, useSetKeys):
@@ -553,8 +765,8 @@ def setInterpolation(rig):
     if not act:
         return
     for fcu in act.fcurves:
-        for pt in fcu.keyframe_points:
-            pt.interpolation = 'LINEAR'
+        nKeys = len(fcu.keyframe_points)
+        fcu.keyframe_points.foreach_set("interpolation", [Interpolations['LINEAR']]*nKeys)
         fcu.extrapolation = 'CONSTANT'
     return
 
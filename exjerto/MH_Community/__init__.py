@@ -124,8 +124,16 @@ class Community_Panel(bpy.types.Panel):
 
             actionSmoothing = layout.box()
             actionSmoothing.label(text="Jitter Reduction:")
-            actionSmoothing.prop(scn, "MhJitterMaxFrames")
-            actionSmoothing.prop(scn, "MhJitterMinRetracement")
+            actionSmoothing.prop(scn, "MhJitterMethod")
+            if scn.MhJitterMethod == 'ONE_EURO':
+                actionSmoothing.prop(scn, "MhOneEuroMinCutoff")
+                actionSmoothing.prop(scn, "MhOneEuroBeta")
+            elif scn.MhJitterMethod == 'SAVITZKY_GOLAY':
+                actionSmoothing.prop(scn, "MhSavGolWindow")
+                actionSmoothing.prop(scn, "MhSavGolOrder")
+            else:
+                actionSmoothing.prop(scn, "MhJitterMaxFrames")
+                actionSmoothing.prop(scn, "MhJitterMinRetracement")
             actionSmoothing.operator("mh_community.smooth_animation")
 
             layout.operator("mh_community.pose_right")
@@ -621,16 +629,22 @@ class ActionTrimRightOperator(bpy.types.Operator):
         return ob.animation_data is not None
 #===============================================================================
 class ActionJitterReducerOperator(bpy.types.Operator):
-    """Smooth armature movements which get quickly reversed through data reduction.\n\nCan be done with any armature based action against any rig.\n\nDo not do multiple times.  Undo, change args, & do again."""
+    """Smooth armature movements, either by removing moves which get quickly reversed or by filtering rotations.\n\nCan be done with any armature based action against any rig.\n\nDo not do multiple times.  Undo, change args, & do again."""
     bl_idname = 'mh_community.smooth_animation'
     bl_label = 'Smooth'
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        from .kinect_sensor.jitter_reduction import JitterReduction
+        from .kinect_sensor.jitter_reduction import JitterReduction, OneEuroFilter, SavitzkyGolayFilter
 
         armature = context.object
-        JitterReduction(armature, context.scene.MhJitterMaxFrames, context.scene.MhJitterMinRetracement)
+        scn = context.scene
+        if scn.MhJitterMethod == 'ONE_EURO':
+            OneEuroFilter(armature, scn.MhOneEuroMinCutoff, scn.MhOneEuroBeta)
+        elif scn.MhJitterMethod == 'SAVITZKY_GOLAY':
+            SavitzkyGolayFilter(armature, scn.MhSavGolWindow, scn.MhSavGolOrder)
+        else:
+            JitterReduction(armature, scn.MhJitterMaxFrames, scn.MhJitterMinRetracement)
         return {'FINISHED'}
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     @classmethod
@@ -712,6 +726,18 @@ def register():
 
     bpy.types.Scene.MhJitterMaxFrames = IntProperty(name='Max Duration', default=5, description="The maximum number of frames to detect that a bone quickly reversed itself.")
     bpy.types.Scene.MhJitterMinRetracement = FloatProperty(name='Min % Retracement', default=90, description="The percent of the move to be reversed to qualify as a jerk.")
+    bpy.types.Scene.MhJitterMethod = EnumProperty(
+        name='Method',
+        items = (('RETRACEMENT'   , "Retracement"   , "Remove key frames of moves which get quickly reversed"),
+                 ('ONE_EURO'      , "One Euro"      , "Adaptive low pass filter, smoothing slow moves more than fast ones"),
+                 ('SAVITZKY_GOLAY', "Savitzky-Golay", "Fit a polynomial to a sliding window of frames"),
+        ),
+        default = 'RETRACEMENT'
+    )
+    bpy.types.Scene.MhOneEuroMinCutoff = FloatProperty(name='Min Cutoff', default=1.0, min=0.01, description="The cutoff frequency in Hz for slow moves.  Lower smooths more.")
+    bpy.types.Scene.MhOneEuroBeta = FloatProperty(name='Speed Coefficient', default=0.5, min=0, description="How much the cutoff rises with speed.  Higher lags less on fast moves.")
+    bpy.types.Scene.MhSavGolWindow = IntProperty(name='Window', default=7, min=3, description="The number of frames each polynomial is fitted to.  Even numbers are rounded up.")
+    bpy.types.Scene.MhSavGolOrder = IntProperty(name='Order', default=2, min=1, description="The degree of the fitted polynomial.  Lower smooths more.")
 
     registerImporterConstantsAndSettings()
 
@@ -733,6 +759,11 @@ def unregister():
     
     del bpy.types.Scene.MhJitterMaxFrames
     del bpy.types.Scene.MhJitterMinRetracement
+    del bpy.types.Scene.MhJitterMethod
+    del bpy.types.Scene.MhOneEuroMinCutoff
+    del bpy.types.Scene.MhOneEuroBeta
+    del bpy.types.Scene.MhSavGolWindow
+    del bpy.types.Scene.MhSavGolOrder
 
     del bpy.types.Scene.MhHandleHelper
     del bpy.types.Scene.MhScaleMode
@@ -4,8 +4,10 @@ from .capture_armature import *
 from .empties import *
 
 from mathutils import Matrix, Vector
+from collections import OrderedDict
 
 import bpy
+import numpy as np
 #===============================================================================
 class AnimationBuffer:
     tracked_only = False
@@ -71,17 +73,22 @@ class AnimationBuffer:
         empties = Empties(captureSkel)
         bpy.ops.object.mode_set(mode='POSE')
 
+        keys = OrderedDict()
         for i in range(len(self.frames)):
-            # assign the empties to position capture skel, copy rotations to orig, then assign animation frame
+            # assign the empties to position capture skel, copy rotations to orig, then collect animation frame
             empties.assign(self.bones[i])
-            self.assignFrame(armature, self.frames[i], excludeFingers)
+            self.assignFrame(armature, self.frames[i], excludeFingers, keys)
+
+        # write all collected keys at once, rather than a keyframe_insert per bone & frame
+        for (name, channel), (frames, values) in keys.items():
+            setBoneFCurves(armature, name, channel, frames, values)
 
         empties.nukeConstraints()
         empties.nuke()
         capture.cleanUp()
         bpy.ops.pose.transforms_clear()
 
-    def assignFrame(self, armature, frameNum, excludeFingers):
+    def assignFrame(self, armature, frameNum, excludeFingers, keys):
         # this is REQUIRED to get something to actually get recorded other than just before assignment
         bpy.context.scene.update()
         
@@ -96,11 +103,9 @@ class AnimationBuffer:
             loc, rot, scale = localSpace.decompose()
 
             if name == ROOT_BONE:
-                bone.location = self.relativeRootLoc(frameNum)
-                bone.keyframe_insert('location', frame = frameNum, group = name)
+                addKey(keys, name, 'location', frameNum, self.relativeRootLoc(frameNum))
 
-            bone.rotation_quaternion = rot
-            bone.keyframe_insert('rotation_quaternion', frame = frameNum, group = name)
+            addKey(keys, name, 'rotation_quaternion', frameNum, rot)
 
     def oneRight(self, armature):
         capture = CaptureArmature(armature)
@@ -110,4 +115,43 @@ class AnimationBuffer:
             self.empties = Empties(capture.captureSkel) # 39.3701 for inches
 
         self.frame = self.frame + 1 if self.frame + 1 < len(self.bones) else 0
-        self.empties.assign(self.bones[self.frame])
\ No newline at end of file
+        self.empties.assign(self.bones[self.frame])
+#===============================================================================
+def addKey(keys, name, channel, frameNum, value):
+    if (name, channel) not in keys:
+        keys[(name, channel)] = ([], [])
+    frames, values = keys[(name, channel)]
+    frames.append(frameNum)
+    values.append(tuple(value))
+
+# same as setBoneFCurves in makewalk's utils, which this add-on cannot import
+def setBoneFCurves(armature, name, channel, frames, values):
+    if armature.animation_data is None:
+        armature.animation_data_create()
+    action = armature.animation_data.action
+    if action is None:
+        action = armature.animation_data.action = bpy.data.actions.new(armature.name)
+
+    # sort the frames, last value wins for repeated frames
+    frames = np.asarray(frames, dtype = np.float32)[::-1]
+    values = np.asarray(values, dtype = np.float32).reshape((len(frames), -1))[::-1]
+    frames, idxs = np.unique(frames, return_index = True)
+    values = values[idxs]
+
+    path = 'pose.bones["%s"].%s' % (name, channel)
+    for index in range(values.shape[1]):
+        fcurve = action.fcurves.find(path, index = index)
+        if fcurve is None:
+            fcurve = action.fcurves.new(path, index = index, action_group = name)
+        co = np.stack((frames, values[:, index]), axis = 1)
+        nOld = len(fcurve.keyframe_points)
+        if nOld > 0:
+            old = np.empty(2 * nOld, dtype = np.float32)
+            fcurve.keyframe_points.foreach_get('co', old)
+            old = old.reshape((nOld, 2))
+            old = old[~np.isin(old[:, 0], frames)]
+            co = np.concatenate((old, co))
+            co = co[np.argsort(co[:, 0], kind = 'stable')]
+        fcurve.keyframe_points.add(len(co) - nOld)
+        fcurve.keyframe_points.foreach_set('co', co.ravel())
+        fcurve.update()
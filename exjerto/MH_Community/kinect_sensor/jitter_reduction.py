@@ -1,129 +1,291 @@
-from collections import deque
-
 import bpy
+import numpy as np
+
+# keyframe point properties moved along when keys are removed in bulk
+KEYFRAME_ATTRS = [
+    ('co'               , 2, np.float32),
+    ('handle_left'      , 2, np.float32),
+    ('handle_right'     , 2, np.float32),
+    ('interpolation'    , 1, np.int32),
+    ('handle_left_type' , 1, np.int32),
+    ('handle_right_type', 1, np.int32),
+    ('type'             , 1, np.int32),
+]
 #===============================================================================
-class JitterReduction():
+def getKeyframes(fcurve):
+    co = np.empty(2 * len(fcurve.keyframe_points), dtype=np.float32)
+    fcurve.keyframe_points.foreach_get('co', co)
+    return co.reshape((-1, 2))
 
-    def __init__(self, armature, maxFrames, minRetracementPct):
+def removeKeyframes(fcurve, remove):
+    # remove is a mask over the keyframe points.  Survivors are shifted to the
+    # front in one foreach_set per property, then the tail is dropped.
+    points = fcurve.keyframe_points
+    nPoints = len(points)
+    keep = np.flatnonzero(~remove)
+    if len(keep) == nPoints: return
+
+    for attr, width, dtype in KEYFRAME_ATTRS:
+        data = np.empty(nPoints * width, dtype=dtype)
+        points.foreach_get(attr, data)
+        data = data.reshape((nPoints, width))
+        data[:len(keep)] = data[keep]
+        points.foreach_set(attr, data.ravel())
+
+    for idx in range(nPoints - 1, len(keep) - 1, -1):
+        points.remove(points[idx], fast=True)
+    fcurve.update()
+
+def quatsToEulers(quats):
+    # Same as Quaternion.to_euler('XYZ'), including the choice between the two
+    # equivalent solutions, for any number of quaternions at once
+    q = quats / np.linalg.norm(quats, axis=-1)[..., None]
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    m00 = 1 - 2 * (y * y + z * z)
+    m01 = 2 * (x * y + w * z)
+    m02 = 2 * (x * z - w * y)
+    m11 = 1 - 2 * (x * x + z * z)
+    m12 = 2 * (y * z + w * x)
+    m21 = 2 * (y * z - w * x)
+    m22 = 1 - 2 * (x * x + y * y)
+
+    cy = np.hypot(m00, m01)
+    regular = cy > 16 * np.finfo(np.float32).eps
+
+    eul1 = np.stack((
+        np.where(regular, np.arctan2(m12, m22), np.arctan2(-m21, m11)),
+        np.arctan2(-m02, cy),
+        np.where(regular, np.arctan2(m01, m00), 0.0)), axis=-1)
+    eul2 = np.stack((
+        np.where(regular, np.arctan2(-m12, -m22), eul1[..., 0]),
+        np.where(regular, np.arctan2(-m02, -cy), eul1[..., 1]),
+        np.where(regular, np.arctan2(-m01, -m00), 0.0)), axis=-1)
+
+    useSecond = np.abs(eul1).sum(axis=-1) > np.abs(eul2).sum(axis=-1)
+    return np.where(useSecond[..., None], eul2, eul1)
+#===============================================================================
+class RotationCurves():
+    """The rotation fcurves of every bone of an armature's action, read into
+    arrays sampled at each frame which has a key in any fcurve of the action.
+    Filters subclass this, so the scene never needs to be evaluated."""
+
+    def __init__(self, armature):
         self.armature = armature
         self.action = armature.animation_data.action
 
-        self.valuesQueue = deque(maxlen = maxFrames)
-        self.idxQueue    = deque(maxlen = maxFrames)
-        self.minRetracementRatio = minRetracementPct / 100
-
-        self.frames = dict()
+        frames = set()
         for fcurve in self.action.fcurves:
-            for key in fcurve.keyframe_points:
-                frame = key.co.x
-                self.frames[frame] = True # actual value has no meaning
-
-        self.frames = sorted(self.frames)
+            frames.update(getKeyframes(fcurve)[:, 0].tolist())
+        self.frames = np.array(sorted(frames))
         self.nFrames = len(self.frames)
-        self.lastFrameNum = self.frames[self.nFrames - 1]
 
-        self.scene = bpy.context.scene
+        self.bones   = [] # animated pose bones
+        self.fcurves = [] # per bone, the fcurve of each rotation channel or None
+        self.values  = [] # per bone, (frames, channels) array of rotation values
 
-        bpy.ops.object.mode_set(mode='POSE')
         for bone in self.armature.pose.bones:
-            self.smoothbone(bone)
-
-    def smoothbone(self, bone):
-        property = 'rotation_quaternion' if bone.rotation_mode == 'QUATERNION' else 'rotation_euler'
-#        dataPath = 'pose.bones["' + bone.name + '"].' + ('rotation_quaternion' if bone.rotation_mode == 'QUATERNION' else 'rotation_euler')
-
-        self.valuesQueue.clear()
-        self.idxQueue   .clear()
-
-        # iterate through the frames; easiest to get comparison data, since just use bone as source
-        for idx in range(len(self.frames)):
-            self.scene.frame_set(self.frames[idx])
-
-            # when queue at maximum value from opposite side is removed automatically
-            self.valuesQueue.append(bone.rotation_quaternion.to_euler("XYZ") if bone.rotation_mode == 'QUATERNION' else bone.rotation_euler)
-            self.idxQueue   .append(idx)
-
-            # revIdx is the index in queues where the data should start to be kept again
-            revIdx = self.hasReversed()
-            if revIdx != -1:
-                # The first frame in the queues is the last one before jitter, so pass over / keep
-                self.valuesQueue.popleft()
-                self.idxQueue   .popleft()
-
-                # range() takes an argument of up to, so passing if revIdx was a 2 would, delete one frame
-                for nukeIdx in range(1, revIdx):
-                    self.valuesQueue.popleft()
-                    bone.keyframe_delete(property, -1, self.frames[self.idxQueue.popleft()])
-
-    def hasReversed(self):
-        queueLen = len(self.valuesQueue)
-        if queueLen < 3:
-            return -1
-
-        firstValue  = self.valuesQueue[0]
-        secondValue = self.valuesQueue[1]
-
-        xDir = secondValue.x - firstValue.x > 0
-        xWaterMark = secondValue.x
-        yDir = secondValue.y - firstValue.y > 0
-        yWaterMark = secondValue.y
-        zDir = secondValue.z - firstValue.z > 0
-        zWaterMark = secondValue.z
-
-        for idx in range(2, queueLen):
-            value = self.valuesQueue[idx]
-            if xDir:
-                if xWaterMark < value.x:
-                    xWaterMark = value.x
-                else:
-                    retracement = xWaterMark - value.x
-                    amountMove  = xWaterMark - firstValue.x
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-            else:
-                if xWaterMark > value.x:
-                    xWaterMark = value.x
-                else:
-                    retracement = value.x - xWaterMark
-                    amountMove  = firstValue.x - xWaterMark
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-
-
-            if yDir:
-                if yWaterMark < value.y:
-                    yWaterMark = value.y
-                else:
-                    retracement = yWaterMark - value.y
-                    amountMove  = yWaterMark - firstValue.y
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-            else:
-                if yWaterMark > value.y:
-                    yWaterMark = value.y
-                else:
-                    retracement = value.y - yWaterMark
-                    amountMove  = firstValue.y - yWaterMark
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-
-
-            if zDir:
-                if zWaterMark < value.z:
-                    zWaterMark = value.z
-                else:
-                    retracement = zWaterMark - value.z
-                    amountMove  = zWaterMark - firstValue.z
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-            else:
-                if zWaterMark > value.z:
-                    zWaterMark = value.z
-                else:
-                    retracement = value.z - zWaterMark
-                    amountMove  = firstValue.z - zWaterMark
-                    if amountMove > 0 and self.minRetracementRatio < retracement / amountMove:
-                       return idx
-
-        # signal no reversal
-        return -1
\ No newline at end of file
+            property = 'rotation_quaternion' if bone.rotation_mode == 'QUATERNION' else 'rotation_euler'
+            dataPath = bone.path_from_id(property)
+            default = getattr(bone, property)
+
+            fcurves = [self.action.fcurves.find(dataPath, index = idx) for idx in range(len(default))]
+            if all(fcurve is None for fcurve in fcurves): continue
+
+            values = np.empty((self.nFrames, len(default)))
+            for idx, fcurve in enumerate(fcurves):
+                values[:, idx] = default[idx] if fcurve is None else self.sample(fcurve)
+
+            self.bones  .append(bone)
+            self.fcurves.append(fcurves)
+            self.values .append(values)
+
+    def sample(self, fcurve):
+        # read straight from the keys, only evaluating frames the fcurve has no key for
+        keys = getKeyframes(fcurve)
+        keyIdxs = np.searchsorted(self.frames, keys[:, 0])
+        values = np.empty(self.nFrames)
+        hasKey = np.zeros(self.nFrames, dtype=bool)
+        values[keyIdxs] = keys[:, 1]
+        hasKey[keyIdxs] = True
+        for idx in np.flatnonzero(~hasKey):
+            values[idx] = fcurve.evaluate(self.frames[idx])
+        return values
+
+    def isQuaternion(self, boneIdx):
+        return self.bones[boneIdx].rotation_mode == 'QUATERNION'
+
+    def getSmoothable(self):
+        # all channels side by side as (frames, channels), with quaternions kept in
+        # one hemisphere so that neighbouring frames are close component-wise
+        channels = []
+        for boneIdx, values in enumerate(self.values):
+            if self.isQuaternion(boneIdx):
+                signs = np.ones(self.nFrames)
+                signs[1:] = np.where((values[1:] * values[:-1]).sum(axis=1) < 0, -1.0, 1.0)
+                values = values * np.cumprod(signs)[:, None]
+            channels.append(values)
+        return np.concatenate(channels, axis=1)
+
+    def setSmoothed(self, smoothed):
+        # write filtered values back to the keys they came from, in bulk
+        start = 0
+        for boneIdx, fcurves in enumerate(self.fcurves):
+            values = smoothed[:, start:start + len(fcurves)]
+            start += len(fcurves)
+            if self.isQuaternion(boneIdx):
+                values = values / np.linalg.norm(values, axis=1)[:, None]
+
+            for idx, fcurve in enumerate(fcurves):
+                if fcurve is None: continue
+                points = fcurve.keyframe_points
+                nPoints = len(points)
+                co = getKeyframes(fcurve)
+                delta = values[np.searchsorted(self.frames, co[:, 0]), idx] - co[:, 1]
+
+                co[:, 1] += delta
+                points.foreach_set('co', co.ravel())
+                # move the handles along with their keys
+                for attr in ('handle_left', 'handle_right'):
+                    handles = np.empty(2 * nPoints, dtype=np.float32)
+                    points.foreach_get(attr, handles)
+                    handles = handles.reshape((nPoints, 2))
+                    handles[:, 1] += delta
+                    points.foreach_set(attr, handles.ravel())
+                fcurve.update()
+#===============================================================================
+class JitterReduction(RotationCurves):
+
+    def __init__(self, armature, maxFrames, minRetracementPct):
+        super().__init__(armature)
+        self.maxFrames = maxFrames
+        self.minRetracementRatio = minRetracementPct / 100
+
+        if len(self.bones) == 0 or self.maxFrames < 3: return
+
+        # comparisons are made on XYZ eulers, whatever the rotation mode
+        eulers = np.stack([quatsToEulers(values) if self.isQuaternion(boneIdx) else values
+                           for boneIdx, values in enumerate(self.values)], axis=1)
+
+        nuke = self.findReversals(eulers)
+
+        for boneIdx, fcurves in enumerate(self.fcurves):
+            nukeFrames = self.frames[nuke[:, boneIdx]]
+            if len(nukeFrames) == 0: continue
+
+            for fcurve in fcurves:
+                if fcurve is not None:
+                    removeKeyframes(fcurve, np.isin(getKeyframes(fcurve)[:, 0], nukeFrames))
+
+    def findReversals(self, values):
+        # Slide a window of up to maxFrames over the frames of all bones at once.  Each
+        # bone's window starts at its own frame, since when a reversal is found the frames
+        # between the first one of the window and the reversal are dropped, and the window
+        # restarts at the reversal.  Returns a (frames, bones) mask of frames to drop.
+        nFrames, nBones = values.shape[:2]
+        nuke = np.zeros((nFrames, nBones), dtype=bool)
+
+        start   = np.zeros(nBones, dtype=int)
+        offsets = np.arange(self.maxFrames)
+        boneIdxs = np.arange(nBones)
+
+        for idx in range(nFrames):
+            # when the window is at maximum length the oldest frame drops out
+            start = np.maximum(start, idx - self.maxFrames + 1)
+            length = idx - start + 1
+            if length.max() < 3: continue
+
+            window = values[np.minimum(start[:, None] + offsets, idx), boneIdxs[:, None]]
+            revIdx = self.hasReversed(window, length)
+
+            # The first frame in the window is the last one before jitter, so pass over / keep
+            for boneIdx in np.flatnonzero(revIdx > 0):
+                nuke[start[boneIdx] + 1 : start[boneIdx] + revIdx[boneIdx], boneIdx] = True
+                start[boneIdx] += revIdx[boneIdx]
+
+        return nuke
+
+    def hasReversed(self, window, length):
+        # window is (bones, maxFrames, 3), of which the first length frames of each
+        # bone are in use.  For each bone returns the index in the window where the
+        # data should start to be kept again, or -1 when there is no reversal.
+        firstValue  = window[:, 0]
+        secondValue = window[:, 1]
+        values      = window[:, 2:]
+
+        # direction set by the first move, the water mark is the extreme reached before each frame
+        rising = (secondValue - firstValue > 0)[:, None, :]
+        waterMark = np.where(rising,
+                             np.maximum.accumulate(window[:, 1:-1], axis=1),
+                             np.minimum.accumulate(window[:, 1:-1], axis=1))
+
+        retracement = np.where(rising, waterMark - values, values - waterMark)
+        amountMove  = np.where(rising, waterMark - firstValue[:, None], firstValue[:, None] - waterMark)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = retracement / amountMove
+        reversed = (retracement >= 0) & (amountMove > 0) & (self.minRetracementRatio < ratio)
+
+        inWindow = np.arange(window.shape[1] - 2)[None, :] < (length - 2)[:, None]
+        reversed = reversed.any(axis=2) & inWindow
+
+        return np.where(reversed.any(axis=1), reversed.argmax(axis=1) + 2, -1)
+#===============================================================================
+class OneEuroFilter(RotationCurves):
+    """Adaptive low pass filter.  Slow moves are smoothed with minCutoff (Hz),
+    the cutoff rising with speed by beta, so that fast moves do not lag."""
+
+    def __init__(self, armature, minCutoff, beta, dCutoff = 1.0):
+        super().__init__(armature)
+        if len(self.bones) == 0: return
+
+        render = bpy.context.scene.render
+        times = self.frames * render.fps_base / render.fps
+        self.setSmoothed(oneEuro(self.getSmoothable(), times, minCutoff, beta, dCutoff))
+
+def oneEuro(values, times, minCutoff, beta, dCutoff):
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    smoothed = np.empty_like(values)
+    smoothed[0] = values[0]
+    speed = np.zeros(values.shape[1])
+    for idx in range(1, len(values)):
+        dt = times[idx] - times[idx - 1]
+        rawSpeed = (values[idx] - smoothed[idx - 1]) / dt
+        speed += alpha(dCutoff, dt) * (rawSpeed - speed)
+        cutoff = minCutoff + beta * np.abs(speed)
+        smoothed[idx] = smoothed[idx - 1] + alpha(cutoff, dt) * (values[idx] - smoothed[idx - 1])
+    return smoothed
+#===============================================================================
+class SavitzkyGolayFilter(RotationCurves):
+    """Replaces each frame by a least squares polynomial of the given order, fitted
+    to the window of frames around it.  Assumes keys at a constant frame rate."""
+
+    def __init__(self, armature, window, order):
+        super().__init__(armature)
+        if len(self.bones) == 0: return
+
+        self.setSmoothed(savitzkyGolay(self.getSmoothable(), window, order))
+
+def savitzkyGolay(values, window, order):
+    half = window // 2
+    window = 2 * half + 1
+    nFrames = len(values)
+    if nFrames < window or half == 0: return values
+    order = min(order, window - 1)
+
+    # row k of fit @ window values is the polynomial through them evaluated at frame k of the window
+    offsets = np.arange(-half, half + 1)
+    vander = np.vander(offsets, order + 1, increasing = True)
+    fit = vander @ np.linalg.pinv(vander)
+
+    smoothed = np.empty_like(values)
+    smoothed[half:nFrames - half] = 0
+    for k in range(window):
+        smoothed[half:nFrames - half] += fit[half, k] * values[k:nFrames - window + 1 + k]
+
+    # at the ends, use the polynomial of the first and last full window
+    smoothed[:half] = fit[:half] @ values[:window]
+    smoothed[nFrames - half:] = fit[half + 1:] @ values[nFrames - window:]
+    return smoothed
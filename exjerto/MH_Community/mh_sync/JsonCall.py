@@ -17,6 +17,16 @@ import socket
 
 DEBUG_JSON = False
 
+# Where the MakeHuman socket server is listening unless told otherwise
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 12345
+DEFAULT_TIMEOUT = 30.0
+
+# Initial size of the receive buffer. It is doubled whenever it fills up,
+# so a large binary response takes a handful of reallocations rather than
+# one concatenation per kilobyte.
+RECV_BUFFER_SIZE = 1 << 20
+
 class JsonCall():
 
 
@@ -205,36 +215,50 @@ class JsonCall():
         return ret.replace('\\', '\\\\') # allow windows paths in data
 
 
-    def send(self, host = "127.0.0.1", port = 12345, expectBinaryResponse = False):
-        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client.connect(('127.0.0.1', 12345))
-        client.send(bytes(self.serialize(), 'utf-8'))
+    def _receiveAll(self, client):
+        # The server signals the end of a response by closing the connection
+        data = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(data)
+        length = 0
+        while True:
+            if length == len(data):
+                view.release()
+                data.extend(bytes(len(data)))
+                view = memoryview(data)
+            received = client.recv_into(view[length:])
+            if received == 0:
+                break
+            length = length + received
+        view.release()
+        del data[length:]
+        return data
+
+
+    def send(self, host = None, port = None, expectBinaryResponse = False, timeout = None):
+        if host is None:
+            host = DEFAULT_HOST
+        if port is None:
+            port = DEFAULT_PORT
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+
+        client = socket.create_connection((host, port), timeout)
+        try:
+            client.sendall(bytes(self.serialize(), 'utf-8'))
+            received = self._receiveAll(client)
+        finally:
+            client.close()
 
         data = None
 
         if not expectBinaryResponse:
-            data = ""
-            while True:
-                buf = client.recv(1024)
-                if len(buf) > 0:
-                    data += buf.strip().decode('utf-8')
-                else:
-                    break
+            data = received.decode('utf-8').strip()
             if data:
                 data = JsonCall(data)
         else:
             if DEBUG_JSON:
-                print("Getting binary response")
-            data = bytearray()
-            while True:
-                buf = client.recv(1024)
-                #print("Got " + str(len(buf)) + " bytes.")
-                if len(buf) > 0:
-                    data += bytearray(buf)
-                else:
-                    break
-            if DEBUG_JSON:
-                print("Total received length: " + str(len(data)))
+                print("Total received length: " + str(len(received)))
+            data = received
 
         return data
 
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Decoding of the binary payloads sent by the MakeHuman socket server.
+#
+# Vertices, faces, texture coordinates and weights all arrive as packed
+# four-byte floats or unsigned ints in native byte order. Rather than
+# unpacking these value by value, the helpers below view the received
+# buffer as a numpy array and hand it on to blender in bulk.
+
+import bmesh
+import numpy as np
+
+def decodeFloats(data, width):
+    return np.frombuffer(data, dtype=np.float32).reshape((-1, width))
+
+def decodeInts(data, width):
+    return np.frombuffer(data, dtype=np.uint32).reshape((-1, width))
+
+def decodeVertices(data, scaleFactor):
+    # Coordinate order from MH is XZY, and MH Z points towards the viewer
+    mhCoords = decodeFloats(data, 3)
+    coords = np.empty(mhCoords.shape, dtype=np.float32)
+    coords[:,0] = mhCoords[:,0]
+    coords[:,1] = -mhCoords[:,2]
+    coords[:,2] = mhCoords[:,1]
+    return coords * scaleFactor
+
+def buildMesh(mesh, coords, faces, texco, faceUVs, allowTriangles=False):
+    # Faces are quads. With allowTriangles, a face that repeats its first
+    # vertex as the fourth one is made into a triangle.
+    if allowTriangles:
+        sizes = np.where(faces[:,0] == faces[:,3], 3, 4)
+    else:
+        sizes = np.full(len(faces), 4)
+    used = (np.arange(4)[None,:] < sizes[:,None])
+    loopVerts = faces[used]
+
+    mesh.vertices.add(len(coords))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(coords, dtype=np.float32).ravel())
+    mesh.loops.add(len(loopVerts))
+    mesh.loops.foreach_set("vertex_index", loopVerts.astype(np.int32))
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set("loop_start", (np.cumsum(sizes) - sizes).astype(np.int32))
+    mesh.polygons.foreach_set("loop_total", sizes.astype(np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+    mesh.update(calc_edges=True)
+
+    if hasattr(mesh, "uv_textures"):
+        mesh.uv_textures.new()
+    else:
+        mesh.uv_layers.new()
+    uvs = texco[faceUVs[used]]
+    mesh.uv_layers[-1].data.foreach_set("uv", np.ascontiguousarray(uvs, dtype=np.float32).ravel())
+
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bmesh.ops.recalc_face_normals(bm, faces=bm.faces)
+    bm.to_mesh(mesh)
+    bm.free()
+
+def addVertexWeights(vertGroup, verts, weights):
+    # vertex_groups.add takes one weight for a list of vertices, so add
+    # all vertices sharing a weight in one call
+    order = np.argsort(weights, kind="stable")
+    values, starts = np.unique(weights[order], return_index=True)
+    for value, vnums in zip(values, np.split(verts[order], starts[1:])):
+        vertGroup.add(vnums.tolist(), float(value), 'ADD')
@@ -6,26 +6,102 @@ bl_info = {
     "category": "Armature",
 }
 
-from .directory_ops import GetUserDir, GetSysDir
-from .sync_pose import SyncPose
+from .fetch_server_data import FetchServerDataBatch
+from .sync_pose import posesToBases
 
 import bpy
+import numpy as np
+from mathutils import Matrix
 from json import load
 import os
 
+def insertKeys(fcu, frames, values):
+    # Add keys to an fcurve in one go, keeping the ones already there
+    n = len(fcu.keyframe_points)
+    co = np.empty(2*n, dtype=np.float32)
+    fcu.keyframe_points.foreach_get("co", co)
+    co = np.concatenate((co, np.column_stack((frames, values)).ravel()))
+    fcu.keyframe_points.add(len(frames))
+    fcu.keyframe_points.foreach_set("co", co.astype(np.float32))
+    fcu.update()
+
+def addPoseLibraryEntries(skeleton, names, hierarchy, bases, firstFrame):
+    # Key the bases of all bones for all poses into the pose library, which
+    # is what bpy.ops.poselib.pose_add does for one pose at a time
+    act = skeleton.pose_library
+    frames = np.arange(firstFrame, firstFrame + len(names))
+
+    for (i, pb) in enumerate(hierarchy):
+        locs = []
+        rots = []
+        scales = []
+        for basis in bases[:,i]:
+            (loc, quat, scale) = Matrix(basis.tolist()).decompose()
+            locs.append(loc)
+            scales.append(scale)
+            if pb.rotation_mode == 'QUATERNION':
+                rots.append(quat)
+            elif pb.rotation_mode == 'AXIS_ANGLE':
+                (axis, angle) = quat.to_axis_angle()
+                rots.append((angle, axis[0], axis[1], axis[2]))
+            else:
+                rots.append(quat.to_euler(pb.rotation_mode))
+
+        if pb.rotation_mode == 'QUATERNION':
+            rotAttr = "rotation_quaternion"
+        elif pb.rotation_mode == 'AXIS_ANGLE':
+            rotAttr = "rotation_axis_angle"
+        else:
+            rotAttr = "rotation_euler"
+
+        for (attr, values) in [("location", locs), (rotAttr, rots), ("scale", scales)]:
+            values = np.array([tuple(v) for v in values])
+            path = pb.path_from_id(attr)
+            for index in range(values.shape[1]):
+                fcu = act.fcurves.find(path, index)
+                if fcu is None:
+                    fcu = act.fcurves.new(path, index, pb.name)
+                insertKeys(fcu, frames, values[:,index])
+
+    for (name, frame) in zip(names, frames):
+        marker = act.pose_markers.new(name)
+        marker.frame = int(frame)
+
+def getLastPoseFrame(act):
+    # New poses go after everything already in the library. Counting the
+    # markers is not enough once a pose has been removed, and keys could
+    # then be added twice at an existing frame.
+    lastFrame = 0
+    for marker in act.pose_markers:
+        lastFrame = max(lastFrame, marker.frame)
+    for fcu in act.fcurves:
+        if len(fcu.keyframe_points) > 0:
+            lastFrame = max(lastFrame, int(np.ceil(fcu.keyframe_points[-1].co[0])))
+    return lastFrame
+
 class ExprToPoselib():
     def __init__(self):
         self.exprFilter = bpy.context.scene.MhExprFilterTag.lower()
         self.skeleton = bpy.context.active_object
-        self.frameNum = len(self.skeleton.pose_library.pose_markers)
-        GetUserDir(self.UserDirReady)
+        self.frameNum = getLastPoseFrame(self.skeleton.pose_library)
+        self.names = []
+        self.filepaths = []
+        FetchServerDataBatch([('getUserDir', False, None), ('getSysDir', False, None)], self.dirsReady)
+
+    def dirsReady(self, dirs):
+        for dir in dirs:
+            self.processDirectory(dir)
 
-    def UserDirReady(self, dir):
-        self.processDirectory(dir)
-        GetSysDir(self.SysDirReady)
+        # Fetch all the expressions at once, then key them in a single pass
+        calls = [('getPose', False, { "poseFilename": filepath }) for filepath in self.filepaths]
+        FetchServerDataBatch(calls, self.posesReady)
 
-    def SysDirReady(self, dir):
-        self.processDirectory(dir)
+    def posesReady(self, poses):
+        if len(poses) == 0:
+            return
+        hierarchy, bases = posesToBases(self.skeleton, poses, True)
+        addPoseLibraryEntries(self.skeleton, self.names, hierarchy, bases, self.frameNum + 1)
+        self.frameNum += len(poses)
 
 
     # get the full path file names of expressions, so that they may be passed
@@ -55,6 +131,5 @@ class ExprToPoselib():
                     if not tagFound:
                         continue
 
-                SyncPose(filepath, True)
-                self.frameNum += 1
-                bpy.ops.poselib.pose_add(frame=self.frameNum, name=name)
+                self.names.append(name)
+                self.filepaths.append(filepath)
@@ -1,4 +1,26 @@
-from .sync_ops import SyncOperator
+from .sync_ops import SyncOperator, getServerSettings
+from .JsonCall import JsonCall
+
+import bpy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper limit on the number of calls in flight against the server at once
+MAX_CONCURRENT_CALLS = 4
+
+# How often (in seconds) a timer checks whether deferred calls have finished
+POLL_INTERVAL = 0.01
+
+_executor = None
+_executorLock = threading.Lock()
+
+def _getExecutor():
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            # No thread_name_prefix, blender 2.79 ships python 3.5
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS)
+        return _executor
 
 class FetchServerData(SyncOperator):
     def __init__(self, functionName, readyFunction, expectBinary=False, params=None):
@@ -12,3 +34,53 @@ class FetchServerData(SyncOperator):
             self.readyFunction(json_obj)
         else:
             self.readyFunction(json_obj.data)
+
+class FetchServerDataBatch():
+    """Issue several independent calls concurrently from worker threads.
+
+    calls is a list of (functionName, expectBinary, params) tuples. When all
+    of them have answered, readyFunction is called on the main thread with a
+    list of the results in the same order, binary responses as bytearrays and
+    json responses as their data.
+
+    With wait=True the caller blocks until the results are in, which keeps
+    bpy.context valid for whatever readyFunction does. Otherwise the results
+    are handed over by a bpy.app timer and the caller returns immediately.
+    """
+
+    def __init__(self, calls, readyFunction, wait=True):
+        self.readyFunction = readyFunction
+        self.binary = [expectBinary for (functionName, expectBinary, params) in calls]
+
+        host, port, timeout = getServerSettings()
+        executor = _getExecutor()
+        self.futures = []
+        for (functionName, expectBinary, params) in calls:
+            call = JsonCall()
+            call.setFunction(functionName)
+            if not params is None:
+                call.params = params
+            self.futures.append(executor.submit(call.send, host, port, expectBinary, timeout))
+
+        if wait or not hasattr(bpy.app, "timers"):
+            self.deliver()
+        else:
+            bpy.app.timers.register(self.poll, first_interval=POLL_INTERVAL)
+
+    def poll(self):
+        for future in self.futures:
+            if not future.done():
+                return POLL_INTERVAL
+        self.deliver()
+        return None
+
+    def deliver(self):
+        results = []
+        for (future, binary) in zip(self.futures, self.binary):
+            json_obj = future.result()
+            if binary:
+                results.append(json_obj)
+            else:
+                results.append(json_obj.data)
+        self.futures = []
+        self.readyFunction(results)
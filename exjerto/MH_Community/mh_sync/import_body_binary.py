@@ -9,13 +9,13 @@ bl_info = {
 import bpy
 import bmesh
 import pprint
-import struct
 import time
-import itertools
+import numpy as np
 
 from mathutils import Matrix, Vector
 from .material import *
-from .fetch_server_data import FetchServerData
+from .binary_data import *
+from .fetch_server_data import FetchServerData, FetchServerDataBatch
 from .import_proxy_binary import ImportProxyBinary
 from .import_weighting import ImportWeighting
 
@@ -73,7 +73,7 @@ class ImportBodyBinary():
         self.right_verts = []
         self.mid_verts = []
 
-        self.vertPosCache = []
+        self.vertPosCache = None
 
         if self.scaleMode == "DECIMETER":
             self.scaleFactor = 1.0
@@ -107,6 +107,7 @@ class ImportBodyBinary():
 
         self.obj.MhHuman = True
         self.obj.MhObjectType = "Basemesh"
+        self.obj.MhScaleFactor = self.scaleFactor
 
         # TODO: Set more info, for example name of toon
 
@@ -116,119 +117,36 @@ class ImportBodyBinary():
         self.obj.select = True
 
         self.mesh = bpy.context.object.data
-        self.bm = bmesh.new()
 
-        FetchServerData('getBodyVerticesBinary',self.gotVerticesData,True)
-
-    def gotVerticesData(self, data):
+        # The mesh arrays and the material do not depend on each other, so
+        # ask for all of them at once
+        FetchServerDataBatch([
+            ('getBodyVerticesBinary', True, None),
+            ('getBodyFacesBinary', True, None),
+            ('getBodyTextureCoordsBinary', True, None),
+            ('getBodyFaceUVMappingsBinary', True, None),
+            ('getBodyMaterialInfo', False, None)
+        ], self.gotMeshData)
+
+    def gotMeshData(self, data):
         self._profile()
-        self.vertCache = []
-
-        iMax = int(len(data) / 4 / 3)
-        assert(iMax == int(self.bodyInfo["numVertices"]))
-
-        i = 0
-        while i < iMax:
-            sliceStart = i * 4 * 3 # 4-byte floats, three values per vertex
-
-            # Coordinate order from MH is XZY
-            xbytes = data[sliceStart:sliceStart + 4]
-            zbytes = data[sliceStart + 4:sliceStart + 4 + 4]
-            ybytes = data[sliceStart + 4 + 4:sliceStart + 4 + 4 +4]
-
-            x = struct.unpack("f", bytes(xbytes))[0] * self.scaleFactor
-            z = struct.unpack("f", bytes(zbytes))[0] * self.scaleFactor
-            y = struct.unpack("f", bytes(ybytes))[0] * self.scaleFactor
-
-            if z < self.minimumZ:
-                self.minimumZ = z
+        (vertices, faces, texco, mappings, self.materialInfo) = data
 
-            vert = self.bm.verts.new( (x, -y, z) )
-            vert.index = i
+        self.vertPosCache = decodeVertices(vertices, self.scaleFactor)
+        assert(len(self.vertPosCache) == int(self.bodyInfo["numVertices"]))
+        if len(self.vertPosCache) > 0:
+            self.minimumZ = min(self.minimumZ, float(self.vertPosCache[:,2].min()))
 
-            self.vertCache.append(vert)
-            self.vertPosCache.append( (x, -y, z) )
+        self.faceVertIndexes = decodeInts(faces, 4)
+        assert (len(self.faceVertIndexes) == int(self.bodyInfo["numFaces"]))
 
-            i = i + 1
+        self.texco = decodeFloats(texco, 2)
+        assert (len(self.texco) == int(self.bodyInfo["numTextureCoords"]))
 
-        FetchServerData('getBodyFacesBinary',self.gotFacesData,True)
-
-    def gotFacesData(self, data):
-        self._profile()
-        self.faceCache = []
-        self.faceVertIndexes=[]
-
-        iMax = int(len(data) / 4 / 4)
-        assert (iMax == int(self.bodyInfo["numFaces"]))
-
-        i = 0
-        while i < iMax:
-            stride = 0;
-            verts = [None, None, None, None]
-            vertIdxs = [None, None, None, None]
-            while stride < 4:
-                sliceStart = i * 4 * 4  # 4-byte ints, four vertices per face
-                vertbytes = data[sliceStart + stride * 4:sliceStart + stride * 4 + 4]
-                vert = self.vertCache[int(struct.unpack("I", bytes(vertbytes))[0])]
-                verts[stride] = vert
-                vertIdxs[stride] = vert.index
-                stride = stride + 1
-            face = self.bm.faces.new(verts)
-            face.index = i
-            face.smooth = True
-            self.faceCache.append(face)
-            self.faceVertIndexes.append(vertIdxs)
-            i = i + 1
-
-        FetchServerData('getBodyTextureCoordsBinary', self.gotTextureCoords, True)
-
-    def gotTextureCoords(self, data):
-        iMax = int(len(data) / 4 / 2)
-        assert (iMax == int(self.bodyInfo["numTextureCoords"]))
-
-        self.texco = []
-
-        i = 0
-        while i < iMax:
-            sliceStart = i * 4 * 2  # 4-byte floats, two values per coordinate
-            ubytes = data[sliceStart:sliceStart + 4]
-            vbytes = data[sliceStart + 4:sliceStart + 4 + 4]
-            u = struct.unpack("f", bytes(ubytes))[0]
-            v = struct.unpack("f", bytes(vbytes))[0]
-            self.texco.append([u, v])
-            i = i + 1
-
-        FetchServerData('getBodyFaceUVMappingsBinary', self.gotFaceUVMappings, True)
-
-    def gotFaceUVMappings(self, data):
-        iMax = int(len(data) / 4 / 4)
-        assert (iMax == int(self.bodyInfo["numFaceUVMappings"]))
-
-        i = 0
-        faceTexco = []
-
-        while i < iMax:
-            stride = 0;
-            ftex = [None, None, None, None]
-            while stride < 4:
-                sliceStart = i * 4 * 4  # 4-byte ints, four mappings per face
-                mapbytes = data[sliceStart + stride * 4:sliceStart + stride * 4 + 4]
-                idx = struct.unpack("I", bytes(mapbytes))[0]
-                ftex[stride] = self.texco[int(idx)]
-                stride = stride + 1
-            faceTexco.append(ftex)
-            i = i + 1
-
-        uv_layer = self.bm.loops.layers.uv.verify()
-        self.bm.faces.layers.tex.verify()
-
-        for face in self.bm.faces:
-            for i, loop in enumerate(face.loops):
-                uv = loop[uv_layer].uv
-                texco = faceTexco[face.index][i]
-                uv[0] = texco[0]
-                uv[1] = texco[1]
+        faceUVs = decodeInts(mappings, 4)
+        assert (len(faceUVs) == int(self.bodyInfo["numFaceUVMappings"]))
 
+        buildMesh(self.mesh, self.vertPosCache, self.faceVertIndexes, self.texco, faceUVs)
         self.afterMeshData()
 
     def handleHelpers(self):
@@ -243,16 +161,13 @@ class ImportBodyBinary():
                 if not fg["name"] == "body":
                     self.all_meta_faces.extend( list(range(first, last+1)) )
                 faceSubSet = self.faceVertIndexes[first:last]
-                verts.extend(list(set(itertools.chain.from_iterable(faceSubSet))))
+                verts.extend(np.unique(faceSubSet).tolist())
 
             if len(verts) > 0:
                 if name.startswith("joint-"):
                     self.all_joint_verts.extend(verts)
                     if name == "joint-ground":
-                        sum = 0.0
-                        for v in verts:
-                            sum = sum + self.vertPosCache[v][2]
-                        self.groundMean = sum / 8.0
+                        self.groundMean = float(self.vertPosCache[verts,2].sum()) / 8.0
                         print("GROUND MEAN: " + str(self.groundMean))
 
 
@@ -285,20 +200,11 @@ class ImportBodyBinary():
         if self.generalPreset == "MAKECLOTHES":
             print("IS MAKECLOTHES")
 
-            i = 0
-            while i < len(self.vertPosCache):
-                vert = self.vertPosCache[i]
-                x = vert[0]
-
-                if x > -0.01 and x < 0.01:
-                    self.mid_verts.append(i)
-                else:
-                    if x < 0.0:
-                        self.right_verts.append(i)
-                    if x > 0.0:
-                        self.left_verts.append(i)
-
-                i = i + 1
+            x = self.vertPosCache[:,0]
+            mid = (x > -0.01) & (x < 0.01)
+            self.mid_verts = np.flatnonzero(mid).tolist()
+            self.right_verts = np.flatnonzero(~mid & (x < 0.0)).tolist()
+            self.left_verts = np.flatnonzero(~mid & (x > 0.0)).tolist()
 
             if len(self.right_verts) > 0:
                 vgroup = self.obj.vertex_groups.new(name="Right")
@@ -319,13 +225,11 @@ class ImportBodyBinary():
             mask.show_on_cage = True
 
     def _faceListToVertSet(self, faceList):
-        vertList = []
-        for faceIdx in list(faceList):
-            if faceIdx >= len(self.faceVertIndexes):
-                print("WARNING: face index " + str(faceIdx) + " > " + str(len(self.faceVertIndexes)))
-            else:
-                vertList.extend( self.faceVertIndexes[faceIdx] )
-        return set(vertList)
+        faceIdxs = np.fromiter(faceList, dtype=np.int64)
+        valid = faceIdxs < len(self.faceVertIndexes)
+        for faceIdx in faceIdxs[~valid]:
+            print("WARNING: face index " + str(faceIdx) + " > " + str(len(self.faceVertIndexes)))
+        return set(np.unique(self.faceVertIndexes[faceIdxs[valid]]).tolist())
 
     def maskBody(self):
 
@@ -342,7 +246,7 @@ class ImportBodyBinary():
         allVisibleVerts = list(self._faceListToVertSet(allVisibleFaces))
         allMetaVerts = list(self._faceListToVertSet(allMetaFaces))
 
-        allVerts = set( range(0, len(self.vertCache)) )
+        allVerts = set( range(0, len(self.vertPosCache)) )
 
         # TODO:   This approach may cause single vertex outliers. At some point it might make sense
         # TODO:   to find and exclude these
@@ -359,19 +263,13 @@ class ImportBodyBinary():
 
     def afterMeshData(self):
 
-        bmesh.ops.recalc_face_normals(self.bm, faces=self.bm.faces)
-
-        self.bm.to_mesh(self.mesh)
-        self.bm.free()
         self.handleHelpers()
         self.maskBody()
 
-        del self.vertCache
-        del self.faceCache
         del self.texco
         del self.vertPosCache
 
-        FetchServerData('getBodyMaterialInfo',self.gotBodyMaterialInfo)
+        self.gotBodyMaterialInfo(self.materialInfo)
 
     def gotBodyMaterialInfo(self, data):
         matname = data["name"]
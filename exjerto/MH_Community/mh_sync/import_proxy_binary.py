@@ -9,12 +9,12 @@ bl_info = {
 import bpy
 import bmesh
 import pprint
-import struct
 import time
-import itertools
+import numpy as np
 
 from .material import *
-from .fetch_server_data import FetchServerData
+from .binary_data import *
+from .fetch_server_data import FetchServerDataBatch
 
 pp = pprint.PrettyPrinter(indent=4)
 
@@ -79,10 +79,11 @@ class ImportProxyBinary():
         self.obj.MhObjectType = proxyInfo["type"]
         self.obj.MhProxyUUID = proxyInfo["uuid"]
         self.obj.MhProxyName = proxyInfo["name"]
+        self.obj.MhScaleFactor = self.scaleFactor
 
         # TODO: Set more info, for example name of toon
 
-        self.vertPosCache = []
+        self.vertPosCache = None
         self.mid_verts = []
         self.left_verts = []
         self.right_verts = []
@@ -93,8 +94,15 @@ class ImportProxyBinary():
         self.obj.select = True
 
         self.mesh = bpy.context.object.data
-        self.bm = bmesh.new()
-        FetchServerData('getProxyVerticesBinary', self.gotVerticesData, expectBinary=True, params={ "uuid": self.proxyInfo["uuid"] })
+
+        params = { "uuid": self.proxyInfo["uuid"] }
+        FetchServerDataBatch([
+            ('getProxyVerticesBinary', True, params),
+            ('getProxyFacesBinary', True, params),
+            ('getProxyTextureCoordsBinary', True, params),
+            ('getProxyFaceUVMappingsBinary', True, params),
+            ('getProxyMaterialInfo', False, params)
+        ], self.gotMeshData)
 
     def _profile(self, position="timestamp"):
         if not ENABLE_PROFILING_OUTPUT:
@@ -103,130 +111,34 @@ class ImportProxyBinary():
         print(position + ": " + str(currentMillis - self.startMillis) + " / " + str(currentMillis - self.lastMillis))
         self.lastMillis = currentMillis
 
-    def gotVerticesData(self, data):
+    def gotMeshData(self, data):
         self._profile()
-        self.vertCache = []
-
-        iMax = int(len(data) / 4 / 3)
-
-        assert(iMax == int(self.proxyInfo["numVertices"]))
-
-        i = 0
-        while i < iMax:
-            sliceStart = i * 4 * 3 # 4-byte floats, three values per vertex
-
-            # Coordinate order from MH is XZY
-            xbytes = data[sliceStart:sliceStart + 4]
-            zbytes = data[sliceStart + 4:sliceStart + 4 + 4]
-            ybytes = data[sliceStart + 4 + 4:sliceStart + 4 + 4 +4]
-
-            x = struct.unpack("f", bytes(xbytes))[0] * self.scaleFactor
-            y = struct.unpack("f", bytes(ybytes))[0] * self.scaleFactor
-            z = struct.unpack("f", bytes(zbytes))[0] * self.scaleFactor
-
-            if z < self.minimumZ:
-                self.minimumZ = z
+        (vertices, faces, texco, mappings, self.materialInfo) = data
 
-            vert = self.bm.verts.new( (x, -y, z) )
-            vert.index = i
+        self.vertPosCache = decodeVertices(vertices, self.scaleFactor)
+        assert(len(self.vertPosCache) == int(self.proxyInfo["numVertices"]))
+        if len(self.vertPosCache) > 0:
+            self.minimumZ = min(self.minimumZ, float(self.vertPosCache[:,2].min()))
 
-            self.vertCache.append(vert)
-            self.vertPosCache.append( (x, -y, z) )
+        self.faceVertIndexes = decodeInts(faces, 4)
+        assert (len(self.faceVertIndexes) == int(self.proxyInfo["numFaces"]))
 
-            i = i + 1
+        self.texco = decodeFloats(texco, 2)
+        assert (len(self.texco) == int(self.proxyInfo["numTextureCoords"]))
 
-        FetchServerData('getProxyFacesBinary',self.gotFacesData, expectBinary=True, params={ "uuid": self.proxyInfo["uuid"] })
-
-    def gotFacesData(self, data):
-        self._profile()
-        self.faceCache = []
-        self.faceVertIndexes=[]
-
-        iMax = int(len(data) / 4 / 4)
-        assert (iMax == int(self.proxyInfo["numFaces"]))
-
-        i = 0
-        while i < iMax:
-            stride = 0;
-            verts = [None, None, None, None]
-            vertIdxs = [None, None, None, None]
-            while stride < 4:
-                sliceStart = i * 4 * 4  # 4-byte ints, four vertices per face
-                vertbytes = data[sliceStart + stride * 4:sliceStart + stride * 4 + 4]
-                vert = self.vertCache[int(struct.unpack("I", bytes(vertbytes))[0])]
-                verts[stride] = vert
-                vertIdxs[stride] = vert.index
-                stride = stride + 1
-            if verts[0] == verts[3]:
-                verts.pop(3)
-                vertIdxs.pop(3)
-            face = self.bm.faces.new(verts)
-            face.index = i
-            face.smooth = True
-            self.faceCache.append(face)
-            self.faceVertIndexes.append(vertIdxs)
-            i = i + 1
-
-        FetchServerData('getProxyTextureCoordsBinary', self.gotTextureCoords, expectBinary=True, params={ "uuid": self.proxyInfo["uuid"] })
-
-
-    def gotTextureCoords(self, data):
-        iMax = int(len(data) / 4 / 2)
-        assert (iMax == int(self.proxyInfo["numTextureCoords"]))
-
-        self.texco = []
-
-        i = 0
-        while i < iMax:
-            sliceStart = i * 4 * 2  # 4-byte floats, two values per coordinate
-            ubytes = data[sliceStart:sliceStart + 4]
-            vbytes = data[sliceStart + 4:sliceStart + 4 + 4]
-            u = struct.unpack("f", bytes(ubytes))[0]
-            v = struct.unpack("f", bytes(vbytes))[0]
-            self.texco.append([u, v])
-            i = i + 1
-
-        FetchServerData('getProxyFaceUVMappingsBinary', self.gotFaceUVMappings, expectBinary=True, params={ "uuid": self.proxyInfo["uuid"] })
-
-    def gotFaceUVMappings(self, data):
-        iMax = int(len(data) / 4 / 4)
-        assert (iMax == int(self.proxyInfo["numFaceUVMappings"]))
-
-        i = 0
-        faceTexco = []
-
-        while i < iMax:
-            stride = 0;
-            ftex = [None, None, None, None]
-            while stride < 4:
-                sliceStart = i * 4 * 4  # 4-byte ints, four mappings per face
-                mapbytes = data[sliceStart + stride * 4:sliceStart + stride * 4 + 4]
-                idx = struct.unpack("I", bytes(mapbytes))[0]
-                ftex[stride] = self.texco[int(idx)]
-                stride = stride + 1
-            faceTexco.append(ftex)
-            i = i + 1
-
-        uv_layer = self.bm.loops.layers.uv.verify()
-        self.bm.faces.layers.tex.verify()
-
-        for face in self.bm.faces:
-            for i, loop in enumerate(face.loops):
-                uv = loop[uv_layer].uv
-                texco = faceTexco[face.index][i]
-                uv[0] = texco[0]
-                uv[1] = texco[1]
+        faceUVs = decodeInts(mappings, 4)
+        assert (len(faceUVs) == int(self.proxyInfo["numFaceUVMappings"]))
 
+        # Triangles are sent as quads with the first vertex repeated
+        buildMesh(self.mesh, self.vertPosCache, self.faceVertIndexes, self.texco, faceUVs, allowTriangles=True)
         self.afterMeshData()
 
     def _faceListToVertSet(self, faceList):
-        vertList = []
-        for faceIdx in list(faceList):
-            if faceIdx >= len(self.faceVertIndexes):
-                print("WARNING: face index " + str(faceIdx) + " > " + str(len(self.faceVertIndexes)))
-            else:
-                vertList.extend( self.faceVertIndexes[faceIdx] )
-        return set(vertList)
+        faceIdxs = np.fromiter(faceList, dtype=np.int64)
+        valid = faceIdxs < len(self.faceVertIndexes)
+        for faceIdx in faceIdxs[~valid]:
+            print("WARNING: face index " + str(faceIdx) + " > " + str(len(self.faceVertIndexes)))
+        return set(np.unique(self.faceVertIndexes[faceIdxs[valid]]).tolist())
 
     def maskFaces(self):
 
@@ -242,7 +154,7 @@ class ImportProxyBinary():
 
         allVisibleFaces = set(allVisibleFaces)
         allVisibleVerts = list(self._faceListToVertSet(allVisibleFaces))
-        allVerts = set(range(0, len(self.vertCache)))
+        allVerts = set(range(0, len(self.vertPosCache)))
 
         # TODO:   This approach may cause single vertex outliers. At some point it might make sense
         # TODO:   to find and exclude these
@@ -258,22 +170,13 @@ class ImportProxyBinary():
         mask.invert_vertex_group = True
 
     def makeClothesExtras(self):
-        i = 0
         print("MakeClothes extras")
 
-        while i < len(self.vertPosCache):
-            vert = self.vertPosCache[i]
-            x = vert[0]
-
-            if x > -0.01 and x < 0.01:
-                self.mid_verts.append(i)
-            else:
-                if x < 0.0:
-                    self.right_verts.append(i)
-                if x > 0.0:
-                    self.left_verts.append(i)
-
-            i = i + 1
+        x = self.vertPosCache[:,0]
+        mid = (x > -0.01) & (x < 0.01)
+        self.mid_verts = np.flatnonzero(mid).tolist()
+        self.right_verts = np.flatnonzero(~mid & (x < 0.0)).tolist()
+        self.left_verts = np.flatnonzero(~mid & (x > 0.0)).tolist()
 
         if len(self.right_verts) > 0:
             vgroup = self.obj.vertex_groups.new(name="Right")
@@ -289,21 +192,14 @@ class ImportProxyBinary():
 
     def afterMeshData(self):
 
-        bmesh.ops.recalc_face_normals(self.bm, faces=self.bm.faces)
-
-        self.bm.to_mesh(self.mesh)
-        self.bm.free()
-
         if self.generalPreset == "MAKECLOTHES":
             self.makeClothesExtras()
 
         self.maskFaces()
 
-        del self.vertCache
-        del self.faceCache
         del self.texco
 
-        FetchServerData('getProxyMaterialInfo', self.gotProxyMaterialInfo, expectBinary=False, params={ "uuid": self.proxyInfo["uuid"] })
+        self.gotProxyMaterialInfo(self.materialInfo)
 
     def gotProxyMaterialInfo(self, data):
         matname = data["name"]
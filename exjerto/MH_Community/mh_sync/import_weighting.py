@@ -9,13 +9,13 @@ bl_info = {
 import bpy
 import bmesh
 import pprint
-import struct
 import time
-import itertools
+import numpy as np
 
 from mathutils import Matrix, Vector
 from .material import *
-from .fetch_server_data import FetchServerData
+from .binary_data import *
+from .fetch_server_data import FetchServerData, FetchServerDataBatch
 from .import_proxy_binary import ImportProxyBinary
 
 pp = pprint.PrettyPrinter(indent=4)
@@ -61,23 +61,22 @@ class ImportWeighting():
         self.sumWeightsBytes = data["sumWeightsBytes"]
         self.weights = data["weights"]
         if self.isBaseMesh:
-            FetchServerData('getBodyWeightsVertList', self.gotVertListData, expectBinary=True)
+            FetchServerDataBatch([
+                ('getBodyWeightsVertList', True, None),
+                ('getBodyWeights', True, None)
+            ], self.gotWeightsData)
         else:
-            FetchServerData('getProxyWeightsVertList', self.gotVertListData, expectBinary=True, params={ "uuid": self.uuid })
-
-    def gotVertListData(self, data):
-        if self.debug:
-            print("vert list: " + str(len(data)) + " bytes")
-        self.vertListBytes = bytearray(data)
-        if self.isBaseMesh:
-            FetchServerData('getBodyWeights', self.gotWeightsData, expectBinary=True)
-        else:
-            FetchServerData('getProxyWeights', self.gotWeightsData, expectBinary=True, params={ "uuid": self.uuid })
+            params = { "uuid": self.uuid }
+            FetchServerDataBatch([
+                ('getProxyWeightsVertList', True, params),
+                ('getProxyWeights', True, params)
+            ], self.gotWeightsData)
 
     def gotWeightsData(self, data):
+        (self.vertListBytes, self.weightBytes) = data
         if self.debug:
-            print("weight data: " + str(len(data)) + " bytes")
-        self.weightBytes = bytearray(data)
+            print("vert list: " + str(len(self.vertListBytes)) + " bytes")
+            print("weight data: " + str(len(self.weightBytes)) + " bytes")
         for info in self.weights:
             self.handleWeight(info)
         self.finalize()
@@ -92,20 +91,11 @@ class ImportWeighting():
         vertGroup = self.myObject.vertex_groups.new(boneName)
 
         bytesStart = self.processedVertices * 4 # both vert list and weights come as four bytes per vertex
-        bytesEnd = self.processedVertices * 4 + numVerts * 4
         self.processedVertices = self.processedVertices + numVerts
 
-        currentListBytes = self.vertListBytes[bytesStart:bytesEnd]
-        currentWeightBytes = self.weightBytes[bytesStart:bytesEnd]
-
-        i = 0
-        while i < numVerts:
-            oneWeightBytes = currentWeightBytes[i*4:i*4+4]
-            oneVertBytes = currentListBytes[i*4:i*4+4]
-            weight = struct.unpack("f", bytes(oneWeightBytes))[0]
-            vertNum = struct.unpack("I", bytes(oneVertBytes))[0]
-            vertGroup.add([vertNum], weight, 'ADD')
-            i = i + 1
+        vertNums = np.frombuffer(self.vertListBytes, dtype=np.uint32, count=numVerts, offset=bytesStart)
+        weights = np.frombuffer(self.weightBytes, dtype=np.float32, count=numVerts, offset=bytesStart)
+        addVertexWeights(vertGroup, vertNums, weights)
 
 
     def finalize(self):
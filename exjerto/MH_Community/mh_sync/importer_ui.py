@@ -3,6 +3,7 @@
 
 import bpy
 from bpy.props import BoolProperty, StringProperty, EnumProperty, IntProperty, CollectionProperty, FloatProperty
+from .JsonCall import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TIMEOUT
 
 overridePresets = []
 overridePresets.append( ("BELOW", "Settings below", "Use settings below", 1) )
@@ -63,6 +64,10 @@ def registerImporterConstantsAndSettings():
 
     bpy.types.Scene.MhAdjustPosition = BoolProperty(name="Place feet on ground", description="Move the toon after import so that feet are on ground (z = 0.0). This is not to be confused with the feet on ground option inside MH.", default=True)
 
+    bpy.types.Scene.MhSyncHost = StringProperty(name="Host", description="Address of the machine where the MakeHuman socket server is running", default=DEFAULT_HOST)
+    bpy.types.Scene.MhSyncPort = IntProperty(name="Port", description="Port the MakeHuman socket server is listening on", default=DEFAULT_PORT, min=1, max=65535)
+    bpy.types.Scene.MhSyncTimeout = FloatProperty(name="Timeout", description="Seconds to wait for MakeHuman to answer before giving up", default=DEFAULT_TIMEOUT, min=1.0)
+
     # bpy.types.Scene.MhHandIK = BoolProperty(name="Hand IK", description="Create hand IK controls", default=False)
     # bpy.types.Scene.MhFootIK = BoolProperty(name="Foot IK", description="Create foot IK controls", default=False)
     # bpy.types.Scene.MhHideFK = BoolProperty(name="Hide FK", description="Hide FK bones that are part of an IK chain", default=True)
@@ -70,6 +75,7 @@ def registerImporterConstantsAndSettings():
     bpy.types.Object.MhProxyName = StringProperty(name="Proxy name", description="This is what the proxy is called in MakeHuman", default="")
     bpy.types.Object.MhProxyUUID = StringProperty(name="Proxy UUID", description="This is the UUID of the proxy in MakeHuman", default="")
     bpy.types.Object.MhObjectType = StringProperty(name="Object type", description="This is what type of MakeHuman object this is (such as Clothes, Eyes...)", default="")
+    bpy.types.Object.MhScaleFactor = FloatProperty(name="Scale factor", description="Scale the MakeHuman coordinates were multiplied with when this object was imported", default=1.0)
 
     # In case MHX2 isn't loaded
     bpy.types.Object.MhHuman = BoolProperty(default=False)
@@ -129,5 +135,11 @@ def addImporterUIToTab(layout, scn):
     importHumanBox.label(text="Various:")
     importHumanBox.prop(scn, 'MhAdjustPosition', text="Place feet on ground")
 
+    importHumanBox.separator()
+    importHumanBox.label(text="MakeHuman server:")
+    importHumanBox.prop(scn, 'MhSyncHost')
+    importHumanBox.prop(scn, 'MhSyncPort')
+    importHumanBox.prop(scn, 'MhSyncTimeout')
+
     importHumanBox.separator()
     importHumanBox.operator("mh_community.import_body", text="Import human")
\ No newline at end of file
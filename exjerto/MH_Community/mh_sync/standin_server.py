@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# A stand-in for the MakeHuman socket server, for trying out the sync code
+# without a running MakeHuman. It is not loaded by the plug-in; run it with
+#
+#   python standin_server.py [--host 127.0.0.1] [--port 12345] [--delay 0.0]
+#
+# and point blender at it. It speaks the same protocol as MakeHuman: one
+# json request per connection, answered with either json or raw binary data,
+# after which the connection is closed. The "human" it serves is a cube with
+# a single bone and no proxies.
+
+import argparse
+import array
+import json
+import os
+import socketserver
+import tempfile
+import time
+
+# MakeHuman coordinates, Y up
+CUBE_VERTICES = [
+    (-1.0, 0.0,  1.0), ( 1.0, 0.0,  1.0), ( 1.0, 2.0,  1.0), (-1.0, 2.0,  1.0),
+    (-1.0, 0.0, -1.0), ( 1.0, 0.0, -1.0), ( 1.0, 2.0, -1.0), (-1.0, 2.0, -1.0),
+]
+
+CUBE_FACES = [
+    (0, 1, 2, 3), (5, 4, 7, 6), (4, 0, 3, 7),
+    (1, 5, 6, 2), (3, 2, 6, 7), (4, 5, 1, 0),
+]
+
+CUBE_TEXCO = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)]
+
+CUBE_FACE_UVS = [(0, 1, 2, 3)] * len(CUBE_FACES)
+
+SKELETON = {
+    "name": "standin",
+    "offset": [0.0, 0.0, 0.0],
+    "bones": [{
+        "name": "root",
+        "headPos": [0.0, 0.0, 0.0],
+        "tailPos": [0.0, 2.0, 0.0],
+        "roll": 0.0,
+        "children": []
+    }]
+}
+
+MATERIAL = {
+    "name": "standinMaterial",
+    "shininess": 0.5,
+    "diffuseTexture": ""
+}
+
+def floats(values):
+    return array.array("f", [v for row in values for v in row]).tobytes()
+
+def ints(values):
+    return array.array("I", [v for row in values for v in row]).tobytes()
+
+def getBodyMeshInfo(params):
+    return {
+        "name": "standin",
+        "numVertices": len(CUBE_VERTICES),
+        "numFaces": len(CUBE_FACES),
+        "numTextureCoords": len(CUBE_TEXCO),
+        "numFaceUVMappings": len(CUBE_FACE_UVS),
+        "faceGroups": [{ "name": "body", "fgStartStops": [[0, len(CUBE_FACES)]] }],
+        "faceMask": [[0, len(CUBE_FACES) - 1]]
+    }
+
+def getBodyWeightInfo(params):
+    n = len(CUBE_VERTICES)
+    return {
+        "sumVerts": n,
+        "sumVertListBytes": n * 4,
+        "sumWeightsBytes": n * 4,
+        "weights": [{ "bone": "root", "numVertices": n }]
+    }
+
+def getCoord(params):
+    return [list(v) for v in CUBE_VERTICES]
+
+def getPose(params):
+    identity = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+    return { "root": identity }
+
+def getDir(params):
+    return tempfile.gettempdir().replace(os.sep, "/")
+
+JSON_RESPONSES = {
+    "getBodyMeshInfo": getBodyMeshInfo,
+    "getBodyMaterialInfo": lambda params: MATERIAL,
+    "getSkeleton": lambda params: SKELETON,
+    "getProxiesInfo": lambda params: [],
+    "getBodyWeightInfo": getBodyWeightInfo,
+    "getCoord": getCoord,
+    "getPose": getPose,
+    "getUserDir": getDir,
+    "getSysDir": getDir,
+}
+
+BINARY_RESPONSES = {
+    "getBodyVerticesBinary": lambda params: floats(CUBE_VERTICES),
+    "getBodyFacesBinary": lambda params: ints(CUBE_FACES),
+    "getBodyTextureCoordsBinary": lambda params: floats(CUBE_TEXCO),
+    "getBodyFaceUVMappingsBinary": lambda params: ints(CUBE_FACE_UVS),
+    "getBodyWeightsVertList": lambda params: ints([range(len(CUBE_VERTICES))]),
+    "getBodyWeights": lambda params: floats([[1.0] * len(CUBE_VERTICES)]),
+}
+
+class StandinHandler(socketserver.BaseRequestHandler):
+
+    def readRequest(self):
+        # The client does not close its end, so read until the json is complete
+        data = b""
+        while True:
+            buf = self.request.recv(4096)
+            if len(buf) == 0:
+                return None
+            data += buf
+            try:
+                return json.loads(data.decode("utf-8"))
+            except ValueError:
+                pass
+
+    def handle(self):
+        request = self.readRequest()
+        if request is None:
+            return
+
+        function = request["function"]
+        params = request["params"]
+        print("Request: " + function)
+
+        if self.server.delay > 0.0:
+            time.sleep(self.server.delay)
+
+        if function in BINARY_RESPONSES:
+            self.request.sendall(BINARY_RESPONSES[function](params))
+            return
+
+        response = { "function": function, "error": "", "params": {}, "data": None }
+        if function in JSON_RESPONSES:
+            response["data"] = JSON_RESPONSES[function](params)
+        else:
+            response["error"] = "Unknown function " + function
+        self.request.sendall(bytes(json.dumps(response), "utf-8"))
+
+class StandinServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, delay=0.0):
+        super().__init__(address, StandinHandler)
+        self.delay = delay
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for the MakeHuman socket server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering each call")
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), args.delay)
+    print("Listening on " + args.host + ":" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -6,34 +6,71 @@ bl_info = {
     "category": "Mesh",
 }
 
-from .sync_ops import SyncOperator
+from .fetch_server_data import FetchServerDataBatch
+from .binary_data import decodeVertices
 
 import bpy
+import numpy as np
 import pprint
 
 pp = pprint.PrettyPrinter(indent=4)
 
-class SyncMesh(SyncOperator):
+# Above this many changed vertices it is cheaper to write the whole buffer
+# with foreach_set than to assign them one by one
+PARTIAL_UPDATE_LIMIT = 1000
+
+def getMeshCoords(mesh):
+    # Compared against the live mesh, so that vertices moved in blender are
+    # put back as well
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    return coords.reshape((-1, 3))
+
+class SyncMesh():
     def __init__(self):
-        super().__init__('getCoord')
-        self.executeJsonCall()
+        obj = bpy.context.active_object
+
+        # When syncing an imported body, bring its proxies along. These are
+        # parented either to the body or to the rig, depending on import
+        # settings.
+        self.objects = [obj]
+        if obj.MhObjectType == "Basemesh":
+            owner = obj
+            if not obj.parent is None and obj.parent.type == 'ARMATURE':
+                owner = obj.parent
+            for child in owner.children:
+                if child.type == 'MESH' and child.MhProxyUUID != "":
+                    self.objects.append(child)
+
+        calls = []
+        for ob in self.objects:
+            if ob.MhProxyUUID != "":
+                calls.append(('getProxyVerticesBinary', True, { "uuid": ob.MhProxyUUID }))
+            else:
+                calls.append(('getBodyVerticesBinary', True, None))
+        FetchServerDataBatch(calls, self.callback)
 
-    def callback(self,json_obj):
+    def callback(self, data):
 
         print("Update mesh")
 
-        obj = bpy.context.active_object
-        print(type(json_obj))
-        data = json_obj.data
-        l = len(data)
-        print("Length of vertex array in incoming data: " + str(l))
-        l2 = len(obj.data.vertices)
-        print("Length of vertex array in selected object: " + str(l2))
-
-        i = 0
-
-        while i < l and i < l2:
-            obj.data.vertices[i].co[0] = data[i][0]
-            obj.data.vertices[i].co[1] = -data[i][2]
-            obj.data.vertices[i].co[2] = data[i][1]
-            i = i + 1
+        for (ob, vertices) in zip(self.objects, data):
+            coords = decodeVertices(vertices, ob.MhScaleFactor)
+            mesh = ob.data
+            print("Length of vertex array in incoming data: " + str(len(coords)))
+            print("Length of vertex array in " + ob.name + ": " + str(len(mesh.vertices)))
+
+            if len(coords) != len(mesh.vertices):
+                print("Topology of " + ob.name + " has changed, it needs to be imported again")
+                continue
+
+            changed = np.flatnonzero(np.any(coords != getMeshCoords(mesh), axis=1))
+            print("Changed vertices: " + str(len(changed)))
+
+            if len(changed) > PARTIAL_UPDATE_LIMIT:
+                mesh.vertices.foreach_set("co", coords.ravel())
+            else:
+                for i in changed:
+                    mesh.vertices[i].co = coords[i]
+            if len(changed) > 0:
+                mesh.update()
@@ -4,7 +4,15 @@
 import bpy
 import json
 
-from .JsonCall import JsonCall
+from .JsonCall import JsonCall, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TIMEOUT
+
+def getServerSettings():
+    # Read on the main thread, bpy.context must not be touched from workers
+    scn = bpy.context.scene
+    host = getattr(scn, "MhSyncHost", DEFAULT_HOST) or DEFAULT_HOST
+    port = getattr(scn, "MhSyncPort", DEFAULT_PORT)
+    timeout = getattr(scn, "MhSyncTimeout", DEFAULT_TIMEOUT)
+    return host, port, timeout
 
 class SyncOperator:
     def __init__(self, operator):
@@ -14,7 +22,8 @@ class SyncOperator:
     def executeJsonCall(self, expectBinaryResponse=False, params=None):
         if not params is None:
             self.call.params = params
-        json_obj = self.call.send(expectBinaryResponse=expectBinaryResponse)
+        host, port, timeout = getServerSettings()
+        json_obj = self.call.send(host, port, expectBinaryResponse=expectBinaryResponse, timeout=timeout)
         self.callback(json_obj)
 
     def callback(self,json_obj):
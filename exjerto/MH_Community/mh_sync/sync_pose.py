@@ -10,8 +10,104 @@ from .sync_ops import SyncOperator
 from MH_Community.rig_info import *
 
 import bpy
+import numpy as np
 from mathutils import Matrix, Vector
 
+def getBoneHierarchy(skeleton):
+    # Pose bones ordered parents first, their parent indices in that order and
+    # their rest matrices relative to the parent's rest matrix
+    bones = sorted(skeleton.pose.bones, key=lambda pb: len(pb.parent_recursive))
+    index = dict((pb.name, i) for (i, pb) in enumerate(bones))
+    parents = []
+    relRest = np.empty((len(bones), 4, 4))
+    for (i, pb) in enumerate(bones):
+        rest = np.array(pb.bone.matrix_local)
+        if pb.parent is None:
+            parents.append(-1)
+            relRest[i] = rest
+        else:
+            parents.append(index[pb.parent.name])
+            relRest[i] = np.linalg.solve(np.array(pb.parent.bone.matrix_local), rest)
+    return bones, parents, relRest
+
+def packPoses(bones, poses, haveDots, useBone):
+    # Gather the pose space matrices sent by MH into one (poses, bones, 4, 4)
+    # array, together with a mask of the bones each pose should set
+    mats = np.tile(np.identity(4), (len(poses), len(bones), 1, 1))
+    present = np.zeros((len(poses), len(bones)), dtype=bool)
+    for (n, pose) in enumerate(poses):
+        for (i, bone) in enumerate(bones):
+            if not useBone[i]:
+                continue
+            # the dots in collada exported bone names are replaced with '_', check for data with that changed back
+            name = bone.name.replace("_", ".") if not haveDots else bone.name
+            if name in pose:
+                mats[n,i] = pose[name]
+                present[n,i] = True
+            else:
+                print(name + ' bone not found coming from MH')
+    return mats, present
+
+def getPoseBases(parents, relRest, mats, present, noLocation):
+    # Solve for the matrix_basis that puts each bone at the requested pose
+    # space matrix, given where its parent ended up. This is what assigning
+    # to bone.matrix does, but without a scene update per bone, and for all
+    # poses at once.
+    nPoses, nBones = present.shape
+    bases = np.tile(np.identity(4), (nPoses, nBones, 1, 1))
+    world = np.empty((nPoses, nBones, 4, 4))
+    for i in range(nBones):
+        if parents[i] < 0:
+            restPose = np.broadcast_to(relRest[i], (nPoses, 4, 4))
+        else:
+            restPose = world[:,parents[i]] @ relRest[i]
+        sel = present[:,i]
+        if sel.any():
+            bases[sel,i] = np.linalg.solve(restPose[sel], mats[sel,i])
+            if noLocation:
+                bases[sel,i,:3,3] = 0
+        world[:,i] = restPose @ bases[:,i]
+    return bases
+
+def bonesHaveDots(bones):
+    for bone in bones:
+        if "." in bone.name:
+            return True
+
+    return False
+
+def hasAncestor(poseBone, ancestorName):
+    while poseBone.parent is not None:
+        if poseBone.parent.name == ancestorName:
+            return True
+        else:
+            poseBone = poseBone.parent
+
+def posesToBases(skeleton, poses, isExpression):
+    # matrix_basis of every bone for each of a list of poses sent by MH.
+    # Returns the bones in the order used, and a (poses, bones, 4, 4) array.
+    rigInfo = RigInfo.determineRig(skeleton)
+    feetOnGround = rigInfo.hasFeetOnGround()
+    haveDots = bonesHaveDots(skeleton.pose.bones)
+    hierarchy, parents, relRest = getBoneHierarchy(skeleton)
+
+    # Could have been exported with a Pose not currently matching MH session.
+    # For expressions, only set bones with an ancestor of head to avoid extra stuff in pose library.
+    # Still might work if both are facing forward.
+    useBone = [not isExpression or hasAncestor(bone, 'head') for bone in hierarchy]
+
+    mats, present = packPoses(hierarchy, poses, haveDots, useBone)
+    bases = getPoseBases(parents, relRest, mats, present, bpy.context.scene.MhNoLocation)
+
+    #feet on Ground processing
+    if feetOnGround:
+        for (i, bone) in enumerate(hierarchy):
+            if bone.parent is None:
+                bases[:,i,:3,3] = 0
+                break
+
+    return hierarchy, bases
+
 class SyncPose(SyncOperator):
     def __init__(self, poseFilename = None, isExpression = False):
         super().__init__('getPose')
@@ -25,51 +121,18 @@ class SyncPose(SyncOperator):
         print("Update pose")
 
         self.skeleton = bpy.context.active_object
-        self.rigInfo = RigInfo.determineRig(self.skeleton)
-        feetOnGround = self.rigInfo.hasFeetOnGround()
-
         self.bones = self.skeleton.pose.bones
         bpy.ops.object.mode_set(mode='POSE')
         bpy.ops.pose.select_all(action='SELECT')
-        bpy.ops.pose.transforms_clear()
-        self.haveDots = self.bonesHaveDots()
 
-        #apply as passed back
-        for bone in self.bones:
-            # Could have been exported with a Pose not currently matching MH session.
-            # For expressions, only set bones with an ancestor of head to avoid extra stuff in pose library.
-            # Still might work if both are facing forward.
-            if not self.isExpression or self.hasAncestor(bone, 'head'):
-                self.apply(bone, json_obj, bpy.context.scene.MhNoLocation)
-
-        #feet on Ground processing
-        if feetOnGround:
-            rootBone = self.getRootBone()
-            rootBone.location[0] = 0
-            rootBone.location[1] = 0
-            rootBone.location[2] = 0
-
-    def apply(self, bone, json_obj, MhNoLocation):
-        # the dots in collada exported bone names are replaced with '_', check for data with that changed back
-        name = bone.name.replace("_", ".") if not self.haveDots else bone.name
-
-        if name in json_obj.data:
-            bone.matrix = Matrix(json_obj.data[name])
-            if MhNoLocation:
-                bone.location[0] = 0
-                bone.location[1] = 0
-                bone.location[2] = 0
-            bpy.context.scene.update()
+        hierarchy, bases = posesToBases(self.skeleton, [json_obj.data], self.isExpression)
 
-        else:
-            print(name + ' bone not found coming from MH')
+        #apply as passed back
+        for (bone, basis) in zip(hierarchy, bases[0]):
+            bone.matrix_basis = Matrix(basis.tolist())
 
     def bonesHaveDots(self):
-        for bone in self.bones:
-            if "." in bone.name:
-                return True
-
-        return False
+        return bonesHaveDots(self.bones)
 
     def getRootBone(self):
         for bone in self.bones:
@@ -80,11 +143,7 @@ class SyncPose(SyncOperator):
         return None
 
     def hasAncestor(self, poseBone, ancestorName):
-        while poseBone.parent is not None:
-            if poseBone.parent.name == ancestorName:
-                return True
-            else:
-                poseBone = poseBone.parent
+        return hasAncestor(poseBone, ancestorName)
 
     def getRestTranslation(self, bone):
         # need to change to edit mode to work with editbones
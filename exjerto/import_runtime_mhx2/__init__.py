@@ -44,6 +44,8 @@ if "bpy" in locals():
     imp.reload(error)
     imp.reload(config)
     imp.reload(load_json)
+    imp.reload(cache)
+    imp.reload(assets)
     imp.reload(masks)
     imp.reload(materials)
     imp.reload(shaders)
@@ -74,6 +76,8 @@ else:
     from . import error
     from . import config
     from . import load_json
+    from . import cache
+    from . import assets
     from . import masks
     from . import materials
     from . import shaders
@@ -117,6 +121,7 @@ class MHX_PT_Setup(bpy.types.Panel):
         scn = context.scene
 
         layout.operator("import_scene.makehuman_mhx2")
+        layout.operator("mhx2.build_asset_cache")
         #layout.operator("mhx2.make_skin_shader")
 
         if (ob is None or
@@ -644,6 +649,7 @@ def register():
     bpy.types.Scene.MhxUseConservativeMasks = BoolProperty(name="Conservative Masks", description="Only delete faces with two delete-verts", default=True)
     bpy.types.Scene.MhxDesignHuman = StringProperty(default="None")
 
+    assets.initialize()
     bone_drivers.initialize()
     drivers.initialize()
     faceshift.initialize()
@@ -668,6 +674,7 @@ def register():
 
 
 def unregister():
+    assets.uninitialize()
     bone_drivers.uninitialize()
     drivers.uninitialize()
     faceshift.uninitialize()
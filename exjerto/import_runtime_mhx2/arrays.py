@@ -0,0 +1,207 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Array helpers for bulk mesh construction.
+#   This module only depends on numpy, so it can be used and tested
+#   outside Blender.
+#
+
+import numpy as np
+
+# ---------------------------------------------------------------------
+#   Coordinates
+# ---------------------------------------------------------------------
+
+def zupArray(coords, scale=1.0, offset=(0,0,0)):
+    """Convert MakeHuman y-up coordinates to Blender z-up, like utils.zup."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1,3)
+    verts = np.empty(coords.shape, dtype=np.float64)
+    verts[:,0] = coords[:,0]
+    verts[:,1] = -coords[:,2]
+    verts[:,2] = coords[:,1]
+    return scale*verts + np.asarray(offset, dtype=np.float64)
+
+# ---------------------------------------------------------------------
+#   Faces and loops
+# ---------------------------------------------------------------------
+
+def flattenFaces(faces):
+    """
+    Return (loops, starts, totals) for a list of faces: the vertex index
+    of every face corner, and the first loop and loop count of each face.
+    """
+    try:
+        array = np.array(faces, dtype=np.int32)
+    except ValueError:
+        array = None
+
+    if array is not None and array.ndim == 2:
+        nfaces,nverts = array.shape
+        loops = array.ravel()
+        totals = np.full(nfaces, nverts, dtype=np.int32)
+    elif array is not None and array.size == 0:
+        loops = totals = np.zeros(0, dtype=np.int32)
+    else:
+        totals = np.array([len(f) for f in faces], dtype=np.int32)
+        loops = np.array([vn for f in faces for vn in f], dtype=np.int32)
+
+    starts = np.zeros(len(totals), dtype=np.int32)
+    if len(totals) > 1:
+        np.cumsum(totals[:-1], out=starts[1:])
+    return loops, starts, totals
+
+
+def getUvLoops(uvFaces, uvCoords):
+    """Return the uv coordinates of all face corners, in loop order."""
+    idxs = flattenFaces(uvFaces)[0]
+    coords = np.asarray(uvCoords, dtype=np.float32).reshape(-1,2)
+    return coords[idxs]
+
+# ---------------------------------------------------------------------
+#   Vertex weights
+# ---------------------------------------------------------------------
+
+def getWeightArrays(data):
+    """Return the vertex indices and weights of a list of (vn, w) pairs."""
+    pairs = np.array(list(data), dtype=np.float64).reshape(-1,2)
+    vnums = pairs[:,0].astype(np.int32)
+    weights = pairs[:,1]
+    # A vertex listed twice keeps its last weight, as with repeated REPLACE
+    _,first = np.unique(vnums[::-1], return_index=True)
+    keep = np.sort(len(vnums) - 1 - first)
+    return vnums[keep], weights[keep]
+
+
+def groupByWeight(vnums, weights):
+    """Return a list of (w, vnums) with all vertices sharing the same weight."""
+    values,inverse = np.unique(weights, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    splits = np.cumsum(np.bincount(inverse, minlength=len(values)))[:-1]
+    return [(w, vn.tolist()) for w,vn in
+            zip(values.tolist(), np.split(vnums[order], splits))]
+
+
+def cleanVertexWeights(vweights, maxInfluences=0, minWeight=0.0, normalize=False):
+    """
+    Prune and normalize vertex weights given as {name : (vnums, weights)}.
+    Weights below minWeight are dropped, at most maxInfluences groups are
+    kept per vertex (0 means no limit), and if normalize is set the
+    remaining weights of each vertex are scaled to sum to one.
+    """
+    names = list(vweights.keys())
+    if not names:
+        return {}
+    gnums = np.concatenate([np.full(len(vweights[name][0]), gn, dtype=np.int32)
+                            for gn,name in enumerate(names)])
+    vnums = np.concatenate([vweights[name][0] for name in names]).astype(np.int32)
+    weights = np.concatenate([vweights[name][1] for name in names]).astype(np.float64)
+
+    keep = (weights >= minWeight)
+    if maxInfluences > 0 and len(vnums) > 0:
+        order = np.lexsort((-weights, ~keep, vnums))
+        svnums = vnums[order]
+        starts = np.flatnonzero(np.r_[True, svnums[1:] != svnums[:-1]])
+        counts = np.diff(np.r_[starts, len(svnums)])
+        rank = np.arange(len(svnums)) - np.repeat(starts, counts)
+        keep[order[rank >= maxInfluences]] = False
+
+    gnums,vnums,weights = gnums[keep],vnums[keep],weights[keep]
+    if normalize and len(vnums) > 0:
+        total = np.bincount(vnums, weights)
+        weights = weights / np.where(total > 0, total, 1.0)[vnums]
+
+    return dict([(name, (vnums[gnums == gn], weights[gnums == gn]))
+                 for gn,name in enumerate(names)])
+
+# ---------------------------------------------------------------------
+#   Proxy fitting
+# ---------------------------------------------------------------------
+
+def getFittingArrays(fitting):
+    """Return the vertex numbers, weights and offsets of proxy fitting data."""
+    if isinstance(fitting, np.ndarray) and fitting.dtype.names:
+        return (fitting["vnums"].astype(np.int32),
+                fitting["weights"].astype(np.float64),
+                fitting["offsets"].astype(np.float64))
+    data = np.array(fitting, dtype=np.float64).reshape(-1,3,3)
+    return data[:,0].astype(np.int32), data[:,1], data[:,2]
+
+
+def proxyTransfer(vnums, weights, values):
+    """
+    Multiply base mesh values by the fitting matrix. The matrix is sparse
+    with three entries per proxy vertex: row pvn has weights[pvn] in the
+    columns vnums[pvn]. Values has one row per base vertex.
+    """
+    values = np.asarray(values)
+    result = weights[:,0,None] * values[vnums[:,0]].reshape(len(vnums),-1)
+    for n in range(1, vnums.shape[1]):
+        result += weights[:,n,None] * values[vnums[:,n]].reshape(len(vnums),-1)
+    return result.reshape((len(vnums),) + values.shape[1:])
+
+# ---------------------------------------------------------------------
+#   Shape key targets
+# ---------------------------------------------------------------------
+
+def getTargetArrays(data, nverts=None):
+    """
+    Return the vertex numbers and y-up deltas of a target given as a list
+    of (vn, delta) pairs or as a (vnums, deltas) tuple of arrays. With
+    nverts, the list is cut before the first vertex outside the mesh.
+    """
+    if isinstance(data, tuple):
+        vnums,deltas = data
+        vnums = np.asarray(vnums, dtype=np.int32)
+        deltas = np.asarray(deltas, dtype=np.float64).reshape(-1,3)
+    else:
+        vnums = np.array([vn for vn,_ in data], dtype=np.int32)
+        deltas = np.array([delta for _,delta in data], dtype=np.float64).reshape(-1,3)
+    if nverts is not None:
+        vnums,deltas = vnums[:nverts],deltas[:nverts]
+        outside = np.flatnonzero(vnums >= nverts)
+        if len(outside) > 0:
+            vnums,deltas = vnums[:outside[0]],deltas[:outside[0]]
+    return vnums, deltas
+
+
+def packTargets(targets):
+    """Pack {name : (vnums, deltas)} into flat arrays suitable for np.savez."""
+    names = sorted(targets.keys())
+    counts = [len(targets[name][0]) for name in names]
+    vnums = [np.asarray(targets[name][0], dtype=np.int32) for name in names]
+    deltas = [np.asarray(targets[name][1], dtype=np.float32).reshape(-1,3) for name in names]
+    return {
+        "names" : np.array(names, dtype=str),
+        "counts" : np.array(counts, dtype=np.int32),
+        "vnums" : np.concatenate(vnums) if names else np.zeros(0, dtype=np.int32),
+        "deltas" : np.concatenate(deltas) if names else np.zeros((0,3), dtype=np.float32),
+    }
+
+
+def unpackTargets(arrays):
+    targets = {}
+    first = 0
+    for name,count in zip(arrays["names"].tolist(), arrays["counts"].tolist()):
+        targets[name] = (arrays["vnums"][first:first+count], arrays["deltas"][first:first+count])
+        first += count
+    return targets
@@ -0,0 +1,223 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Cached loading of the .mxa assets under data/hm8 (face shapes, hair,
+#   genitalia, deflectors). The json is parsed once and the bulk data is
+#   converted to numpy arrays, which are stored in the on-disk cache.
+#   Loaded assets are also kept in memory, so repeated imports in the
+#   same session skip both steps. Callers get a fresh copy of the dicts
+#   and lists, while the arrays are shared and must not be modified.
+#
+
+import os
+import json
+import hashlib
+import functools
+import bpy
+import numpy as np
+
+from .load_json import loadJson
+from .cache import getSourceStamp, loadCachedArrays, saveCachedArrays
+
+MemoryCacheSize = 32
+
+# ---------------------------------------------------------------------
+#   Loading
+# ---------------------------------------------------------------------
+
+def loadAsset(filepath):
+    """Load an .mxa file, given by an absolute path or relative to the add-on."""
+    if not os.path.isabs(filepath):
+        filepath = os.path.join(os.path.dirname(__file__), filepath)
+    filepath = os.path.realpath(filepath)
+    struct = loadConvertedAsset(filepath, getSourceStamp(filepath))
+    return copyStruct(struct)
+
+
+@functools.lru_cache(maxsize=MemoryCacheSize)
+def loadConvertedAsset(filepath, stamp):
+    name = getAssetName(filepath)
+    arrays = loadCachedArrays(name, stamp)
+    if arrays is not None:
+        return unpackAsset(arrays)
+    struct = convertAsset(loadJson(filepath))
+    saveCachedArrays(name, stamp, packAsset(struct))
+    return struct
+
+
+def getAssetName(filepath):
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    return "asset-%s-%s" % (base, hashlib.md5(filepath.encode("utf-8")).hexdigest()[:8])
+
+
+def copyStruct(data):
+    if isinstance(data, dict):
+        return dict([(key, copyStruct(value)) for key,value in data.items()])
+    elif isinstance(data, list):
+        return [copyStruct(elt) for elt in data]
+    else:
+        return data
+
+# ---------------------------------------------------------------------
+#   Conversion to arrays
+# ---------------------------------------------------------------------
+
+FittingType = np.dtype([("vnums", "<i4", 3), ("weights", "<f4", 3), ("offsets", "<f4", 3)])
+
+MeshArrays = [
+    ("vertices", np.float32),
+    ("faces", np.int32),
+    ("uv_coordinates", np.float32),
+    ("uv_faces", np.int32),
+]
+
+def convertAsset(struct):
+    if "targets" in struct.keys():
+        struct["targets"] = dict([(tname, convertTarget(data))
+                                  for tname,data in struct["targets"].items()])
+    if "mesh" in struct.keys():
+        mhMesh = struct["mesh"]
+        for key,dtype in MeshArrays:
+            if key in mhMesh.keys():
+                mhMesh[key] = convertArray(mhMesh[key], dtype)
+    if "proxy" in struct.keys():
+        convertFitting(struct["proxy"])
+        if "delete_verts" in struct["proxy"].keys():
+            struct["proxy"]["delete_verts"] = convertArray(struct["proxy"]["delete_verts"], bool)
+    if "particle_systems" in struct.keys():
+        for mhSystem in struct["particle_systems"]:
+            convertFitting(mhSystem)
+    return struct
+
+
+def convertTarget(data):
+    vnums = np.array([vn for vn,_ in data], dtype=np.int32)
+    deltas = np.array([delta for _,delta in data], dtype=np.float32).reshape(-1,3)
+    return (vnums, deltas)
+
+
+def convertFitting(struct):
+    if "fitting" not in struct.keys():
+        return
+    data = np.array(struct["fitting"], dtype=np.float64).reshape(-1,3,3)
+    fitting = np.zeros(len(data), dtype=FittingType)
+    fitting["vnums"] = data[:,0]
+    fitting["weights"] = data[:,1]
+    fitting["offsets"] = data[:,2]
+    struct["fitting"] = fitting
+
+
+def convertArray(data, dtype):
+    try:
+        return np.array(data, dtype=dtype)
+    except ValueError:
+        # Ragged data, e.g. meshes mixing triangles and quads
+        return data
+
+# ---------------------------------------------------------------------
+#   Packing for np.savez. The json part of the struct is stored as text,
+#   with {"$array" : key} in place of each array.
+# ---------------------------------------------------------------------
+
+def packAsset(struct):
+    arrays = {}
+    header = packArrays(struct, arrays)
+    arrays["header"] = np.array(json.dumps(header))
+    return arrays
+
+
+def packArrays(data, arrays):
+    if isinstance(data, np.ndarray):
+        key = "a%d" % len(arrays)
+        arrays[key] = data
+        return {"$array" : key}
+    elif isinstance(data, tuple):
+        return {"$tuple" : [packArrays(elt, arrays) for elt in data]}
+    elif isinstance(data, dict):
+        return dict([(key, packArrays(value, arrays)) for key,value in data.items()])
+    elif isinstance(data, list):
+        return [packArrays(elt, arrays) for elt in data]
+    else:
+        return data
+
+
+def unpackAsset(arrays):
+    header = json.loads(str(arrays["header"]))
+    return unpackArrays(header, arrays)
+
+
+def unpackArrays(data, arrays):
+    if isinstance(data, dict):
+        if "$array" in data.keys():
+            return arrays[data["$array"]]
+        elif "$tuple" in data.keys():
+            return tuple([unpackArrays(elt, arrays) for elt in data["$tuple"]])
+        return dict([(key, unpackArrays(value, arrays)) for key,value in data.items()])
+    elif isinstance(data, list):
+        return [unpackArrays(elt, arrays) for elt in data]
+    else:
+        return data
+
+# ---------------------------------------------------------------------
+#   Build step
+# ---------------------------------------------------------------------
+
+def buildAssetCache(folder=None):
+    """Convert all .mxa files below folder (default data/hm8) into the cache."""
+    if folder is None:
+        folder = os.path.join(os.path.dirname(__file__), "data", "hm8")
+    nfiles = 0
+    for root,dirs,files in os.walk(folder):
+        for file in sorted(files):
+            if os.path.splitext(file)[1] == ".mxa":
+                loadAsset(os.path.join(root, file))
+                nfiles += 1
+    print("Asset cache built for %d files in %s" % (nfiles, folder))
+    return nfiles
+
+
+class MHX_OT_BuildAssetCache(bpy.types.Operator):
+    bl_idname = "mhx2.build_asset_cache"
+    bl_label = "Build Asset Cache"
+    bl_description = "Convert face shapes, hair and genitalia assets to cached arrays"
+    bl_options = {'UNDO'}
+
+    def execute(self, context):
+        buildAssetCache()
+        return{'FINISHED'}
+
+#----------------------------------------------------------
+#   Initialize
+#----------------------------------------------------------
+
+classes = [
+    MHX_OT_BuildAssetCache,
+]
+
+def initialize():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def uninitialize():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
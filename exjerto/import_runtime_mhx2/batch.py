@@ -0,0 +1,254 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Batch import of mhx2 files with a per-stage timing report.
+#
+#   blender -b --python <addon folder>/batch.py -- [options] files...
+#
+#   files               .mhx2/.mhx2b files, folders or glob patterns
+#   --preset PRESET     import settings: an operator preset name, a preset
+#                       .py file, or a .json file with {setting : value}
+#   --report FILE       write the report as .json or .csv
+#   --allocations       trace Python allocations per stage (slower)
+#   --clear             start from an empty scene before each file
+#   --build-cache       build the asset cache before importing
+#
+#   The add-on is enabled for the session if it is not already, so this
+#   also works with --factory-startup.
+#
+
+import os
+import sys
+import ast
+import csv
+import glob
+import json
+import time
+import argparse
+import importlib
+import tracemalloc
+import bpy
+
+Stages = ["load", "materials", "rig", "geometry", "vertex_groups",
+          "shapekeys", "masks", "merge", "hair"]
+
+OperatorName = "import_scene.makehuman_mhx2"
+
+# ---------------------------------------------------------------------
+#   Settings
+# ---------------------------------------------------------------------
+
+class BatchSettings:
+    """Stand-in for the import operator, holding its property values."""
+
+    def __init__(self):
+        op = bpy.ops.import_scene.makehuman_mhx2
+        if hasattr(op, "get_rna_type"):
+            rna = op.get_rna_type()
+        else:
+            rna = op.get_rna().bl_rna
+        for prop in rna.properties:
+            if prop.identifier != "rna_type" and hasattr(prop, "default"):
+                setattr(self, prop.identifier, prop.default)
+
+
+    def loadPreset(self, preset):
+        filepath = findPreset(preset)
+        if os.path.splitext(filepath)[1].lower() == ".json":
+            with open(filepath, "r", encoding="utf-8") as fp:
+                values = json.load(fp)
+        else:
+            values = readOperatorPreset(filepath)
+        for key,value in values.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+            else:
+                print("Unknown setting %s in preset %s" % (key, filepath))
+        return self
+
+
+def findPreset(preset):
+    if os.path.isfile(preset):
+        return preset
+    for folder in bpy.utils.preset_paths("operator/%s" % OperatorName):
+        filepath = os.path.join(folder, preset + ".py")
+        if os.path.isfile(filepath):
+            return filepath
+    raise RuntimeError("Preset not found: %s" % preset)
+
+
+def readOperatorPreset(filepath):
+    # Operator presets are scripts with lines like "op.useRig = True"
+    values = {}
+    with open(filepath, "r", encoding="utf-8") as fp:
+        for line in fp:
+            words = line.split("=", 1)
+            if len(words) == 2 and words[0].strip().startswith("op."):
+                key = words[0].strip()[3:]
+                try:
+                    values[key] = ast.literal_eval(words[1].strip())
+                except (ValueError, SyntaxError):
+                    print("Cannot read preset line: %s" % line.strip())
+    return values
+
+# ---------------------------------------------------------------------
+#   Import
+# ---------------------------------------------------------------------
+
+def getFilePaths(patterns):
+    filepaths = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if os.path.isdir(pattern):
+            paths = (glob.glob(os.path.join(pattern, "*.mhx2")) +
+                     glob.glob(os.path.join(pattern, "*.mhx2b")))
+        else:
+            paths = glob.glob(pattern)
+        filepaths += sorted(paths)
+    return filepaths
+
+
+def importFiles(filepaths, settings, traceAllocations=False, clearScene=False):
+    from .config import Config
+    from .timing import StageTimer
+    from .importer import importMhx2File
+
+    results = []
+    for filepath in filepaths:
+        if clearScene:
+            bpy.ops.wm.read_homefile(use_empty=True)
+        cfg = Config().fromSettings(settings)
+        cfg.timer = StageTimer(traceAllocations)
+        result = {"file" : filepath, "status" : "ok", "error" : ""}
+        if traceAllocations:
+            tracemalloc.start()
+        time1 = time.perf_counter()
+        try:
+            importMhx2File(filepath, cfg, bpy.context)
+        except Exception as err:
+            result["status"] = "error"
+            result["error"] = str(err)
+            print("Failed to import %s: %s" % (filepath, err))
+        result["total"] = time.perf_counter() - time1
+        if traceAllocations:
+            result["peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result["stages"] = cfg.timer.stages
+        result["other"] = result["total"] - cfg.timer.total()
+        results.append(result)
+    return results
+
+# ---------------------------------------------------------------------
+#   Report
+# ---------------------------------------------------------------------
+
+def writeReport(results, filepath):
+    if os.path.splitext(filepath)[1].lower() == ".csv":
+        writeCsvReport(results, filepath)
+    else:
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+    print("Report written to %s" % filepath)
+
+
+def writeCsvReport(results, filepath):
+    header = ["file", "status", "total", "other", "peak"]
+    for stage in Stages:
+        header += ["%s_time" % stage, "%s_allocated" % stage]
+    with open(filepath, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(header)
+        for result in results:
+            row = [result["file"], result["status"], "%.4f" % result["total"],
+                   "%.4f" % result["other"], result.get("peak", "")]
+            for stage in Stages:
+                if stage in result["stages"].keys():
+                    data = result["stages"][stage]
+                    row += ["%.4f" % data["time"], data["allocated"]]
+                else:
+                    row += ["", ""]
+            writer.writerow(row)
+
+
+def printSummary(results):
+    print("%-12s %10s %10s" % ("Stage", "Total (s)", "Mean (s)"))
+    nfiles = max(1, len(results))
+    for stage in Stages + ["other"]:
+        if stage == "other":
+            total = sum([result["other"] for result in results])
+        else:
+            total = sum([result["stages"][stage]["time"] for result in results
+                         if stage in result["stages"].keys()])
+        print("%-12s %10.3f %10.3f" % (stage, total, total/nfiles))
+    nfailed = len([result for result in results if result["status"] != "ok"])
+    print("%d files imported, %d failed" % (len(results)-nfailed, nfailed))
+
+# ---------------------------------------------------------------------
+#   Command line
+# ---------------------------------------------------------------------
+
+def main(argv):
+    from .assets import buildAssetCache
+
+    parser = argparse.ArgumentParser(prog="batch.py", description="Batch import of mhx2 files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--preset")
+    parser.add_argument("--report")
+    parser.add_argument("--allocations", action="store_true")
+    parser.add_argument("--clear", action="store_true")
+    parser.add_argument("--build-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    settings = BatchSettings()
+    if args.preset:
+        settings.loadPreset(args.preset)
+    if args.build_cache:
+        buildAssetCache()
+    filepaths = getFilePaths(args.files)
+    if not filepaths:
+        print("No mhx2 files found")
+        return 1
+    results = importFiles(filepaths, settings, args.allocations, args.clear)
+    printSummary(results)
+    if args.report:
+        writeReport(results, args.report)
+    return int(any([result["status"] != "ok" for result in results]))
+
+
+def enableAddon(name):
+    # Registers the import operator and the properties that the importer
+    # needs, without saving the add-on in the user preferences
+    import addon_utils
+    loadedDefault,loadedState = addon_utils.check(name)
+    if not loadedState:
+        if addon_utils.enable(name, default_set=False) is None:
+            raise RuntimeError("Could not enable the add-on %s" % name)
+
+
+if __name__ == "__main__":
+    # Run through blender --python: import this module as part of the add-on
+    folder = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(folder))
+    enableAddon(os.path.basename(folder))
+    module = importlib.import_module(os.path.basename(folder) + ".batch")
+    argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else []
+    sys.exit(module.main(argv))
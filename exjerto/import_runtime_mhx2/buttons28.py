@@ -32,7 +32,7 @@ from .import_props import *
 
 class Mhx2Import(ImportHelper):
     filename_ext = ".mhx2"
-    filter_glob : StringProperty(default="*.mhx2", options={'HIDDEN'})
+    filter_glob : StringProperty(default="*.mhx2;*.mhx2b", options={'HIDDEN'})
     filepath : StringProperty(subtype='FILE_PATH')
 
     useHelpers : BoolProperty(name="Helper Geometry", description="Keep helper geometry", default=False)
@@ -52,6 +52,10 @@ class Mhx2Import(ImportHelper):
     useHairOnProxy : BoolProperty(name="Hair On Proxy", description="Add hair to proxy rather than base human", default=False)
     useConservativeMasks : BoolProperty(name="Conservative Masks", description="Only delete faces with two delete-verts", default=True)
 
+    maxInfluences : IntProperty(name="Max Influences", description="Maximum number of vertex groups per vertex (0 = no limit)", default=0, min=0)
+    minWeight : FloatProperty(name="Min Weight", description="Remove vertex weights below this value", default=0.0, min=0.0, max=1.0)
+    normalizeWeights : BoolProperty(name="Normalize Weights", description="Make the vertex weights of each vertex sum to one", default=False)
+
     useSubsurf : BoolProperty(name="Subsurface", description="Add a subsurf modifier to all meshes", default=False)
     subsurfLevels : IntProperty(name="Levels", description="Subsurface levels (viewport)", default=0)
     subsurfRenderLevels : IntProperty(name=" Render Levels", description="Subsurface levels (render)", default=1)
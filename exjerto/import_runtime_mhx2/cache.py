@@ -0,0 +1,102 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   On-disk cache for arrays derived from the data files, e.g. face shapes
+#   transferred to a proxy. Entries are .npz files whose names include a
+#   stamp of the source files, so they become stale when a source changes.
+#   The folder can be set with the MHX2_CACHE environment variable.
+#
+
+import os
+import hashlib
+import zipfile
+import numpy as np
+
+def getCacheFolder():
+    folder = os.environ.get("MHX2_CACHE")
+    if not folder:
+        try:
+            import bpy
+            folder = os.path.join(bpy.utils.user_resource('CONFIG'), "mhx2_cache")
+        except ImportError:
+            folder = os.path.join(os.path.expanduser("~"), ".cache", "mhx2")
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def getSourceStamp(*filepaths):
+    """A short hash of the paths, modification times and sizes of the sources."""
+    md5 = hashlib.md5()
+    for filepath in filepaths:
+        stat = os.stat(filepath)
+        string = "%s:%d:%d;" % (os.path.realpath(filepath), stat.st_mtime_ns, stat.st_size)
+        md5.update(string.encode("utf-8"))
+    return md5.hexdigest()[:16]
+
+
+def getArraysStamp(*arrays):
+    """A short hash of the contents of arrays, for data not read from a file."""
+    md5 = hashlib.md5()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        md5.update(("%s%s;" % (array.dtype.str, array.shape)).encode("utf-8"))
+        md5.update(array.tobytes())
+    return md5.hexdigest()[:16]
+
+
+def getCachePath(name, stamp):
+    return os.path.join(getCacheFolder(), "%s-%s.npz" % (name, stamp))
+
+
+def loadCachedArrays(name, stamp):
+    try:
+        filepath = getCachePath(name, stamp)
+        if not os.path.exists(filepath):
+            return None
+        with np.load(filepath, allow_pickle=False) as data:
+            return dict(data.items())
+    except (IOError, OSError, ValueError, zipfile.BadZipFile) as err:
+        print("Could not read cache %s: %s" % (name, err))
+        return None
+
+
+def saveCachedArrays(name, stamp, arrays):
+    try:
+        filepath = getCachePath(name, stamp)
+        tmppath = "%s.%d.tmp.npz" % (filepath[:-4], os.getpid())
+        np.savez(tmppath, **arrays)
+        os.replace(tmppath, filepath)
+        removeStaleEntries(name, stamp)
+    except (IOError, OSError) as err:
+        print("Could not write cache %s: %s" % (name, err))
+
+
+def removeStaleEntries(name, stamp):
+    folder = getCacheFolder()
+    current = os.path.basename(getCachePath(name, stamp))
+    prefix = name + "-"
+    for file in os.listdir(folder):
+        if (file.startswith(prefix) and
+            file != current and
+            len(file) == len(current)):
+            os.remove(os.path.join(folder, file))
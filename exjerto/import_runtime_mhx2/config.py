@@ -20,6 +20,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import os
+from .timing import StageTimer
 
 Attributes = [
     "useHelpers", "useOffset", "useOverride", "useHumanType",
@@ -28,7 +29,8 @@ Attributes = [
     "hairType", "hairColor", "useHairOnProxy", "useDeflector", "useHairDynamics",
     "mergeBodyParts", "mergeToProxy", "mergeMaxType",
     "useFaceShapes", "useFacePanel", "useFaceShapeDrivers", "useFaceRigDrivers",
-    "useMasks", "useConservativeMasks"
+    "useMasks", "useConservativeMasks",
+    "maxInfluences", "minWeight", "normalizeWeights"
 ]
 
 class Config:
@@ -37,6 +39,7 @@ class Config:
         self.scale = 1.0
         self.deleteHelpers = False
         self.folder = ""
+        self.timer = StageTimer()
         self.setDefaults()
 
     def __repr__(self):
@@ -134,6 +137,10 @@ class Config:
         self.useIkHair = False
         self.useLeftRight = False
 
+        self.maxInfluences = 0
+        self.minWeight = 0.0
+        self.normalizeWeights = False
+
         return self
 
 
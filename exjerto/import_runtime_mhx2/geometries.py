@@ -20,8 +20,11 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from .utils import *
 from .hm8 import *
+from .arrays import flattenFaces, getUvLoops, zupArray
+from .arrays import getWeightArrays, groupByWeight, cleanVertexWeights
 
 # ---------------------------------------------------------------------
 #
@@ -54,21 +57,22 @@ def buildGeometry(mhGeo, mats, rig, parser, context, cfg, meshType):
             ob.MhxLicense = mhLicense["license"]
             ob.MhxHomePage = mhLicense["homepage"]
 
-    vgrps = None
-    if cfg.useOverride:
-        if cfg.useRig:
-            if meshType == "proxy_seed_mesh":
-                vgrps = proxifyVertexGroups(mhGeo["proxy"], getMhHuman(), parser)
-            elif mhGeo["human"]:
-                vgrps = meshVertexGroups(mhMesh, parser, cfg)
-            else:
-                vgrps = proxifyVertexGroups(mhGeo["proxy"], getMhHuman())
+    with cfg.timer.stage("vertex_groups"):
+        vgrps = None
+        if cfg.useOverride:
+            if cfg.useRig:
+                if meshType == "proxy_seed_mesh":
+                    vgrps = proxifyVertexGroups(mhGeo["proxy"], getMhHuman(), parser)
+                elif mhGeo["human"]:
+                    vgrps = meshVertexGroups(mhMesh, parser, cfg)
+                else:
+                    vgrps = proxifyVertexGroups(mhGeo["proxy"], getMhHuman())
 
-    elif "weights" in mhMesh.keys():
-        vgrps = mhMesh["weights"]
+        elif "weights" in mhMesh.keys():
+            vgrps = mhMesh["weights"]
 
-    if vgrps:
-        buildVertexGroups(vgrps, ob, rig)
+        if vgrps:
+            buildVertexGroups(vgrps, ob, rig, cfg)
 
     if rig:
         ob.parent = rig
@@ -103,7 +107,7 @@ def meshVertexGroups(mhMesh, parser, cfg):
 def buildMesh(mhGeo, mhMesh, gname, context, cfg, useSeedMesh):
     scale,offset = getScaleOffset(mhGeo, cfg, useSeedMesh)
     print("BUILD", mhGeo["name"], mhGeo["scale"], scale, offset)
-    verts = [scale*zup(co)+offset for co in mhMesh["vertices"]]
+    verts = zupArray(mhMesh["vertices"], scale, offset)
     ob = addMeshToScene(verts, gname, mhMesh, context)
     ob.MhxScale = mhGeo["scale"]
     ob.MhxOffset = str(list(zup(mhGeo["offset"])))
@@ -112,24 +116,33 @@ def buildMesh(mhGeo, mhMesh, gname, context, cfg, useSeedMesh):
 
 def addMeshToScene(verts, gname, mhMesh, context):
     me = bpy.data.meshes.new(gname)
-    try:
-        faces = mhMesh["faces"]
-        edges = []
-    except KeyError:
-        edges = mhMesh["edges"]
-        faces = []
-    me.from_pydata(verts, edges, faces)
-
-    for f in me.polygons:
-        f.use_smooth = True
+    verts = np.asarray(verts, dtype=np.float32).reshape(-1,3)
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set("co", verts.ravel())
+
+    if "faces" in mhMesh.keys():
+        loops,starts,totals = flattenFaces(mhMesh["faces"])
+        me.loops.add(len(loops))
+        me.loops.foreach_set("vertex_index", loops)
+        me.polygons.add(len(starts))
+        me.polygons.foreach_set("loop_start", starts)
+        if bpy.app.version < (4,0,0):
+            me.polygons.foreach_set("loop_total", totals)
+        me.update(calc_edges=True)
+        me.polygons.foreach_set("use_smooth", np.ones(len(starts), dtype=bool))
+    else:
+        edges = np.asarray(mhMesh["edges"], dtype=np.int32).reshape(-1,2)
+        me.edges.add(len(edges))
+        me.edges.foreach_set("vertices", edges.ravel())
+        if bpy.app.version < (2,81,0):
+            me.update()
+        else:
+            me.update(calc_edges_loose=True)
 
     uvlayer = makeNewUvloop(me)
-    uvcoords = mhMesh["uv_coordinates"]
-    n = 0
-    for f in mhMesh["uv_faces"]:
-        for vn in f:
-            uvlayer.data[n].uv = uvcoords[vn]
-            n += 1
+    uvloops = getUvLoops(mhMesh["uv_faces"], mhMesh["uv_coordinates"])
+    if len(uvloops) > 0:
+        uvlayer.data.foreach_set("uv", uvloops.ravel())
 
     ob = bpy.data.objects.new(gname, me)
     coll = getCollection(context)
@@ -146,16 +159,20 @@ def makeNewUvloop(me):
         return me.uv_layers[0]
 
 
-def buildVertexGroups(vweights, ob, rig):
+def buildVertexGroups(vweights, ob, rig, cfg=None):
     mod = ob.modifiers.new('ARMATURE', 'ARMATURE')
     mod.use_vertex_groups = True
     mod.use_bone_envelopes = False
     mod.object = rig
 
-    for vgname,data in vweights.items():
+    vweights = dict([(vgname, getWeightArrays(data)) for vgname,data in vweights.items()])
+    if cfg and (cfg.maxInfluences > 0 or cfg.minWeight > 0 or cfg.normalizeWeights):
+        vweights = cleanVertexWeights(vweights, cfg.maxInfluences, cfg.minWeight, cfg.normalizeWeights)
+
+    for vgname,(vnums,weights) in vweights.items():
         vgrp = ob.vertex_groups.new(name=vgname)
-        for vn,w in data:
-            vgrp.add([vn], w, 'REPLACE')
+        for w,vnlist in groupByWeight(vnums, weights):
+            vgrp.add(vnlist, w, 'REPLACE')
 
 
 def getVertexGroupsFromObject(ob):
@@ -67,6 +67,12 @@ class MHX_OT_Import(bpy.types.Operator, Mhx2Import):
 
     def draw(self, context):
         layout = self.layout
+        box = layout.box()
+        box.label(text="Vertex weights")
+        box.prop(self, "maxInfluences")
+        box.prop(self, "minWeight")
+        box.prop(self, "normalizeWeights")
+
         layout.prop(self, "useOverride")
         if not self.useOverride:
             return
@@ -140,22 +146,28 @@ class MHX_OT_Import(bpy.types.Operator, Mhx2Import):
 def importMhx2File(filepath, cfg, context):
     filepath = os.path.expanduser(filepath)
     cfg.folder = os.path.dirname(filepath)
-    struct, time1 = importMhx2Json(filepath)
+    with cfg.timer.stage("load"):
+        struct, time1 = importMhx2Json(filepath)
     build(struct, cfg, context)
-    time2 = time.clock()
+    time2 = time.perf_counter()
     print("File %s loaded in %g s" % (filepath, time2-time1))
 
 
 def importMhx2Json(filepath):
     from .load_json import loadJson
+    from .load_binary import loadBinary
 
-    if os.path.splitext(filepath)[1].lower() != ".mhx2":
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in [".mhx2", ".mhx2b"]:
         print("Error: Not a mhx2 file: %s" % filepath.encode('utf-8', 'strict'))
         return
     print( "Opening MHX2 file %s " % filepath.encode('utf-8', 'strict') )
 
-    time1 = time.clock()
-    struct = loadJson(filepath)
+    time1 = time.perf_counter()
+    if ext == ".mhx2b":
+        struct = loadBinary(filepath)
+    else:
+        struct = loadJson(filepath)
 
     try:
         vstring = struct["mhx2_version"]
@@ -188,6 +200,7 @@ def build(struct, cfg, context):
     from .proxy import setMhHuman
 
     scn = context.scene
+    timer = cfg.timer
 
     if (cfg.useOverride and
         cfg.rigType == 'RIGIFY' and
@@ -197,9 +210,10 @@ def build(struct, cfg, context):
         #raise MhxError("The Rigify add-on is not enabled. It is found under rigging.")
 
     mats = {}
-    for mhMaterial in struct["materials"]:
-        mname,mat = buildMaterial(mhMaterial, scn, cfg)
-        mats[mname] = mat
+    with timer.stage("materials"):
+        for mhMaterial in struct["materials"]:
+            mname,mat = buildMaterial(mhMaterial, scn, cfg)
+            mats[mname] = mat
 
     for mhGeo in struct["geometries"]:
         if mhGeo["human"]:
@@ -209,26 +223,27 @@ def build(struct, cfg, context):
 
     parser = None
     rig = None
-    if cfg.useOverride:
-        if cfg.useRig:
-            if cfg.rigType == 'EXPORTED':
-                if "skeleton" in struct.keys():
-                    mhSkel = struct["skeleton"]
-                    rig = buildSkeleton(mhSkel, context, cfg)
-            elif cfg.rigType in ['EXPORTED_MHX', 'EXPORTED_RIGIFY']:
-                from .armature.rerig import isDefaultRig
-                if "skeleton" in struct.keys():
-                    mhSkel = struct["skeleton"]
-                    if isDefaultRig(mhSkel):
-                        rig,parser = buildRig(mhHuman, mhSkel, cfg, context)
-                    else:
-                        print("Can only build %s rig if the Default rig (with or without toes) was exported from MakeHuman." % cfg.rigType)
+    with timer.stage("rig"):
+        if cfg.useOverride:
+            if cfg.useRig:
+                if cfg.rigType == 'EXPORTED':
+                    if "skeleton" in struct.keys():
+                        mhSkel = struct["skeleton"]
                         rig = buildSkeleton(mhSkel, context, cfg)
-            else:
-                rig,parser = buildRig(mhHuman, None, cfg, context)
-    elif "skeleton" in struct.keys():
-        mhSkel = struct["skeleton"]
-        rig = buildSkeleton(mhSkel, context, cfg)
+                elif cfg.rigType in ['EXPORTED_MHX', 'EXPORTED_RIGIFY']:
+                    from .armature.rerig import isDefaultRig
+                    if "skeleton" in struct.keys():
+                        mhSkel = struct["skeleton"]
+                        if isDefaultRig(mhSkel):
+                            rig,parser = buildRig(mhHuman, mhSkel, cfg, context)
+                        else:
+                            print("Can only build %s rig if the Default rig (with or without toes) was exported from MakeHuman." % cfg.rigType)
+                            rig = buildSkeleton(mhSkel, context, cfg)
+                else:
+                    rig,parser = buildRig(mhHuman, None, cfg, context)
+        elif "skeleton" in struct.keys():
+            mhSkel = struct["skeleton"]
+            rig = buildSkeleton(mhSkel, context, cfg)
 
     if rig:
         rig.MhxScale = mhHuman["scale"]
@@ -240,87 +255,92 @@ def build(struct, cfg, context):
     human = None
     proxies = []
     proxy = None
-    for mhGeo in struct["geometries"]:
-        if "proxy" in mhGeo.keys():
-            mhProxy = mhGeo["proxy"]
-            if mhGeo["human"]:
-                if cfg.useHelpers:
-                    if cfg.useHumanType != 'BASE':
-                        proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "proxy_seed_mesh")
+    with timer.stage("geometry"):
+        for mhGeo in struct["geometries"]:
+            if "proxy" in mhGeo.keys():
+                mhProxy = mhGeo["proxy"]
+                if mhGeo["human"]:
+                    if cfg.useHelpers:
+                        if cfg.useHumanType != 'BASE':
+                            proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "proxy_seed_mesh")
+                            proxy.MhxHuman = True
+                        if cfg.useHumanType != 'PROXY':
+                            human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "seed_mesh")
+                            human.MhxHuman = True
+                    else:
+                        proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "mesh")
                         proxy.MhxHuman = True
-                    if cfg.useHumanType != 'PROXY':
-                        human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "seed_mesh")
-                        human.MhxHuman = True
+                    if proxy:
+                        proxies.append((mhGeo, proxy))
+                elif mhProxy["type"] == "Hair" and cfg.hairType != 'NONE':
+                    pass
+                elif mhProxy["type"] == "Genitals" and cfg.genitalia != 'NONE':
+                    pass
                 else:
-                    proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "mesh")
-                    proxy.MhxHuman = True
-                if proxy:
-                    proxies.append((mhGeo, proxy))
-            elif mhProxy["type"] == "Hair" and cfg.hairType != 'NONE':
-                pass
-            elif mhProxy["type"] == "Genitals" and cfg.genitalia != 'NONE':
-                pass
-            else:
-                ob = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
-                proxies.append((mhGeo, ob))
-        elif mhGeo["human"]:
-            human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
-            human.MhxHuman = True
+                    ob = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
+                    proxies.append((mhGeo, ob))
+            elif mhGeo["human"]:
+                human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
+                human.MhxHuman = True
 
     if proxy:
         proxy.MhxUuid = mhHuman["uuid"]
 
     groupName = mhHuman["name"].split(":",1)[0]
 
-    if cfg.useOverride and cfg.genitalia != "NONE":
-        genitalia = addMeshProxy("genitalia", cfg.genitalia, mhHuman, mats, rig, parser, context, cfg)
-        proxies.append(genitalia)
+    with timer.stage("geometry"):
+        if cfg.useOverride and cfg.genitalia != "NONE":
+            genitalia = addMeshProxy("genitalia", cfg.genitalia, mhHuman, mats, rig, parser, context, cfg)
+            proxies.append(genitalia)
 
-    if cfg.useOverride and cfg.useDeflector:
-        from .hair import makeDeflector
-        deflHead = addMeshProxy("deflector", "deflector_head", mhHuman, mats, None, None, context, cfg)
-        makeDeflector(deflHead, rig, ["head"], cfg)
-        proxies.append(deflHead)
-        deflTorso = addMeshProxy("deflector", "deflector_torso", mhHuman, mats, None, None, context, cfg)
-        makeDeflector(deflTorso, rig, ["chest-1","chest"], cfg)
-        proxies.append(deflTorso)
+        if cfg.useOverride and cfg.useDeflector:
+            from .hair import makeDeflector
+            deflHead = addMeshProxy("deflector", "deflector_head", mhHuman, mats, None, None, context, cfg)
+            makeDeflector(deflHead, rig, ["head"], cfg)
+            proxies.append(deflHead)
+            deflTorso = addMeshProxy("deflector", "deflector_torso", mhHuman, mats, None, None, context, cfg)
+            makeDeflector(deflTorso, rig, ["chest-1","chest"], cfg)
+            proxies.append(deflTorso)
 
     if cfg.useOverride and cfg.useRigify and cfg.finalizeRigify and rig:
         from .armature.rigify import fixRigifyMeshes
         fixRigifyMeshes(rig.children)
 
-    if cfg.useOverride and cfg.hairType != "NONE":
-        from .proxy import getProxyCoordinates
-        folder = os.path.dirname(__file__)
-        filepath = os.path.join(folder, "data/hm8/hair", cfg.hairType)
-        hair,hcoords,_scales = getProxyCoordinates(mhHuman, filepath)
-
-    if cfg.useOverride and cfg.useFaceShapes:
-        from .shapekeys import addShapeKeys
-        path = "data/hm8/faceshapes/faceshapes.mxa"
-        proxyTypes = ["Proxymeshes", "Eyebrows", "Eyelashes", "Teeth", "Tongue"]
-        addShapeKeys(human, path, mhHuman=mhHuman, proxies=proxies, proxyTypes=proxyTypes)
-
-        if cfg.useFaceShapeDrivers:
-            from .shapekeys import addShapeKeyDriversToAll
-            meshes = [human] + [ob for (_,ob) in proxies]
-            addShapeKeyDriversToAll(rig, meshes, "Mhf")
-        elif parser and parser.boneDrivers:
-            from .drivers import addBoneShapeDrivers
-            addBoneShapeDrivers(rig, human, parser.boneDrivers, proxies=proxies, proxyTypes=proxyTypes)
+    with timer.stage("hair"):
+        if cfg.useOverride and cfg.hairType != "NONE":
+            from .proxy import getProxyCoordinates
+            folder = os.path.dirname(__file__)
+            filepath = os.path.join(folder, "data/hm8/hair", cfg.hairType)
+            hair,hcoords,_scales = getProxyCoordinates(mhHuman, filepath)
+
+    with timer.stage("shapekeys"):
+        if cfg.useOverride and cfg.useFaceShapes:
+            from .shapekeys import addShapeKeys
+            path = "data/hm8/faceshapes/faceshapes.mxa"
+            proxyTypes = ["Proxymeshes", "Eyebrows", "Eyelashes", "Teeth", "Tongue"]
+            addShapeKeys(human, path, mhHuman=mhHuman, proxies=proxies, proxyTypes=proxyTypes)
+
+            if cfg.useFaceShapeDrivers:
+                from .shapekeys import addShapeKeyDriversToAll
+                meshes = [human] + [ob for (_,ob) in proxies]
+                addShapeKeyDriversToAll(rig, meshes, "Mhf")
+            elif parser and parser.boneDrivers:
+                from .drivers import addBoneShapeDrivers
+                addBoneShapeDrivers(rig, human, parser.boneDrivers, proxies=proxies, proxyTypes=proxyTypes)
 
     deselectAll(human, proxies, context)
 
-    if cfg.useOverride and cfg.useHelpers:
-        from .masks import addMasks, selectAllMaskVGroups
-        proxyTypes = ["Proxymeshes", "Genitals"]
-        if cfg.useMasks == 'MODIFIER':
-            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
-        elif cfg.useMasks == 'APPLY':
-            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
-            selectAllMaskVGroups(human, proxies)
-        elif cfg.useMasks == 'IGNORE':
-            pass
+    with timer.stage("masks"):
+        if cfg.useOverride and cfg.useHelpers:
+            from .masks import addMasks, selectAllMaskVGroups
+            proxyTypes = ["Proxymeshes", "Genitals"]
+            if cfg.useMasks == 'MODIFIER':
+                addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
+            elif cfg.useMasks == 'APPLY':
+                addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
+                selectAllMaskVGroups(human, proxies)
+            elif cfg.useMasks == 'IGNORE':
+                pass
 
     if (cfg.useOverride and cfg.useRig and cfg.useFaceRigDrivers and
         cfg.rigType in ['EXPORTED_MHX', 'EXPORTED_RIGIFY']):
@@ -337,23 +357,25 @@ def build(struct, cfg, context):
     if bpy.app.version < (2,80,0):
         addToGroup(groupName, rig, human, proxies)
 
-    if cfg.useOverride and cfg.mergeBodyParts:
-        from .merge import mergeBodyParts
-        proxyTypes = ["Eyes", "Eyebrows", "Eyelashes", "Teeth", "Tongue", "Genitals"]
-        if cfg.mergeMaxType == 'HAIR':
-            proxyTypes += ['Hair']
-        if cfg.mergeMaxType == 'CLOTHES':
-            proxyTypes += ['Hair', 'Clothes']
-        ob = getEffectiveHuman(human, proxy, cfg.mergeToProxy)
-        if ob:
-            mergeBodyParts(ob, proxies, context, proxyTypes=proxyTypes)
-
-    if cfg.useOverride and cfg.hairType != "NONE":
-        from .hair import addHair
-        ob = getEffectiveHuman(human, proxy, cfg.useHairOnProxy)
-        if ob:
-            activateObject(context, ob)
-            addHair(ob, hair, hcoords, scn, cfg)
+    with timer.stage("merge"):
+        if cfg.useOverride and cfg.mergeBodyParts:
+            from .merge import mergeBodyParts
+            proxyTypes = ["Eyes", "Eyebrows", "Eyelashes", "Teeth", "Tongue", "Genitals"]
+            if cfg.mergeMaxType == 'HAIR':
+                proxyTypes += ['Hair']
+            if cfg.mergeMaxType == 'CLOTHES':
+                proxyTypes += ['Hair', 'Clothes']
+            ob = getEffectiveHuman(human, proxy, cfg.mergeToProxy)
+            if ob:
+                mergeBodyParts(ob, proxies, context, proxyTypes=proxyTypes)
+
+    with timer.stage("hair"):
+        if cfg.useOverride and cfg.hairType != "NONE":
+            from .hair import addHair
+            ob = getEffectiveHuman(human, proxy, cfg.useHairOnProxy)
+            if ob:
+                activateObject(context, ob)
+                addHair(ob, hair, hcoords, scn, cfg)
 
     if rig:
         activateObject(context, rig)
@@ -0,0 +1,102 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+#
+#   Reader for the binary MHX2 container (.mhx2b) written by the
+#   MakeHuman exporter. The layout is described in save_binary.py
+#   of the exporter plugin:
+#
+#   magic    8 bytes     b"MHX2BIN\0"
+#   hlen     uint32 LE   size of the header in bytes
+#   header   utf-8 json  {"struct" : <mhx2 struct>, "blocks" : [...]}
+#   blocks   raw little-endian arrays, 16-byte aligned
+#
+#   The blocks are memory-mapped, so vertices, faces, uv data, fitting
+#   and mask arrays are only paged in when they are actually used.
+#
+
+import json
+import struct
+import numpy as np
+from .error import MhxError
+
+Magic = b"MHX2BIN\0"
+BlockAlign = 16
+
+BlockTypes = {
+    "float32" : np.dtype("<f4"),
+    "int32" : np.dtype("<i4"),
+    "bool" : np.dtype("|b1"),
+    "weights" : np.dtype([("vn", "<i4"), ("w", "<f4")]),
+    "fitting" : np.dtype([("vnums", "<i4", 3), ("weights", "<f4", 3), ("offsets", "<f4", 3)]),
+}
+
+
+def isBinaryMhx2(filepath):
+    with open(filepath, "rb") as fp:
+        return (fp.read(len(Magic)) == Magic)
+
+
+def loadBinary(filepath):
+    with open(filepath, "rb") as fp:
+        if fp.read(len(Magic)) != Magic:
+            raise MhxError("Not a binary mhx2 file:\n%s" % filepath)
+        hlen, = struct.unpack("<I", fp.read(4))
+        header = json.loads(fp.read(hlen).decode("utf-8"))
+
+    start = len(Magic) + 4 + hlen
+    start = BlockAlign * ((start + BlockAlign - 1) // BlockAlign)
+    raw = np.memmap(filepath, dtype=np.uint8, mode='c')
+    blocks = [getBlock(raw, start, binfo) for binfo in header["blocks"]]
+    return unpackBlocks(header["struct"], blocks)
+
+
+def getBlock(raw, start, binfo):
+    dtype = BlockTypes[binfo["type"]]
+    shape = tuple(binfo["shape"])
+    first = start + binfo["offset"]
+    nbytes = dtype.itemsize * int(np.prod(shape))
+    return raw[first:first+nbytes].view(dtype).reshape(shape)
+
+
+def unpackBlocks(data, blocks):
+    if isinstance(data, dict):
+        if "$block" in data.keys():
+            block = blocks[data["$block"]]
+            if "groups" in data.keys():
+                return unpackWeights(block, data["groups"])
+            return block
+        return dict([(key, unpackBlocks(value, blocks)) for key,value in data.items()])
+    elif isinstance(data, list):
+        return [unpackBlocks(elt, blocks) for elt in data]
+    else:
+        return data
+
+
+def unpackWeights(block, groups):
+    # Vertex groups are consumed as lists of (vn, w) pairs
+    weights = {}
+    first = 0
+    for gname,count in groups:
+        weights[gname] = block[first:first+count].tolist()
+        first += count
+    return weights
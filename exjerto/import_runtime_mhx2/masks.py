@@ -19,6 +19,7 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
+import numpy as np
 from .utils import *
 from .hm8 import *
 
@@ -55,8 +56,7 @@ def addMask(ob, vnums, pname):
         vgrp = ob.vertex_groups.new(name=("Delete:%s" % pname))
         mod.vertex_group = vgrp.name
         mod.invert_vertex_group = True
-        for vn in vnums:
-            vgrp.add([vn], 1, 'REPLACE')
+        vgrp.add(list(vnums), 1, 'REPLACE')
 
 
 def selectAllMaskVGroups(human, proxies):
@@ -141,15 +141,13 @@ def proxifyMask(mhProxy, mhMesh, vnums):
 
     if "Mask" in ngrps.keys():
         nverts = len(mhMesh["vertices"])
-        vmask = dict([(vn,0) for vn in range(nverts)])
-        for vn,w in ngrps["Mask"]:
-            vmask[vn] = w
-        vclear = dict([(vn,False) for vn in range(nverts)])
-        for f in mhMesh["faces"]:
-            if vmask[f[0]]*vmask[f[1]]*vmask[f[2]]*vmask[f[3]] < 0.5:
-                vclear[f[0]] = vclear[f[1]] = vclear[f[2]] = vclear[f[3]] = True
-        pvnums = [vn for vn,test in vclear.items() if not test]
-        pvnums.sort()
+        vmask = np.zeros(nverts)
+        vn,w = np.array(ngrps["Mask"]).T
+        vmask[vn.astype(np.int32)] = w
+        faces = np.asarray(mhMesh["faces"], dtype=np.int32)[:,:4]
+        vclear = np.zeros(nverts, dtype=bool)
+        vclear[faces[vmask[faces].prod(axis=1) < 0.5].ravel()] = True
+        pvnums = np.flatnonzero(~vclear).tolist()
     else:
         pvnums = []
     return pvnums
@@ -20,11 +20,13 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import numpy as np
 from mathutils import Vector
 from .error import *
 from .utils import *
 from .hm8 import *
 from .hair import isHairStruct
+from .arrays import getFittingArrays, getWeightArrays, getTargetArrays, proxyTransfer
 if bpy.app.version < (2,80,0):
     from .buttons27 import MxaImport
 else:
@@ -35,10 +37,10 @@ else:
 # ---------------------------------------------------------------------
 
 def addProxy(filepath, mhHuman, mats, context, cfg):
-    from .load_json import loadJsonRelative
+    from .assets import loadAsset
     from .materials import getMaterial, buildMaterial
 
-    mhGeo = loadJsonRelative(filepath)
+    mhGeo = loadAsset(filepath)
     mhProxy = mhGeo["proxy"]
     pxyGeo = mhGeo
     pxyGeo["human"] = False
@@ -63,13 +65,9 @@ def fitProxy(mhHuman, mhFitting, mhScale):
     from .shapekeys import getScales
     scales = getScales(None, mhScale, mhHuman)
     scale = mhHuman["scale"]
-    hverts = [scale*Vector(co) for co in mhHuman["seed_mesh"]["vertices"]]
-    pverts = []
-    for vnums,weights,offset in mhFitting:
-        pco = (weights[0]*hverts[vnums[0]] +
-               weights[1]*hverts[vnums[1]] +
-               weights[2]*hverts[vnums[2]])
-        pverts.append(Vector([pco[n]+scales[n]*offset[n] for n in range(3)]))
+    hverts = scale*np.asarray(mhHuman["seed_mesh"]["vertices"], dtype=np.float64)
+    vnums,weights,offsets = getFittingArrays(mhFitting)
+    pverts = proxyTransfer(vnums, weights, hverts) + np.array(scales)*offsets
     return pverts,scales
 
 # ---------------------------------------------------------------------
@@ -96,37 +94,51 @@ def proxifyVertexGroups(mhProxy, mhHuman, parser=None):
         else:
             return {}
 
-    mhFitting = mhProxy["fitting"]
+    vnums,weights = getProxyMatrix(mhProxy)
+    gnames = list(vgrps.keys())
+    groups = [getWeightArrays(vgrps[gname]) for gname in gnames]
+    nverts = getNumBaseVerts(vnums, [idxs for idxs,_ in groups])
+
     ngrps = {}
-    for gname,ogrp in vgrps.items():
-        grp0 = dict([(vn,0.0) for vn in range(NTotalVerts)])
-        for vn,w in ogrp:
-            grp0[vn] = w
-
-        grp1 = []
-        for pvn,pdata in enumerate(mhFitting):
-            vnums,weights,_offsets = pdata
-            grp1 += [(pvn, weights[n]*grp0[vn]) for n,vn in enumerate(vnums)]
-        grp1.sort()
-
-        ngrp = []
-        if len(grp1) > 0:
-            vn0 = grp1[0][0]
-            wsum = 0.0
-            for vn,w in grp1:
-                if vn == vn0:
-                    wsum += w
-                else:
-                    if wsum > 1e-4:
-                        ngrp.append((vn0,wsum))
-                    vn0 = vn
-                    wsum = w
-            if wsum > 1e-4:
-                ngrp.append((vn0,wsum))
-            if len(ngrp) > 0:
-                ngrps[gname] = ngrp
+    for first in range(0, len(gnames), GroupBatch):
+        batch = groups[first:first+GroupBatch]
+        table = np.zeros((nverts, len(batch)))
+        for col,(idxs,ws) in enumerate(batch):
+            table[idxs,col] = ws
+        pweights = proxyTransfer(vnums, weights, table)
+        for col,gname in enumerate(gnames[first:first+GroupBatch]):
+            pvnums = np.flatnonzero(pweights[:,col] > 1e-4)
+            if len(pvnums) > 0:
+                ngrps[gname] = list(zip(pvnums.tolist(), pweights[pvnums,col].tolist()))
     return ngrps
 
+# Number of vertex groups transferred by a single matrix product
+GroupBatch = 64
+
+
+def getProxyMatrix(mhProxy):
+    """
+    Return the proxy fitting as a sparse (proxy verts x base verts)
+    matrix, i.e. the base vertex numbers and barycentric weights of
+    each proxy vertex. It is computed once and cached in the proxy struct.
+    """
+    try:
+        return mhProxy["fitting_matrix"]
+    except KeyError:
+        vnums,weights,_offsets = getFittingArrays(mhProxy["fitting"])
+        mhProxy["fitting_matrix"] = (vnums, weights)
+        return vnums, weights
+
+
+def getNumBaseVerts(vnums, idxlist):
+    nverts = NTotalVerts
+    if vnums.size > 0:
+        nverts = max(nverts, int(vnums.max())+1)
+    for idxs in idxlist:
+        if len(idxs) > 0:
+            nverts = max(nverts, int(idxs.max())+1)
+    return nverts
+
 # ---------------------------------------------------------------------
 #   For proxies with own bone weights
 # ---------------------------------------------------------------------
@@ -246,35 +258,17 @@ MHBones = {
 # ---------------------------------------------------------------------
 
 def proxifyTargets(mhProxy, targets):
-    mhFitting = mhProxy["fitting"]
+    vnums,weights = getProxyMatrix(mhProxy)
     ntrgs = {}
     for tname,otrg in targets.items():
-        trg0 = dict([(vn,Vector()) for vn in range(NTotalVerts)])
-        for vn,delta in otrg:
-            trg0[vn] = Vector(delta)
-
-        trg1 = []
-        for pvn,pdata in enumerate(mhFitting):
-            vnums,weights,_offsets = pdata
-            trg1 += [(pvn, weights[n]*trg0[vn]) for n,vn in enumerate(vnums)]
-        trg1.sort()
-
-        ntrg = []
-        if len(trg1) > 0:
-            vn0 = trg1[0][0]
-            dsum = Vector()
-            for vn,delta in trg1:
-                if vn == vn0:
-                    dsum += delta
-                else:
-                    if dsum.length > 1e-3:
-                        ntrg.append((vn0,dsum))
-                    vn0 = vn
-                    dsum = delta
-            if dsum > 1e-4:
-                ntrg.append((vn0,dsum))
-            if len(ntrg) > 0:
-                ntrgs[tname] = ntrg
+        idxs,deltas = getTargetArrays(otrg)
+        trg0 = np.zeros((getNumBaseVerts(vnums, [idxs]), 3))
+        trg0[idxs] = deltas
+
+        trg1 = proxyTransfer(vnums, weights, trg0)
+        pvnums = np.flatnonzero(np.sqrt((trg1*trg1).sum(axis=1)) > 1e-3)
+        if len(pvnums) > 0:
+            ntrgs[tname] = (pvnums.astype(np.int32), trg1[pvnums])
     return ntrgs
 
 # ---------------------------------------------------------------------
@@ -282,9 +276,9 @@ def proxifyTargets(mhProxy, targets):
 # ---------------------------------------------------------------------
 
 def getProxyCoordinates(mhHuman, filepath):
-    from .load_json import loadJson
+    from .assets import loadAsset
 
-    mhGeo = loadJson(filepath)
+    mhGeo = loadAsset(filepath)
 
     if isHairStruct(mhGeo):
         from .hair import getHairCoords
@@ -21,10 +21,11 @@
 
 import os
 import bpy
+import numpy as np
 from mathutils import Vector
 
 from .drivers import *
-from .utils import zup2
+from .arrays import getTargetArrays
 if bpy.app.version < (2,80,0):
     from .buttons27 import FilenameString
 else:
@@ -35,11 +36,10 @@ else:
 #------------------------------------------------------------------------
 
 def addShapeKeys(human, filename, mhHuman, proxies=[], proxyTypes=[]):
-    from .load_json import loadJsonRelative
-    from .proxy import proxifyTargets
+    from .assets import loadAsset
 
     print("Setting up shapekeys")
-    struct = loadJsonRelative(filename)
+    struct = loadAsset(filename)
     scales = getScales(human, struct["bounding_box"], mhHuman)
     if human:
         addTargets(human, struct["targets"], scales)
@@ -50,7 +50,7 @@ def addShapeKeys(human, filename, mhHuman, proxies=[], proxyTypes=[]):
     for mhGeo,ob in proxies:
         mhProxy = mhGeo["proxy"]
         if mhProxy["type"] in proxyTypes:
-            ptargets = proxifyTargets(mhProxy, struct["targets"])
+            ptargets = getProxyTargets(mhProxy, struct["targets"], filename)
             addTargets(ob, ptargets, scales)
             ob.MhxHasFaceShapes = True
 
@@ -63,18 +63,46 @@ def addTargets(ob, targets, scales):
     else:
         basic = ob.data.shape_keys.key_blocks[0]
 
+    nVerts = len(ob.data.vertices)
+    base = np.empty(3*nVerts, dtype=np.float32)
+    ob.data.vertices.foreach_get("co", base)
+    base = base.reshape(-1,3)
+    # zup2 as a permutation of the delta components and a signed scale
+    zscales = np.array((scales[0], -scales[2], scales[1]))
+
     for tname,data in targets:
         skey = ob.shape_key_add(name=tname)
         skey.value = 0
         skey.slider_min = -0.5
         skey.slider_max = 1.5
-        for v in ob.data.vertices:
-            skey.data[v.index].co = v.co
-        nVerts = len(ob.data.vertices)
-        for vn,delta in data[:nVerts]:
-            if vn >= nVerts:
-                break
-            skey.data[vn].co += zup2(delta, scales)
+        vnums,deltas = getTargetArrays(data, nVerts)
+        coords = base.copy()
+        np.add.at(coords, vnums, (deltas[:,(0,2,1)]*zscales).astype(np.float32))
+        skey.data.foreach_set("co", coords.ravel())
+
+
+def getProxyTargets(mhProxy, targets, filename):
+    """
+    Transfer targets to a proxy. The result is cached on disk, keyed by
+    the proxy uuid, a stamp of the target file and a hash of the proxy
+    fitting, so a refitted proxy with the same uuid is not served stale.
+    """
+    from .proxy import proxifyTargets, getProxyMatrix
+    from .cache import getSourceStamp, getArraysStamp, loadCachedArrays, saveCachedArrays
+    from .arrays import packTargets, unpackTargets
+
+    if not mhProxy.get("uuid"):
+        return proxifyTargets(mhProxy, targets)
+    folder = os.path.dirname(__file__)
+    name = "targets-%s" % mhProxy["uuid"]
+    vnums,weights = getProxyMatrix(mhProxy)
+    stamp = getSourceStamp(os.path.join(folder, filename)) + getArraysStamp(vnums, weights)
+    arrays = loadCachedArrays(name, stamp)
+    if arrays is not None:
+        return unpackTargets(arrays)
+    ptargets = proxifyTargets(mhProxy, targets)
+    saveCachedArrays(name, stamp, packTargets(ptargets))
+    return ptargets
 
 
 def getScales(human, struct, mhHuman):
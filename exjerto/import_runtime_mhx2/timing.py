@@ -0,0 +1,77 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script copyright (C) Thomas Larsson 2014-2018
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+#
+#   Per-stage timing of the importer. Each stage records its own wall time,
+#   with the time of nested stages subtracted, and optionally the net
+#   Python allocations reported by tracemalloc. Memory allocated by
+#   Blender itself (mesh data etc.) is not seen by tracemalloc.
+#
+
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+class StageTimer:
+
+    def __init__(self, traceAllocations=False):
+        self.traceAllocations = traceAllocations
+        self.stages = OrderedDict()
+        self._children = []
+
+
+    def __repr__(self):
+        string = "<StageTimer\n"
+        for name,stage in self.stages.items():
+            string += "  %s: %.3f s\n" % (name, stage["time"])
+        return string + ">"
+
+
+    @contextmanager
+    def stage(self, name):
+        tracing = (self.traceAllocations and tracemalloc.is_tracing())
+        if tracing:
+            mem0 = tracemalloc.get_traced_memory()[0]
+        self._children.append((0.0, 0))
+        time0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - time0
+            allocated = 0
+            if tracing:
+                allocated = tracemalloc.get_traced_memory()[0] - mem0
+            childTime,childAlloc = self._children.pop()
+            if self._children:
+                parentTime,parentAlloc = self._children[-1]
+                self._children[-1] = (parentTime + elapsed, parentAlloc + allocated)
+
+            if name not in self.stages.keys():
+                self.stages[name] = {"time" : 0.0, "allocated" : 0, "calls" : 0}
+            stage = self.stages[name]
+            stage["time"] += elapsed - childTime
+            stage["allocated"] += allocated - childAlloc
+            stage["calls"] += 1
+
+
+    def total(self):
+        return sum([stage["time"] for stage in self.stages.values()])
@@ -39,11 +39,11 @@ class VisemeData:
         self._mouthShapes = None
 
     def load(self):
-        from .load_json import loadJsonRelative
+        from .assets import loadAsset
         if self._moho is None:
-            struct = loadJsonRelative("data/hm8/faceshapes/faceshapes.mxa")
+            struct = loadAsset("data/hm8/faceshapes/faceshapes.mxa")
             self._mouthShapes = [key for key in struct["targets"].keys() if key[0:4] in ["mout", "lips", "tong"]]
-            struct = loadJsonRelative("data/hm8/faceshapes/visemes.mxa")
+            struct = loadAsset("data/hm8/faceshapes/visemes.mxa")
             self._layout = struct["layout"]
             self._visemes = struct["visemes"]
             self._moho = struct["moho"]